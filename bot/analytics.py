@@ -0,0 +1,224 @@
+import argparse
+import csv
+import json
+import os
+import statistics
+import sys
+from collections import Counter
+
+from bot.catalog import SLOTS
+from bot.database import EXPORT_COLUMNS, ID_COLUMNS, PRICE_COLUMNS, BuildSaver
+
+GOALS = ('games', 'office', 'editing')
+# Минимальные бюджеты, которые бот принимает для каждой цели
+MIN_BUDGETS = {'games': 56000, 'office': 30000, 'editing': 56000}
+TOP_COMPONENTS = 5
+PRICE_BUCKET = 10000
+
+
+def write_csv(batches, path):
+    rows = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for batch in batches:
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+
+def parquet_schema(pa):
+    types = {'id': pa.int64(), 'user_id': pa.int64(), 'total_price': pa.int64(), 'available': pa.bool_()}
+    types.update(dict.fromkeys(SLOTS, pa.string()))
+    types.update(dict.fromkeys(ID_COLUMNS + PRICE_COLUMNS, pa.int64()))
+    # SQLite хранит CURRENT_TIMESTAMP строкой 'YYYY-MM-DD HH:MM:SS' в UTC
+    types['created_at'] = pa.timestamp('s', tz='UTC')
+    return pa.schema([(column, types[column]) for column in EXPORT_COLUMNS])
+
+
+def parquet_column(pa, values, field):
+    if field.name == 'created_at':
+        # SQLite отдаёт время строкой без зоны: разбираем как наивное и помечаем UTC
+        return pa.array(values, pa.string()).cast(pa.timestamp('s')).cast(field.type)
+    if field.name == 'available':
+        return pa.array(values, pa.int8()).cast(field.type)
+    return pa.array(values, field.type)
+
+
+def write_parquet(batches, path):
+    """Каждая пачка записывается отдельной группой строк, в памяти только текущая пачка."""
+    # pyarrow нужен только для этого формата
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(pa)
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            columns = [parquet_column(pa, values, field) for values, field in zip(zip(*batch), schema)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            rows += len(batch)
+    return rows
+
+
+def budget_sweep(selector, goal, start, stop, step, top=TOP_COMPONENTS):
+    """Что бот подбирает для цели на сетке бюджетов start..stop с шагом step.
+
+    В режиме долей каждый подбор — поиск по таблице точек смены сборки,
+    в режиме оптимизатора — проход по заранее подготовленной цели,
+    поэтому сетка из тысяч бюджетов считается за секунды.
+    """
+    budgets = range(start, stop + 1, step)
+    builds = set()
+    picks = {slot: Counter() for slot in SLOTS}
+    names = {}
+    utilization = []
+    empty = 0
+    for budget in budgets:
+        build = selector.select(budget, goal)
+        if not build['total_price']:
+            empty += 1
+            continue
+        builds.add(tuple(build[slot]['id'] if build[slot] else None for slot in SLOTS))
+        utilization.append(build['total_price'] / budget)
+        for slot in SLOTS:
+            if build[slot] is not None:
+                picks[slot][build[slot]['id']] += 1
+                names[slot, build[slot]['id']] = build[slot]['name']
+
+    deciles = statistics.quantiles(utilization, n=10) if len(utilization) > 1 else utilization * 9
+    return {
+        'budgets': len(budgets),
+        'from': start,
+        'to': stop,
+        'step': step,
+        'distinct_builds': len(builds),
+        'empty_builds': empty,
+        'utilization': {
+            'mean': round(statistics.fmean(utilization), 4) if utilization else None,
+            'min': round(min(utilization), 4) if utilization else None,
+            'p10': round(deciles[0], 4) if deciles else None,
+            'p50': round(deciles[4], 4) if deciles else None,
+            'p90': round(deciles[8], 4) if deciles else None,
+        },
+        'top_components': {
+            slot: [
+                {'name': names[slot, component_id], 'share': round(count / len(budgets), 4)}
+                for component_id, count in picks[slot].most_common(top)
+            ]
+            for slot in SLOTS
+        },
+    }
+
+
+def saved_builds_report(saver, snapshot, top=TOP_COMPONENTS):
+    summary = saver.summarize_builds(PRICE_BUCKET, top)
+    builds = summary['builds']
+    components = {}
+    for slot, rows in summary['components'].items():
+        components[slot] = []
+        for component_id, legacy_name, count in rows:
+            component = snapshot.get(slot, component_id) if component_id is not None else None
+            name = component['name'] if component else legacy_name or f"id {component_id} (нет в каталоге)"
+            components[slot].append({'name': name, 'share': round(count / builds, 4)})
+    return {
+        'builds': builds,
+        'users': summary['users'],
+        'available_share': round(summary['available'] / builds, 4) if builds else None,
+        'price_histogram': {str(bucket): count for bucket, count in summary['price_histogram']},
+        'top_components': components,
+    }
+
+
+def sweep_report(selector, goals=GOALS, stop=600000, step=1000, top=TOP_COMPONENTS):
+    return {
+        goal: budget_sweep(selector, goal, MIN_BUDGETS[goal], stop, step, top)
+        for goal in goals
+    }
+
+
+def print_report(report):
+    for goal, stats in report['sweep'].items():
+        utilization = stats['utilization']
+        print(f"{goal}: бюджетов {stats['budgets']} ({stats['from']}..{stats['to']} шаг {stats['step']}), "
+              f"различных сборок {stats['distinct_builds']}, без сборки {stats['empty_builds']}")
+        print(f"  доля бюджета: средняя {utilization['mean']}, мин {utilization['min']}, "
+              f"p10 {utilization['p10']}, p50 {utilization['p50']}, p90 {utilization['p90']}")
+        for slot, top in stats['top_components'].items():
+            if top:
+                print(f"  {slot:12} " + "; ".join(f"{c['name']} {c['share']:.0%}" for c in top))
+    saved = report.get('saved_builds')
+    if saved and saved['builds']:
+        print(f"сохранённые сборки: {saved['builds']}, пользователей {saved['users']}, "
+              f"доступны {saved['available_share']:.0%}")
+        for slot, top in saved['top_components'].items():
+            if top:
+                print(f"  {slot:12} " + "; ".join(f"{c['name']} {c['share']:.0%}" for c in top))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Аналитика: выгрузка сохранённых сборок и отчёт по подбору")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="выгрузить user_builds в CSV или Parquet")
+    export.add_argument('--db', default='bot_data.db', help="путь к базе бота")
+    export.add_argument('--out', required=True, help="файл .csv или .parquet")
+    export.add_argument('--format', choices=['csv', 'parquet'], help="по умолчанию — по расширению --out")
+    export.add_argument('--batch-size', type=int, default=50000, help="строк в одной пачке (группе строк Parquet)")
+
+    report = commands.add_parser('report', help="отчёт по сетке бюджетов и сохранённым сборкам")
+    report.add_argument('--db', help="база бота: добавить в отчёт сохранённые сборки")
+    report.add_argument('--goal', action='append', choices=GOALS, help="цель сборки (по умолчанию все)")
+    report.add_argument('--mode', choices=['optimizer', 'percent'], help="режим подбора (по умолчанию из SELECTOR_MODE)")
+    report.add_argument('--to', type=int, default=600000, help="максимальный бюджет")
+    report.add_argument('--step', type=int, default=1000, help="шаг сетки бюджетов")
+    report.add_argument('--top', type=int, default=TOP_COMPONENTS, help="сколько самых частых компонентов показать")
+    report.add_argument('--out', help="куда записать отчёт в JSON")
+    args = parser.parse_args(argv)
+    # Выгрузка и отчёт только читают базу: неверный путь не должен создать пустую
+    if args.db and not os.path.isfile(args.db):
+        parser.error(f"нет файла базы: {args.db}")
+
+    if args.command == 'export':
+        file_format = args.format or ('parquet' if args.out.endswith('.parquet') else 'csv')
+        if file_format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                parser.error("для Parquet нужен pyarrow: pip install pyarrow")
+        saver = BuildSaver(args.db, readonly=True)
+        try:
+            write = write_parquet if file_format == 'parquet' else write_csv
+            rows = write(saver.iter_builds(args.batch_size), args.out)
+        finally:
+            saver.close()
+        print(f"Выгружено сборок: {rows} -> {args.out}")
+        return
+
+    from bot.selector import ComponentSelector
+
+    # Кеш сборок не нужен: каждый бюджет сетки подбирается один раз
+    selector = ComponentSelector(cache_size=0)
+    if args.mode:
+        selector.mode = args.mode
+    snapshot = selector.catalog.snapshot
+    result = {
+        'catalog_version': snapshot.version,
+        'mode': selector.mode,
+        'sweep': sweep_report(selector, args.goal or GOALS, args.to, args.step, args.top),
+    }
+    if args.db:
+        saver = BuildSaver(args.db, catalog=selector.catalog, readonly=True)
+        try:
+            result['saved_builds'] = saved_builds_report(saver, snapshot, args.top)
+        finally:
+            saver.close()
+
+    print_report(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from bot.catalog import CATEGORY_FILES, DATA_DIR, SLOTS, Catalog
+from bot.database import ID_COLUMNS, PRICE_COLUMNS, BuildSaver
+from bot.selector import BY_3DMARK, MODE_OPTIMIZER, MODE_PERCENT, ComponentSelector
+
+GOALS = ('games', 'office', 'editing')
+BUDGETS = tuple(range(30000, 600001, 10000))
+
+# Числовые характеристики, которые слегка «шевелятся» у синтетических копий
+PERTURBED_FIELDS = (
+    '3dmark', 'cinebench_r23_single', 'cinebench_r23_multi', 'capacity', 'write_speed',
+    'read_speed', 'frequency', 'total_capacity',
+)
+
+
+def write_scaled_catalog(out_dir, factor, seed=0, data_dir=DATA_DIR):
+    """Пишет в out_dir каталог, в factor раз больше исходного.
+
+    Каждая копия компонента получает новый id и название, цена меняется
+    в пределах ±20%, характеристики — в пределах ±10%. Поля совместимости
+    не меняются, поэтому структура соединений та же, что у настоящего каталога.
+    """
+    rnd = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    for filename in CATEGORY_FILES.values():
+        with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+            items = json.load(f)
+        scaled = []
+        for copy in range(factor):
+            for item in items:
+                item = dict(item)
+                item['id'] = len(scaled) + 1
+                if copy:
+                    item['name'] = f"{item['name']} #{copy}"
+                    item['price'] = int(item['price'] * rnd.uniform(0.8, 1.2))
+                    for field in PERTURBED_FIELDS:
+                        if isinstance(item.get(field), (int, float)):
+                            item[field] = round(item[field] * rnd.uniform(0.9, 1.1))
+                scaled.append(item)
+        with open(os.path.join(out_dir, filename), "w", encoding="utf-8") as f:
+            json.dump(scaled, f, ensure_ascii=False)
+    return out_dir
+
+
+def measure(func, cases, warmup=3):
+    """Вызывает func(*case) для каждого случая; возвращает задержки в секундах."""
+    for case in cases[:warmup]:
+        func(*case)
+    latencies = []
+    for case in cases:
+        start = time.perf_counter()
+        func(*case)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1e6
+
+    total = sum(ordered)
+    return {
+        'calls': len(ordered),
+        'p50_us': round(percentile(50), 2),
+        'p90_us': round(percentile(90), 2),
+        'p99_us': round(percentile(99), 2),
+        'max_us': round(ordered[-1] * 1e6, 2),
+        'mean_us': round(statistics.fmean(ordered) * 1e6, 2),
+        'throughput_per_s': round(len(ordered) / total, 1) if total else None,
+    }
+
+
+def selection_scenarios(catalog, label):
+    cases = [(budget, goal) for goal in GOALS for budget in BUDGETS]
+    results = {}
+
+    percent = ComponentSelector(catalog, mode=MODE_PERCENT, cache_size=0, use_breakpoints=False)
+    results[f'select_percent[{label}]'] = measure(percent.select, cases)
+
+    # Предрасчёт (не зависит от бюджета) меряется отдельно от самих запросов
+    optimizer = ComponentSelector(catalog, mode=MODE_OPTIMIZER, cache_size=0)
+    results[f'optimizer_prepare[{label}]'] = measure(
+        lambda goal: optimizer.optimizer.prepare(catalog.snapshot, goal), [(goal,) for goal in GOALS], warmup=0
+    )
+    results[f'select_optimizer[{label}]'] = measure(optimizer.select, cases)
+
+    # С кешем и таблицей точек смены — как в боте по умолчанию; повторяем проход
+    cached = ComponentSelector(catalog, mode=MODE_PERCENT)
+    results[f'breakpoints_precompute[{label}]'] = measure(cached.breakpoint_table, [(goal,) for goal in GOALS], warmup=0)
+    results[f'select_percent_cached[{label}]'] = measure(cached.select, cases * 3)
+
+    gpus = catalog.snapshot.indexes['gpu']
+    component_cases = [(gpus, budget * 0.5, None, BY_3DMARK) for budget in BUDGETS] * 10
+    results[f'select_component[{label}]'] = measure(percent.select_component, component_cases)
+    return results
+
+
+def populate_db(db_path, catalog, users, builds_per_user=2, seed=0, batch_size=10000):
+    rnd = random.Random(seed)
+    snapshot = catalog.snapshot
+    ids = {slot: list(snapshot.by_id[slot]) for slot in SLOTS}
+    columns = ['user_id'] + ID_COLUMNS + PRICE_COLUMNS + ['total_price']
+    sql = f"INSERT INTO user_builds ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+    conn = sqlite3.connect(db_path)
+    rows = []
+    for user_id in range(1, users + 1):
+        for _ in range(builds_per_user):
+            components = [snapshot.get(slot, rnd.choice(ids[slot])) for slot in SLOTS]
+            prices = [c['price'] for c in components]
+            rows.append((user_id, *(c['id'] for c in components), *prices, sum(prices)))
+        if len(rows) >= batch_size:
+            conn.executemany(sql, rows)
+            rows.clear()
+    conn.executemany(sql, rows)
+    conn.commit()
+    conn.close()
+
+
+def database_scenarios(catalog, users, workdir, seed=0):
+    db_path = os.path.join(workdir, 'bench.db')
+    saver = BuildSaver(db_path, catalog=catalog)
+    populate_db(db_path, catalog, users, seed=seed)
+
+    rnd = random.Random(seed)
+    selector = ComponentSelector(catalog, mode=MODE_PERCENT, cache_size=0, use_breakpoints=False)
+    builds = [selector.select(budget, goal) for goal in GOALS for budget in BUDGETS]
+    user_ids = [rnd.randint(1, users) for _ in range(2000)]
+
+    results = {
+        'save_build': measure(saver.save_build, [(u, rnd.choice(builds)) for u in user_ids]),
+        'get_builds_by_user_id': measure(saver.get_builds_by_user_id, [(u,) for u in user_ids]),
+        'get_build_by_id': measure(saver.get_build_by_id, [(rnd.randint(1, users),) for _ in user_ids]),
+    }
+    start = time.perf_counter()
+    saver.prune_old_builds()
+    results['prune_old_builds'] = [time.perf_counter() - start]
+    # Полный проход переоценки: цены в тестовой базе совпадают с каталогом, записей нет
+    start = time.perf_counter()
+    saver.reprice_builds()
+    results['reprice_builds'] = [time.perf_counter() - start]
+    saver.close()
+    return results
+
+
+def compare(current, baseline):
+    print(f"{'сценарий':45} {'p50 было':>12} {'p50 стало':>12} {'изменение':>10}")
+    for name, stats in current['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if not old:
+            print(f"{name:45} {'—':>12} {stats['p50_us']:>12} {'новый':>10}")
+            continue
+        change = (stats['p50_us'] - old['p50_us']) / old['p50_us'] * 100 if old['p50_us'] else 0
+        print(f"{name:45} {old['p50_us']:>12} {stats['p50_us']:>12} {change:>+9.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк подбора сборок и работы с базой")
+    parser.add_argument('--scales', default='1,10,100', help="во сколько раз увеличить каталог, через запятую")
+    parser.add_argument('--users', type=int, default=100000, help="пользователей в тестовой базе")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="куда записать результаты в JSON")
+    parser.add_argument('--compare', help="JSON с прошлым запуском для сравнения")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='pcbot-bench-')
+    raw = {}
+    try:
+        for factor in (int(f) for f in args.scales.split(',')):
+            data_dir = DATA_DIR if factor == 1 else write_scaled_catalog(
+                os.path.join(workdir, f'x{factor}'), factor, args.seed
+            )
+            start = time.perf_counter()
+            catalog = Catalog(data_dir)
+            raw[f'catalog_load[x{factor}]'] = [time.perf_counter() - start]
+            raw.update(selection_scenarios(catalog, f'x{factor}'))
+            print(f"x{factor}: готово", file=sys.stderr)
+        if args.users:
+            raw.update(database_scenarios(Catalog(), args.users, workdir, args.seed))
+            print("база: готово", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'users': args.users,
+        'scenarios': {name: summarize(latencies) for name, latencies in raw.items()},
+    }
+
+    for name, stats in report['scenarios'].items():
+        print(f"{name:45} p50={stats['p50_us']:>10}us p99={stats['p99_us']:>10}us "
+              f"{stats['throughput_per_s'] or 0:>10}/s")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
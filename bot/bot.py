@@ -1,39 +1,146 @@
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
+import asyncio
+import logging
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler, InlineQueryHandler
+)
 from bot.handlers import BotHandlers
-from bot.config import TOKEN
+from bot.config import (
+    BOT_MODE, BUILDS_PRUNE_INTERVAL, CONCURRENT_UPDATES, DUPLICATE_CALLBACK_WINDOW, METRICS_HOST, METRICS_LOG_INTERVAL, METRICS_PORT,
+    PERSISTENCE_FLUSH_INTERVAL, RATE_LIMIT, RATE_LIMIT_BURST, REPRICE_INTERVAL, STATE_PERSISTENCE, TELEGRAM_API_URL,
+    TOKEN
+)
+from bot.metrics import metrics, serve_metrics
+from bot.middleware import ChatUpdateProcessor, HandlerGuard
+from bot.persistence import SQLitePersistence
 
 BUDGET, GOAL, WAITING_FOR_CITY = range(3)
 
-def main():
-    handlers = BotHandlers()
-    app = Application.builder().token(TOKEN).build()
+def build_application(handlers, updater=True, prune_builds=True, reprice_builds=True, metrics_port=METRICS_PORT,
+                      token=TOKEN, api_url=TELEGRAM_API_URL, rate_limit=RATE_LIMIT):
+    """Приложение со всеми обработчиками; updater=False — для воркеров webhook-режима.
+
+    token, api_url и rate_limit переопределяют настройки окружения (нагрузочный тест, тесты).
+    """
+
+    async def prune_builds_periodically():
+        while True:
+            await asyncio.sleep(BUILDS_PRUNE_INTERVAL)
+            await handlers.builds.prune_old_builds()
+
+    async def reprice_builds_on_catalog_change():
+        catalog = handlers.selector.catalog
+        repriced_version = None
+        while True:
+            # Каталог перечитываем и здесь: без подборов бот сам его не перечитает
+            await asyncio.to_thread(catalog.reload_if_changed)
+            if catalog.snapshot.version != repriced_version:
+                repriced_version = catalog.snapshot.version
+                await handlers.builds.reprice_builds()
+            await asyncio.sleep(REPRICE_INTERVAL)
+
+    async def dump_metrics_periodically():
+        logging.basicConfig()
+        logger = logging.getLogger('bot.metrics')
+        logger.setLevel(logging.INFO)
+        while True:
+            await asyncio.sleep(METRICS_LOG_INTERVAL)
+            logger.info("метрики:\n%s", metrics.render())
+
+    async def start_background_jobs(app):
+        app.bot_data['prune_task'] = None
+        app.bot_data['reprice_task'] = None
+        app.bot_data['metrics_task'] = None
+        app.bot_data['metrics_server'] = None
+        if prune_builds:
+            app.bot_data['prune_task'] = asyncio.create_task(prune_builds_periodically())
+        if reprice_builds and REPRICE_INTERVAL > 0:
+            app.bot_data['reprice_task'] = asyncio.create_task(reprice_builds_on_catalog_change())
+        if metrics.enabled and METRICS_LOG_INTERVAL > 0:
+            app.bot_data['metrics_task'] = asyncio.create_task(dump_metrics_periodically())
+        if metrics.enabled and metrics_port:
+            app.bot_data['metrics_server'] = await serve_metrics(metrics, METRICS_HOST, metrics_port)
+
+    async def close_resources(app):
+        for task in (app.bot_data['prune_task'], app.bot_data['reprice_task'], app.bot_data['metrics_task']):
+            if task is not None:
+                task.cancel()
+        if app.bot_data['metrics_server'] is not None:
+            app.bot_data['metrics_server'].close()
+        await handlers.geocoder.close()
+        handlers.workers.shutdown()
+        handlers.db.close()
+
+    builder = (
+        Application.builder()
+        .token(token)
+        .post_init(start_background_jobs)
+        .post_shutdown(close_resources)
+        # Без этого PTB обрабатывает апдейты строго по одному, и пул воркеров простаивает
+        .concurrent_updates(ChatUpdateProcessor(CONCURRENT_UPDATES))
+    )
+    if api_url:
+        builder = builder.base_url(api_url)
+    if not updater:
+        builder = builder.updater(None)
+    persistent = STATE_PERSISTENCE == 'sqlite'
+    if persistent:
+        # Без updater это воркер webhook-режима: базу состояний делят несколько процессов
+        builder = builder.persistence(
+            SQLitePersistence(handlers.db.db_path, PERSISTENCE_FLUSH_INTERVAL, shared=not updater)
+        )
+    app = builder.build()
+
+    # Повторные нажатия и слишком частые запросы отсекаются до обработчиков.
+    # Inline-запросы приходят на каждое нажатие клавиши и дёшевы, их не ограничиваем
+    guard = HandlerGuard(rate_limit, RATE_LIMIT_BURST, DUPLICATE_CALLBACK_WINDOW)
 
     conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(handlers.handle_new_build, pattern='^new_build$')],
+        entry_points=[CallbackQueryHandler(guard(handlers.handle_new_build), pattern='^new_build$')],
         states={
-            BUDGET: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.handle_budget)],
-            GOAL: [CallbackQueryHandler(handlers.ask_goal, pattern='^(games|office|editing|other)$')],
+            BUDGET: [MessageHandler(filters.TEXT & ~filters.COMMAND, guard(handlers.handle_budget))],
+            GOAL: [CallbackQueryHandler(guard(handlers.ask_goal), pattern='^(games|office|editing|other)$')],
         },
-        fallbacks=[CommandHandler("cancel", handlers.cancel)]
+        fallbacks=[CommandHandler("cancel", guard(handlers.cancel))],
+        name='new_build',
+        persistent=persistent
     )
 
     city_conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(handlers.find_stores, pattern='^find_stores$')],
+        entry_points=[CallbackQueryHandler(guard(handlers.find_stores), pattern='^find_stores$')],
         states={
-            WAITING_FOR_CITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.handle_city_input)]
+            WAITING_FOR_CITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, guard(handlers.handle_city_input))]
         },
-        fallbacks=[CommandHandler("cancel", handlers.cancel)]
+        fallbacks=[CommandHandler("cancel", guard(handlers.cancel))],
+        name='find_stores',
+        persistent=persistent
     )
 
-    app.add_handler(CommandHandler("start", handlers.start))
-    app.add_handler(CallbackQueryHandler(handlers.show_my_builds, pattern='^my_builds$'))
-    app.add_handler(CallbackQueryHandler(handlers.show_build_details, pattern='^build_\\d+$'))
-    app.add_handler(CallbackQueryHandler(handlers.handle_main_menu_callback, pattern='^main_menu$'))
+    app.add_handler(CommandHandler("start", guard(handlers.start)))
+    app.add_handler(CallbackQueryHandler(guard(handlers.show_my_builds), pattern='^my_builds$'))
+    app.add_handler(CallbackQueryHandler(guard(handlers.show_build_details), pattern='^build_\\d+$'))
+    app.add_handler(CallbackQueryHandler(guard(handlers.handle_main_menu_callback), pattern='^main_menu$'))
+    app.add_handler(CallbackQueryHandler(guard(handlers.handle_choose_build), pattern='^choose_\\d+$'))
+    app.add_handler(CallbackQueryHandler(guard(handlers.handle_edit_component), pattern='^edit_(cpu|gpu)$'))
+    app.add_handler(CallbackQueryHandler(guard(handlers.handle_swap_component), pattern='^swap_(cpu|gpu)_\\d+$'))
+    app.add_handler(CallbackQueryHandler(guard(handlers.show_current_build), pattern='^current_build$'))
+    app.add_handler(CallbackQueryHandler(guard(handlers.handle_save_edited), pattern='^save_edited$'))
+    app.add_handler(CommandHandler("search", guard(handlers.search)))
+    app.add_handler(CallbackQueryHandler(guard(handlers.show_part), pattern='^part_[a-z_]+_\\d+$'))
+    app.add_handler(InlineQueryHandler(handlers.inline_search))
 
     app.add_handler(conv_handler)
     app.add_handler(city_conv_handler)
 
+    return app
+
+def main():
+    if BOT_MODE == 'webhook':
+        from bot.webhook import run_webhook
+        run_webhook()
+        return
+
+    app = build_application(BotHandlers())
     app.run_polling()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
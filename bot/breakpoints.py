@@ -0,0 +1,116 @@
+import argparse
+import csv
+import math
+import sys
+from bisect import bisect_right
+
+from bot.catalog import SLOTS
+
+
+def same_build(a, b):
+    return all(a[slot] is b[slot] for slot in SLOTS)
+
+
+class BreakpointTable:
+    """Все различные сборки режима долей для одной цели.
+
+    В режиме долей сборка меняется только там, где доля бюджета какой-то
+    категории (budget * доля) достигает цены очередного компонента.
+    Таблица хранит отсортированные начала интервалов и сборку для
+    каждого интервала; последний интервал не ограничен сверху.
+    """
+
+    def __init__(self, goal, version, budgets, builds):
+        self.goal = goal
+        self.version = version
+        self.budgets = budgets
+        self.builds = builds
+
+    def __len__(self):
+        return len(self.budgets)
+
+    def lookup(self, budget):
+        i = bisect_right(self.budgets, budget) - 1
+        if i < 0:
+            return None
+        return self.builds[i]
+
+    def intervals(self):
+        for i, (start, build) in enumerate(zip(self.budgets, self.builds)):
+            end = self.budgets[i + 1] - 1 if i + 1 < len(self.budgets) else None
+            yield start, end, build
+
+    def distinct_builds(self):
+        return len({tuple(id(build[slot]) for slot in SLOTS) for build in self.builds})
+
+    @classmethod
+    def compute(cls, selector, goal, snapshot=None):
+        snapshot = snapshot or selector.catalog.snapshot
+        budgets = candidate_budgets(selector, goal, snapshot)
+
+        starts, builds = [], []
+        for budget in budgets:
+            build = selector.select_percent(budget, goal, snapshot)
+            if builds and same_build(builds[-1], build):
+                continue
+            starts.append(budget)
+            builds.append(build)
+        return cls(goal, snapshot.version, starts, builds)
+
+
+def candidate_budgets(selector, goal, snapshot):
+    """Наименьшие целые бюджеты, при которых в долю категории попадает новая цена."""
+    from bot.selector import PARAM_CATEGORIES
+
+    def share(budget, key):
+        return selector.get_budgets_and_params(budget, goal)[key]['budget']
+
+    budgets = {0}
+    for key, param in selector.get_budgets_and_params(1, goal).items():
+        fraction = param['budget']
+        if not fraction:
+            continue
+        for price in set(snapshot.indexes[PARAM_CATEGORIES[key]].prices):
+            # Считаем так же, как select_percent (budget * доля во float),
+            # поэтому подправляем округлённое значение в обе стороны
+            budget = max(0, math.ceil(price / fraction))
+            while budget > 0 and price <= share(budget - 1, key):
+                budget -= 1
+            while price > share(budget, key):
+                budget += 1
+            budgets.add(budget)
+    return sorted(budgets)
+
+
+def build_name(component):
+    return component['name'] if component else None
+
+
+def main(argv=None):
+    from bot.selector import MODE_PERCENT, ComponentSelector
+
+    parser = argparse.ArgumentParser(description="Таблица точек смены сборки для режима долей бюджета")
+    parser.add_argument('--goal', action='append', choices=['games', 'office', 'editing'],
+                        help="цель сборки (по умолчанию все)")
+    parser.add_argument('--summary', action='store_true', help="вывести только количество сборок")
+    args = parser.parse_args(argv)
+
+    selector = ComponentSelector(mode=MODE_PERCENT, cache_size=0)
+    writer = csv.writer(sys.stdout)
+    if not args.summary:
+        writer.writerow(('goal', 'budget_from', 'budget_to', 'total_price') + SLOTS)
+
+    for goal in args.goal or ['games', 'office', 'editing']:
+        table = BreakpointTable.compute(selector, goal)
+        if args.summary:
+            print(f"{goal}: интервалов {len(table)}, различных сборок {table.distinct_builds()}")
+            continue
+        for start, end, build in table.intervals():
+            writer.writerow(
+                (goal, start, '' if end is None else end, build['total_price'])
+                + tuple(build_name(build[slot]) for slot in SLOTS)
+            )
+
+
+if __name__ == '__main__':
+    main()
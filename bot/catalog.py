@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from bot.compatibility import CompatibilityIndex
+from bot.index import PriceIndex
+from bot.packed import PACKED_FILE, load_packed
+from bot.search import SearchIndex
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Категория сборки -> файл каталога
+CATEGORY_FILES = {
+    'cpu': 'cpu.json',
+    'gpu': 'gpu.json',
+    'ram': 'ram.json',
+    'ssd': 'ssd.json',
+    'psu': 'psu.json',
+    'pc_case': 'case.json',
+    'cooler': 'coolers.json',
+    'motherboard': 'motherboard.json',
+}
+
+# Слоты сборки в порядке вывода пользователю
+SLOTS = ('cpu', 'gpu', 'motherboard', 'ram', 'ssd', 'psu', 'pc_case', 'cooler')
+
+
+class CatalogSnapshot:
+    """Неизменяемый срез каталога, загруженный за один раз.
+
+    Выборка берёт ссылку на срез в начале и работает только с ним, поэтому
+    перезагрузка каталога не влияет на уже идущие запросы. Индексы по
+    названию, совместимости и поиску читают каждую строку каталога, поэтому
+    строятся при первом обращении: запуск с бинарным каталогом не ждёт
+    разбора всех строк, а поиск не нужен, пока его никто не вызвал.
+    """
+
+    def __init__(self, components, mtimes, version, index_factory=PriceIndex):
+        # Строки бинарного каталога уже доступны только на чтение, словари из JSON оборачиваем
+        self.components = MappingProxyType({
+            category: tuple(MappingProxyType(item) if isinstance(item, dict) else item for item in items)
+            for category, items in components.items()
+        })
+        self.index_factory = index_factory
+        self.indexes = {category: index_factory(items) for category, items in self.components.items()}
+        self.by_id = {
+            category: {item['id']: item for item in items if 'id' in item}
+            for category, items in self.components.items()
+        }
+        self.mtimes = mtimes
+        self.version = version
+        self._lazy_lock = threading.Lock()
+        self._by_name = None
+        self._compatibility = None
+        self._search_index = None
+
+    def _lazy(self, attr, build):
+        # Срез читают из нескольких потоков: индекс строится один раз
+        value = getattr(self, attr)
+        if value is None:
+            with self._lazy_lock:
+                value = getattr(self, attr)
+                if value is None:
+                    value = build()
+                    setattr(self, attr, value)
+        return value
+
+    @property
+    def by_name(self):
+        return self._lazy('_by_name', self._build_by_name)
+
+    def _build_by_name(self):
+        # При повторяющихся названиях берётся первый компонент, как и при выборе
+        by_name = {category: {} for category in self.components}
+        for category, items in self.components.items():
+            for item in items:
+                by_name[category].setdefault(item['name'], item)
+        return by_name
+
+    @property
+    def compatibility(self):
+        return self._lazy('_compatibility', lambda: CompatibilityIndex(self.components, self.index_factory))
+
+    @property
+    def search_index(self):
+        return self._lazy('_search_index', lambda: SearchIndex(self.components))
+
+    def __getitem__(self, category):
+        return self.components[category]
+
+    def get(self, category, component_id):
+        return self.by_id[category].get(component_id)
+
+
+def index_factory_for(backend):
+    if backend == 'numpy':
+        # NumPy нужен только для этого бэкенда
+        from bot.vectorized import ColumnarIndex
+        return ColumnarIndex
+    return PriceIndex
+
+
+class Catalog:
+    def __init__(self, data_dir=DATA_DIR, check_interval=5.0, backend='python', packed=True):
+        self.data_dir = data_dir
+        # Бинарный каталог используется, только пока он собран из тех же JSON
+        self.packed_path = os.path.join(data_dir, PACKED_FILE) if packed else None
+        self.index_factory = index_factory_for(backend)
+        self.check_interval = check_interval
+        self._reload_lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._listeners = []
+        self.snapshot = self._load(version=1)
+
+    def _paths(self):
+        return {category: os.path.join(self.data_dir, filename) for category, filename in CATEGORY_FILES.items()}
+
+    def _mtimes(self):
+        return {category: os.stat(path).st_mtime_ns for category, path in self._paths().items()}
+
+    def _load(self, version):
+        mtimes = self._mtimes()
+        components = load_packed(self.packed_path, self._paths())
+        if components is None:
+            components = {}
+            for category, path in self._paths().items():
+                with open(path, "r", encoding="utf-8") as f:
+                    components[category] = json.load(f)
+        return CatalogSnapshot(components, mtimes, version, self.index_factory)
+
+    def add_reload_listener(self, callback):
+        """callback(snapshot) вызывается после каждой успешной перезагрузки."""
+        self._listeners.append(callback)
+
+    def reload(self):
+        # Новый срез собирается целиком и подменяется одной операцией присваивания:
+        # выборки, уже получившие старый срез, дорабатывают на нём.
+        with self._reload_lock:
+            snapshot = self._load(version=self.snapshot.version + 1)
+            self.snapshot = snapshot
+        for callback in self._listeners:
+            callback(snapshot)
+        return snapshot
+
+    def reload_if_changed(self, force_check=False):
+        now = time.monotonic()
+        if not force_check and now - self._last_check < self.check_interval:
+            return False
+        # Если перезагрузку уже выполняет другой поток, не ждём его
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_check = now
+            changed = self._mtimes() != self.snapshot.mtimes
+        finally:
+            self._reload_lock.release()
+        if changed:
+            self.reload()
+        return changed
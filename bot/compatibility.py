@@ -0,0 +1,120 @@
+from bot.index import PriceIndex
+
+
+def cpu_platform(cpu):
+    """Ключ совместимости процессора: сокет и список поддерживаемых чипсетов."""
+    return cpu['socket'], frozenset(cpu['compatibility_mb'] or ())
+
+
+def cpu_fits_motherboard(cpu, mb):
+    socket, chipsets = cpu_platform(cpu)
+    return mb['socket'] == socket and (not chipsets or mb['chipset'] in chipsets)
+
+
+class CompatibilityIndex:
+    """Предрасчитанные связи совместимости между категориями каталога.
+
+    Строится один раз при загрузке среза каталога; каждое соединение
+    (CPU -> MB, MB -> RAM, MB -> корпус и обратные) — поиск по словарю,
+    результат — индекс по цене (PriceIndex или ColumnarIndex), готовый
+    для select_component.
+    """
+
+    def __init__(self, components, index_factory=PriceIndex):
+        self.components = components
+        self.index_factory = index_factory
+        self._cache = {}
+
+        self.motherboards_by_socket = self._group(components['motherboard'], lambda m: [m['socket']])
+        self.motherboards_by_socket_chipset = self._group(
+            components['motherboard'], lambda m: [(m['socket'], m['chipset'])]
+        )
+        self.motherboards_by_ddr = self._group(components['motherboard'], lambda m: [m['ddr']])
+        self.motherboards_by_form_factor = self._group(components['motherboard'], lambda m: [m['form_factor']])
+        self.cpus_by_socket = self._group(components['cpu'], lambda c: [c['socket']])
+        self.ram_by_ddr = self._group(components['ram'], lambda r: [r['ddr_version']])
+        self.cases_by_form_factor = self._group(components['pc_case'], lambda c: c['form_factor'])
+        self.coolers_by_socket = self._group(components['cooler'], lambda c: c.get('socket_compatibility') or [])
+
+        # Платы для каждой встречающейся в каталоге платформы процессора
+        for cpu in components['cpu']:
+            self.motherboards_for_cpu(cpu)
+
+        self._joins = {
+            ('cpu', 'motherboard'): self.motherboards_for_cpu,
+            ('cpu', 'cooler'): self.coolers_for_cpu,
+            ('motherboard', 'cpu'): self.cpus_for_motherboard,
+            ('motherboard', 'ram'): self.ram_for_motherboard,
+            ('motherboard', 'pc_case'): self.cases_for_motherboard,
+            ('ram', 'motherboard'): self.motherboards_for_ram,
+            ('pc_case', 'motherboard'): self.motherboards_for_case,
+            ('cooler', 'cpu'): self.cpus_for_cooler,
+        }
+
+    @staticmethod
+    def _group(items, keys_func):
+        groups = {}
+        for position, item in enumerate(items):
+            for key in keys_func(item):
+                groups.setdefault(key, []).append((position, item))
+        return groups
+
+    def _index(self, cache_key, *groups):
+        index = self._cache.get(cache_key)
+        if index is None:
+            # Сохраняем порядок каталога, чтобы ничьи разрешались как раньше
+            merged = {}
+            for group in groups:
+                merged.update(group)
+            index = self.index_factory([merged[position] for position in sorted(merged)])
+            self._cache[cache_key] = index
+        return index
+
+    def motherboards_for_cpu(self, cpu):
+        socket, chipsets = cpu_platform(cpu)
+        if not chipsets:
+            return self._index(('motherboard', socket), self.motherboards_by_socket.get(socket, []))
+        return self._index(
+            ('motherboard', socket, chipsets),
+            *(self.motherboards_by_socket_chipset.get((socket, chipset), []) for chipset in chipsets)
+        )
+
+    def cpus_for_motherboard(self, mb):
+        return self._index(
+            ('cpu', mb['socket'], mb['chipset']),
+            [(position, cpu) for position, cpu in self.cpus_by_socket.get(mb['socket'], [])
+             if cpu_fits_motherboard(cpu, mb)]
+        )
+
+    def ram_for_motherboard(self, mb):
+        return self._index(('ram', mb['ddr']), self.ram_by_ddr.get(mb['ddr'], []))
+
+    def motherboards_for_ram(self, ram):
+        return self._index(('motherboard', 'ddr', ram['ddr_version']), self.motherboards_by_ddr.get(ram['ddr_version'], []))
+
+    def cases_for_motherboard(self, mb):
+        return self._index(('pc_case', mb['form_factor']), self.cases_by_form_factor.get(mb['form_factor'], []))
+
+    def motherboards_for_case(self, case):
+        return self._index(
+            ('motherboard', 'form_factor', tuple(case['form_factor'])),
+            *(self.motherboards_by_form_factor.get(form_factor, []) for form_factor in case['form_factor'])
+        )
+
+    def coolers_for_cpu(self, cpu):
+        return self._index(('cooler', cpu['socket']), self.coolers_by_socket.get(cpu['socket'], []))
+
+    def cpus_for_cooler(self, cooler):
+        sockets = tuple(cooler.get('socket_compatibility') or ())
+        return self._index(('cpu', 'sockets', sockets), *(self.cpus_by_socket.get(socket, []) for socket in sockets))
+
+    def targets(self, category):
+        """Категории, совместимость с которыми проверяется для компонентов category."""
+        return [target for source, target in self._joins if source == category]
+
+    def compatible(self, category, component, target):
+        """Все компоненты категории target, совместимые с component из category."""
+        join = self._joins.get((category, target))
+        if join is None:
+            raise KeyError(f"Нет связи совместимости {category} -> {target}")
+        return join(component)
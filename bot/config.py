@@ -4,4 +4,67 @@ from dotenv import load_dotenv
 load_dotenv()
 
 TOKEN = os.getenv("TELEGRAM_TOKEN")
-YANDEX_MAPS_API_KEY = os.getenv("YANDEX_MAPS_API_KEY")
\ No newline at end of file
+YANDEX_MAPS_API_KEY = os.getenv("YANDEX_MAPS_API_KEY")
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "5"))
+# auto — читать bot/data/catalog.bin, если он собран из текущих JSON, json — всегда разбирать JSON
+CATALOG_FORMAT = os.getenv("CATALOG_FORMAT", "auto")
+# optimizer — глобальная оптимизация сборки, percent — фиксированные доли бюджета
+SELECTOR_MODE = os.getenv("SELECTOR_MODE", "optimizer")
+# python — индексы на списках, numpy — векторизованный бэкенд на колонках NumPy
+SELECTOR_BACKEND = os.getenv("SELECTOR_BACKEND", "python")
+# Кеш готовых сборок: размер (0 — выключен) и время жизни записи в секундах (0 — без ограничения)
+BUILD_CACHE_SIZE = int(os.getenv("BUILD_CACHE_SIZE", "1024"))
+BUILD_CACHE_TTL = float(os.getenv("BUILD_CACHE_TTL", "0"))
+# Сколько вариантов сборки разной цены предлагать на выбор (1 — сразу сохранять одну)
+ALTERNATIVE_BUILDS = int(os.getenv("ALTERNATIVE_BUILDS", "3"))
+# Сколько компонентов показывать в ответ на /search и inline-запрос
+SEARCH_RESULTS = int(os.getenv("SEARCH_RESULTS", "8"))
+# Отвечать в режиме долей по предрасчитанной таблице точек смены сборки
+SELECTOR_BREAKPOINTS = os.getenv("SELECTOR_BREAKPOINTS", "1") == "1"
+GEOCODER_URL = os.getenv("GEOCODER_URL", "https://geocode-maps.yandex.ru/1.x/")
+GEOCODER_TIMEOUT = float(os.getenv("GEOCODER_TIMEOUT", "5"))
+GEOCODER_RETRIES = int(os.getenv("GEOCODER_RETRIES", "3"))
+# Пулы воркеров: подбор сборок (thread или process) и запросы к SQLite
+SELECTION_EXECUTOR = os.getenv("SELECTION_EXECUTOR", "thread")
+SELECTION_WORKERS = int(os.getenv("SELECTION_WORKERS", "2"))
+DB_WORKERS = int(os.getenv("DB_WORKERS", "2"))
+MAX_PENDING_TASKS = int(os.getenv("MAX_PENDING_TASKS", "32"))
+# Сколько апдейтов в режиме polling обрабатывается одновременно (апдейты одного чата — по очереди).
+# Больше MAX_PENDING_TASKS, чтобы подборы сверх очереди сразу получали ответ «бот перегружен»
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", str(4 * MAX_PENDING_TASKS)))
+# Ограничение частоты запросов одного пользователя: в среднем RATE_LIMIT в секунду,
+# до RATE_LIMIT_BURST подряд (RATE_LIMIT=0 — без ограничения)
+RATE_LIMIT = float(os.getenv("RATE_LIMIT", "1"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+# Повторное нажатие той же кнопки в чате раньше чем через столько секунд после первого игнорируется
+DUPLICATE_CALLBACK_WINDOW = float(os.getenv("DUPLICATE_CALLBACK_WINDOW", "1"))
+# Как часто (в секундах) удалять старые сборки сверх 10 последних у пользователя
+BUILDS_PRUNE_INTERVAL = float(os.getenv("BUILDS_PRUNE_INTERVAL", "600"))
+# Как часто проверять, не изменился ли каталог, чтобы пересчитать цены сохранённых сборок (0 — не пересчитывать)
+REPRICE_INTERVAL = float(os.getenv("REPRICE_INTERVAL", "60"))
+# Метрики: сбор (1/0), порт HTTP-эндпоинта /metrics (0 — не поднимать) и период
+# выгрузки в лог в секундах (0 — не выгружать)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", "0"))
+# Этапы режима долей (категории, соединения, БП) меряются у каждого N-го подбора
+METRICS_SAMPLE_EVERY = int(os.getenv("METRICS_SAMPLE_EVERY", "16"))
+# polling — один процесс опрашивает Telegram, webhook — приём апдейтов по HTTP
+# и обработка в WEBHOOK_WORKERS процессах
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Публичный адрес, который регистрируется в Telegram через setWebhook (пусто — не регистрировать)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token; без него webhook не запускается
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+# Адрес Bot API (например, локальная заглушка bot.telegram_stub); пусто — api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# Где хранить состояния диалогов и user_data: sqlite (переживают перезапуск) или memory
+STATE_PERSISTENCE = os.getenv("STATE_PERSISTENCE", "sqlite")
+# Как часто (в секундах) изменившиеся состояния пишутся в базу одной транзакцией
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "5"))
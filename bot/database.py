@@ -1,14 +1,59 @@
+import queue
 import sqlite3
+import threading
 from contextlib import contextmanager
+from pathlib import Path
+
+from bot.catalog import SLOTS
+
+SCHEMA_VERSION = 3
+
+# Сборка хранится как ссылки на компоненты каталога и их цены. Цены и
+# available (все ли компоненты есть в каталоге и продаются) обновляет
+# reprice_builds после изменения каталога. Текстовые колонки с названиями
+# остались от первой версии схемы и заполнены только у старых строк,
+# которые не удалось сопоставить с каталогом.
+ID_COLUMNS = [f'{slot}_id' for slot in SLOTS]
+PRICE_COLUMNS = [f'{slot}_price' for slot in SLOTS]
+# Меньше любого user_id: с него начинается обход пользователей по ключу
+MIN_USER_ID = -2 ** 63
+# Колонки выгрузки сборок для аналитики, в порядке iter_builds
+EXPORT_COLUMNS = ['id', 'user_id', *SLOTS, *ID_COLUMNS, *PRICE_COLUMNS, 'total_price', 'created_at', 'available']
+
 
 class BuildSaver:
-    def __init__(self, db_path='bot_data.db'):
+    def __init__(self, db_path='bot_data.db', pool_size=4, keep_builds=10, catalog=None, readonly=False):
         self.db_path = db_path
-        self.init_db()
+        self.catalog = catalog
+        # Только чтение (выгрузки и отчёты): база не создаётся и схема не трогается
+        self.readonly = readonly
+        self.pool_size = pool_size
+        self.keep_builds = keep_builds
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        if not readonly:
+            self.init_db()
+
+    def _connect(self):
+        if self.readonly:
+            return sqlite3.connect(
+                f'{Path(self.db_path).resolve().as_uri()}?mode=ro', uri=True, timeout=5.0, check_same_thread=False
+            )
+        conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-16000')
+        return conn
 
     def init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_db_connection() as conn:
             cursor = conn.cursor()
+            # Схему могут одновременно проверять несколько процессов (воркеры
+            # webhook-режима): блокировка на запись сразу же не даёт им
+            # обоим решить, что колонки ещё нет
+            cursor.execute('BEGIN IMMEDIATE')
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS user_builds (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -25,96 +70,300 @@ class BuildSaver:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+            self.migrate_schema(cursor)
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_user_builds_user_created
+                ON user_builds (user_id, created_at)
+            ''')
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
             conn.commit()
 
+    def migrate_schema(self, cursor):
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(user_builds)')}
+        for column in ID_COLUMNS + PRICE_COLUMNS:
+            if column not in columns:
+                cursor.execute(f'ALTER TABLE user_builds ADD COLUMN {column} INTEGER')
+        if 'available' not in columns:
+            cursor.execute('ALTER TABLE user_builds ADD COLUMN available INTEGER NOT NULL DEFAULT 1')
+
     @contextmanager
     def get_db_connection(self):
-        conn = sqlite3.connect(self.db_path)
+        # Небольшой пул долгоживущих соединений: новое открывается, только
+        # если все уже заняты и лимит пула не исчерпан
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_create = self._created < self.pool_size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._pool.get()
         try:
             yield conn
+        except BaseException:
+            conn.rollback()
+            raise
         finally:
-            conn.close()
+            self._pool.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
 
     def save_build(self, user_id, build_data):
+        components = [build_data[slot] for slot in SLOTS]
         with self.get_db_connection() as conn:
             cursor = conn.cursor()
 
-            cursor.execute('''
-                INSERT INTO user_builds (user_id, cpu, gpu, motherboard, ram, ssd, psu, pc_case, cooler, total_price)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            cursor.execute(f'''
+                INSERT INTO user_builds (user_id, {', '.join(ID_COLUMNS)}, {', '.join(PRICE_COLUMNS)}, total_price)
+                VALUES ({', '.join('?' * (len(ID_COLUMNS) + len(PRICE_COLUMNS) + 2))})
             ''', (
                 user_id,
-                build_data['cpu']['name'] if build_data['cpu'] else None,
-                build_data['gpu']['name'] if build_data['gpu'] else None,
-                build_data['motherboard']['name'] if build_data['motherboard'] else None,
-                build_data['ram']['name'] if build_data['ram'] else None,
-                build_data['ssd']['name'] if build_data['ssd'] else None,
-                build_data['psu']['name'] if build_data['psu'] else None,
-                build_data['pc_case']['name'] if build_data['pc_case'] else None,
-                build_data['cooler']['name'] if build_data['cooler'] else None,
+                *(c['id'] if c else None for c in components),
+                *(c['price'] if c else None for c in components),
                 build_data['total_price']
             ))
 
-            cursor.execute('''
-                DELETE FROM user_builds
-                WHERE user_id = ?
-                AND id NOT IN (
-                    SELECT id FROM user_builds
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC
-                    LIMIT 10
-                );
-            ''', (user_id, user_id))
-
             conn.commit()
 
+    def prune_old_builds(self, batch_size=1000):
+        """Удаляет сборки сверх keep_builds последних у каждого пользователя.
+
+        Пользователи перебираются по ключу user_id по индексу (user_id,
+        created_at): за проход таблица читается один раз, а не на каждую
+        пачку. Каждые batch_size пользователей с лишними сборками чистятся
+        в отдельной транзакции, чтобы не держать блокировку записи долго.
+        """
+        deleted = 0
+        last_user_id = MIN_USER_ID
+        while True:
+            with self.get_db_connection() as conn:
+                users = conn.execute('''
+                    SELECT user_id FROM user_builds
+                    WHERE user_id > ?
+                    GROUP BY user_id
+                    HAVING COUNT(*) > ?
+                    ORDER BY user_id
+                    LIMIT ?
+                ''', (last_user_id, self.keep_builds, batch_size)).fetchall()
+                for (user_id,) in users:
+                    cursor = conn.execute('''
+                        DELETE FROM user_builds
+                        WHERE user_id = ? AND id NOT IN (
+                            SELECT id FROM user_builds
+                            WHERE user_id = ?
+                            ORDER BY created_at DESC, id DESC
+                            LIMIT ?
+                        )
+                    ''', (user_id, user_id, self.keep_builds))
+                    deleted += cursor.rowcount
+                conn.commit()
+            if len(users) < batch_size:
+                return deleted
+            last_user_id = users[-1][0]
+
+    def component(self, slot, component_id):
+        if component_id is None or self.catalog is None:
+            return None
+        return self.catalog.snapshot.get(slot, component_id)
+
+    def _row_to_build(self, row):
+        # row: названия (legacy), id компонентов, цены, total_price, created_at
+        n = len(SLOTS)
+        names, ids, prices = row[:n], row[n:2 * n], row[2 * n:3 * n]
+        build = {}
+        for slot, name, component_id, price in zip(SLOTS, names, ids, prices):
+            component = self.component(slot, component_id)
+            build[slot] = component['name'] if component else name
+            build[f'{slot}_id'] = component_id
+            build[f'{slot}_price'] = price
+        build['total_price'] = row[3 * n]
+        build['created_at'] = row[3 * n + 1]
+        build['available'] = bool(row[3 * n + 2])
+        return build
+
+    def _columns(self):
+        return (
+            f"{', '.join(SLOTS)}, {', '.join(ID_COLUMNS)}, {', '.join(PRICE_COLUMNS)}, total_price, created_at, "
+            f"available"
+        )
+
     def get_builds_by_user_id(self, user_id):
         with self.get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, cpu, gpu, motherboard, ram, ssd, psu, pc_case, cooler, total_price, created_at
+            cursor.execute(f'''
+                SELECT id, {self._columns()}
                 FROM user_builds
                 WHERE user_id = ?
-                ORDER BY created_at DESC
-            ''', (user_id,))
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (user_id, self.keep_builds))
             rows = cursor.fetchall()
-            return [
-                {
-                    'id': r[0],
-                    'cpu': r[1],
-                    'gpu': r[2],
-                    'motherboard': r[3],
-                    'ram': r[4],
-                    'ssd': r[5],
-                    'psu': r[6],
-                    'pc_case': r[7],
-                    'cooler': r[8],
-                    'total_price': r[9],
-                    'created_at': r[10]
-                }
-                for r in rows
-            ]
-        
+            return [{'id': r[0], **self._row_to_build(r[1:])} for r in rows]
+
     def get_build_by_id(self, build_id):
         with self.get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT cpu, gpu, motherboard, ram, ssd, psu, pc_case, cooler, total_price, created_at
+            cursor.execute(f'''
+                SELECT {self._columns()}
                 FROM user_builds
                 WHERE id = ?
             ''', (build_id,))
             row = cursor.fetchone()
             if row:
-                return {
-                    'cpu': row[0],
-                    'gpu': row[1],
-                    'motherboard': row[2],
-                    'ram': row[3],
-                    'ssd': row[4],
-                    'psu': row[5],
-                    'pc_case': row[6],
-                    'cooler': row[7],
-                    'total_price': row[8],
-                    'created_at': row[9]
-                }
-            return None
\ No newline at end of file
+                return self._row_to_build(row)
+            return None
+
+    def get_build_components(self, build):
+        """Полные характеристики компонентов сохранённой сборки из каталога."""
+        return {slot: self.component(slot, build[f'{slot}_id']) for slot in SLOTS}
+
+    def reprice_builds(self, batch_size=1000, progress=None):
+        """Пересчитывает цены и доступность всех сборок по текущему каталогу.
+
+        Строки читаются пачками по возрастанию id (без OFFSET), поэтому
+        память не зависит от размера таблицы; изменившиеся строки пачки
+        записываются одной транзакцией. Если компонента больше нет в
+        каталоге или у него нет цены, остаётся последняя известная цена,
+        а сборка помечается недоступной. Строки первой версии схемы, где
+        сохранены только названия, заодно переводятся на id: компонент
+        ищется в каталоге по названию, а ненайденные названия остаются в
+        текстовых колонках. Возвращает (просмотрено, изменено).
+        """
+        snapshot = self.catalog.snapshot
+        by_id = [snapshot.by_id[slot] for slot in SLOTS]
+        by_name = [snapshot.by_name[slot] for slot in SLOTS]
+        n = len(SLOTS)
+        columns = list(SLOTS) + ID_COLUMNS + PRICE_COLUMNS + ['total_price', 'available']
+        assignments = ', '.join(f'{column} = ?' for column in columns)
+        last_id = 0
+        scanned = updated = 0
+        while True:
+            with self.get_db_connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT id, {', '.join(columns)}
+                    FROM user_builds
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+                if not rows:
+                    return scanned, updated
+
+                updates = []
+                for row in rows:
+                    names, ids, prices = row[1:n + 1], row[n + 1:2 * n + 1], row[2 * n + 1:3 * n + 1]
+                    names, ids, prices = list(names), list(ids), list(prices)
+                    available = True
+                    for i in range(n):
+                        if ids[i] is None and names[i] is not None:
+                            component = by_name[i].get(names[i])
+                            if component is not None:
+                                names[i], ids[i] = None, component['id']
+                        component = by_id[i].get(ids[i])
+                        if component is not None and component['price'] is not None:
+                            prices[i] = component['price']
+                        # Пустой слот (например, видеокарта офисной сборки) доступности не мешает
+                        elif ids[i] is not None or names[i] is not None:
+                            available = False
+                    known = [price for price in prices if price is not None]
+                    # У старых строк без цен компонентов сумма неизвестна — оставляем сохранённую
+                    total_price = sum(known) if known else row[3 * n + 1]
+                    values = (*names, *ids, *prices, total_price, int(available))
+                    if values != tuple(row[1:]):
+                        updates.append((*values, row[0]))
+
+                if updates:
+                    conn.executemany(f'UPDATE user_builds SET {assignments} WHERE id = ?', updates)
+                    conn.commit()
+
+            last_id = rows[-1][0]
+            scanned += len(rows)
+            updated += len(updates)
+            if progress:
+                progress(scanned, updated)
+
+    def iter_builds(self, batch_size=10000):
+        """Все сборки пачками строк с колонками EXPORT_COLUMNS, по возрастанию id.
+
+        Как и reprice_builds, читает по ключу (без OFFSET): память не зависит
+        от размера таблицы, а соединение занято только на время пачки.
+        """
+        last_id = 0
+        while True:
+            with self.get_db_connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT {', '.join(EXPORT_COLUMNS)}
+                    FROM user_builds
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def summarize_builds(self, price_bucket=10000, top=5):
+        """Сводка по всем сохранённым сборкам, посчитанная агрегатами SQLite.
+
+        Группировки идут внутри базы, поэтому память не зависит от числа
+        сборок: в Python приходят только итоговые счётчики.
+        """
+        with self.get_db_connection() as conn:
+            builds, users, available = conn.execute('''
+                SELECT COUNT(*), COUNT(DISTINCT user_id), COALESCE(SUM(available), 0) FROM user_builds
+            ''').fetchone()
+            prices = conn.execute('''
+                SELECT total_price / ? * ?, COUNT(*)
+                FROM user_builds
+                WHERE total_price IS NOT NULL
+                GROUP BY 1
+                ORDER BY 1
+            ''', (price_bucket, price_bucket)).fetchall()
+            components = {}
+            for slot, id_column in zip(SLOTS, ID_COLUMNS):
+                # У старых несопоставленных строк вместо id только название
+                components[slot] = conn.execute(f'''
+                    SELECT {id_column}, CASE WHEN {id_column} IS NULL THEN {slot} END, COUNT(*)
+                    FROM user_builds
+                    WHERE {id_column} IS NOT NULL OR {slot} IS NOT NULL
+                    GROUP BY 1, 2
+                    ORDER BY 3 DESC
+                    LIMIT ?
+                ''', (top,)).fetchall()
+        return {
+            'builds': builds,
+            'users': users,
+            'available': available,
+            'price_histogram': prices,
+            'components': components,
+        }
+
+
+class AsyncBuildSaver:
+    """Асинхронный фасад BuildSaver: запросы выполняются через run (пул воркеров)."""
+
+    def __init__(self, saver, run):
+        self.saver = saver
+        self.run = run
+
+    async def save_build(self, user_id, build_data):
+        # Сохранение не ограничиваем очередью: сборка уже показана пользователю
+        return await self.run(self.saver.save_build, user_id, build_data, bounded=False)
+
+    async def get_builds_by_user_id(self, user_id):
+        return await self.run(self.saver.get_builds_by_user_id, user_id, shared=True)
+
+    async def get_build_by_id(self, build_id):
+        return await self.run(self.saver.get_build_by_id, build_id, shared=True)
+
+    async def prune_old_builds(self, batch_size=1000):
+        return await self.run(self.saver.prune_old_builds, batch_size, bounded=False)
+
+    async def reprice_builds(self, batch_size=1000):
+        return await self.run(self.saver.reprice_builds, batch_size, bounded=False)
@@ -0,0 +1,131 @@
+import asyncio
+import sqlite3
+import threading
+
+import httpx
+
+from bot.cache import BuildCache
+from bot.metrics import metrics
+
+
+class GeocoderError(Exception):
+    pass
+
+
+class CityNotFound(GeocoderError):
+    pass
+
+
+class Geocoder:
+    """Асинхронный клиент геокодера Яндекса с общим пулом соединений.
+
+    Координаты городов кешируются в памяти и в SQLite, поэтому повторные
+    запросы (в том числе после перезапуска бота) не ходят в сеть.
+    """
+
+    def __init__(self, api_key, url, cache_path='bot_data.db', timeout=5.0, retries=3, backoff=0.5,
+                 max_connections=20, memory_size=1024):
+        self.api_key = api_key
+        self.url = url
+        self.cache_path = cache_path
+        self.timeout = timeout
+        # GEOCODER_RETRIES=0 означает «без повторов»: одна попытка делается всегда
+        self.retries = max(1, retries)
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self._client = None
+        # Ключи — текст пользователя, поэтому кеш в памяти ограничен
+        self._memory = BuildCache(memory_size)
+        # Одно соединение на всё время работы; запросы идут из потоков to_thread
+        self._conn = sqlite3.connect(cache_path, timeout=5.0, check_same_thread=False)
+        self._conn_lock = threading.Lock()
+        self.init_cache()
+
+    def init_cache(self):
+        with self._conn_lock, self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    city TEXT PRIMARY KEY,
+                    lon REAL NOT NULL,
+                    lat REAL NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+    def _cache_get(self, key):
+        with self._conn_lock:
+            row = self._conn.execute('SELECT lon, lat FROM geocode_cache WHERE city = ?', (key,)).fetchone()
+        return tuple(row) if row else None
+
+    def _cache_put(self, key, coords):
+        with self._conn_lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO geocode_cache (city, lon, lat) VALUES (?, ?, ?)', (key, *coords))
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+        return self._client
+
+    async def locate(self, city):
+        """Возвращает (lon, lat) города или бросает CityNotFound / GeocoderError."""
+        key = ' '.join(city.lower().split())
+        coords = self._memory.get(key)
+        source = 'memory'
+        if coords is None:
+            coords = await asyncio.to_thread(self._cache_get, key)
+            source = 'sqlite'
+        if coords is None:
+            source = 'network'
+            with metrics.timer('geocoder_fetch_seconds'):
+                coords = await self._fetch(city)
+            await asyncio.to_thread(self._cache_put, key, coords)
+        metrics.inc('geocoder_lookups_total', source=source)
+        self._memory.put(key, coords)
+        return coords
+
+    async def _fetch(self, city):
+        params = {
+            "apikey": self.api_key,
+            "geocode": city,
+            "format": "json",
+            "results": 1
+        }
+
+        for attempt in range(self.retries):
+            try:
+                response = await self.client.get(self.url, params=params)
+                if response.status_code < 500:
+                    break
+                error = GeocoderError(f"геокодер ответил {response.status_code}")
+            except httpx.TransportError as e:
+                error = GeocoderError(f"геокодер недоступен: {e!r}")
+            metrics.inc('geocoder_retries_total')
+            if attempt + 1 < self.retries:
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+        else:
+            raise error
+
+        if response.status_code != 200:
+            raise GeocoderError(f"геокодер ответил {response.status_code}")
+
+        try:
+            collection = response.json()["response"]["GeoObjectCollection"]
+            if int(collection["metaDataProperty"]["GeocoderResponseMetaData"]["found"]) == 0:
+                raise CityNotFound(city)
+            pos_str = collection["featureMember"][0]["GeoObject"]["Point"]["pos"]
+            lon, lat = map(float, pos_str.split(" "))
+        except (KeyError, IndexError, ValueError) as e:
+            raise GeocoderError(f"неожиданный ответ геокодера: {e!r}")
+        return lon, lat
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        with self._conn_lock:
+            self._conn.close()
@@ -1,18 +1,84 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+)
 from telegram.ext import ContextTypes, ConversationHandler
-from bot.database import BuildSaver
+from bot.catalog import SLOTS
+from bot.database import AsyncBuildSaver, BuildSaver
 from bot.selector import ComponentSelector
-from bot.config import YANDEX_MAPS_API_KEY
-import requests
+from bot.config import (
+    ALTERNATIVE_BUILDS, DB_WORKERS, GEOCODER_RETRIES, GEOCODER_TIMEOUT, GEOCODER_URL, MAX_PENDING_TASKS,
+    SEARCH_RESULTS, SELECTION_EXECUTOR, SELECTION_WORKERS, YANDEX_MAPS_API_KEY
+)
+from bot.geocoder import CityNotFound, Geocoder
+from bot.metrics import metrics
+from bot.workers import PoolSaturated, WorkerPool
 
 # Состояния
 BUDGET, GOAL, WAITING_FOR_CITY = range(3)
 
+BUSY_MESSAGE = "Бот сейчас перегружен, попробуйте ещё раз через минуту."
+STALE_BUILD_MESSAGE = "Сборка устарела, подберите её заново."
+CHOICE_EXPIRED_MESSAGE = "Вариант уже выбран. Чтобы выбрать другой, подберите сборку заново."
+
+# Какие компоненты можно заменить в готовой сборке и сколько вариантов замены показывать
+EDITABLE_SLOTS = {'cpu': "процессор", 'gpu': "видеокарту"}
+EDIT_OPTIONS = 8
+SEARCH_USAGE = "Напишите название или его часть после команды, например: /search rtx 4070"
+CATEGORY_TITLES = {
+    'cpu': "Процессор",
+    'gpu': "Видеокарта",
+    'motherboard': "Материнская плата",
+    'ram': "Оперативная память",
+    'ssd': "Накопитель",
+    'psu': "Блок питания",
+    'pc_case': "Корпус",
+    'cooler': "Кулер",
+}
+COMPATIBLE_TITLES = {
+    'cpu': "Процессоры",
+    'motherboard': "Материнские платы",
+    'ram': "Память",
+    'pc_case': "Корпуса",
+    'cooler': "Кулеры",
+}
+# Сколько самых дешёвых совместимых компонентов называть в карточке
+COMPATIBLE_SHOWN = 3
+# Сколько секунд Telegram может отдавать закэшированный ответ на inline-запрос: цены в каталоге меняются
+INLINE_CACHE_TIME = 60
+
 class BotHandlers:
-    def __init__(self):
-        self.db = BuildSaver()
+    def __init__(self, db_path='bot_data.db'):
         self.selector = ComponentSelector()
+        self.db = BuildSaver(db_path, catalog=self.selector.catalog)
+        self.workers = WorkerPool(
+            self.selector,
+            selection_executor=SELECTION_EXECUTOR,
+            selection_workers=SELECTION_WORKERS,
+            db_workers=DB_WORKERS,
+            max_pending=MAX_PENDING_TASKS
+        )
+        self.builds = AsyncBuildSaver(self.db, self.workers.run_db)
+        self.geocoder = Geocoder(
+            YANDEX_MAPS_API_KEY,
+            GEOCODER_URL,
+            cache_path=self.db.db_path,
+            timeout=GEOCODER_TIMEOUT,
+            retries=GEOCODER_RETRIES
+        )
+        metrics.register_collector(self.collect_metrics)
 
+    def collect_metrics(self):
+        # Текущие значения, которые отдаются вместе с метриками как gauge
+        values = [
+            ('pending_tasks', {'lane': lane}, self.workers.pending(lane)) for lane in ('select', 'db')
+        ]
+        if self.selector.cache is not None:
+            stats = self.selector.cache.stats()
+            values += [('build_cache_size', {}, stats['size']), ('build_cache_hit_rate', {}, stats['hit_rate'])]
+        values.append(('catalog_version', {}, self.selector.catalog.snapshot.version))
+        return values
+
+    @metrics.timed('handler_seconds')
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data.clear()
 
@@ -29,6 +95,7 @@ class BotHandlers:
             await query.answer()
             await query.edit_message_text("Выберите действие:", reply_markup=reply_markup)
 
+    @metrics.timed('handler_seconds')
     async def handle_new_build(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
@@ -43,6 +110,7 @@ class BotHandlers:
 
         return GOAL
 
+    @metrics.timed('handler_seconds')
     async def ask_goal(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
@@ -61,6 +129,7 @@ class BotHandlers:
 
         return BUDGET
 
+    @metrics.timed('handler_seconds')
     async def handle_budget(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             budget = int(update.message.text)
@@ -80,13 +149,26 @@ class BotHandlers:
 
             context.user_data['budget'] = budget
 
-            build = self.selector.select(budget, goal)
+            with metrics.timer('handler_stage_seconds', stage='select'):
+                builds = await self.workers.select_alternatives(budget, goal, ALTERNATIVE_BUILDS)
+
+            if len(builds) > 1:
+                # Сохраняется только выбранный вариант, до выбора храним id компонентов
+                context.user_data['alternatives'] = [self.build_ids(build) for build in builds]
+                with metrics.timer('handler_stage_seconds', stage='format_build'):
+                    response, reply_markup = self.format_alternatives(builds)
+                await update.message.reply_text(text=response, reply_markup=reply_markup)
+                return ConversationHandler.END
 
-            response, reply_markup = self.format_build(build)
+            build = builds[0]
+            context.user_data['build'] = self.build_ids(build)
+            with metrics.timer('handler_stage_seconds', stage='format_build'):
+                response, reply_markup = self.format_build(build)
 
             await update.message.reply_text(text=response, reply_markup=reply_markup)
 
-            self.db.save_build(update.message.from_user.id, build)
+            with metrics.timer('handler_stage_seconds', stage='save_build'):
+                await self.builds.save_build(update.message.from_user.id, build)
 
             return ConversationHandler.END
 
@@ -94,13 +176,141 @@ class BotHandlers:
             await update.message.reply_text("Пожалуйста, введите число.")
             return BUDGET
 
+        except PoolSaturated:
+            await update.message.reply_text(BUSY_MESSAGE)
+            return BUDGET
+
+    @metrics.timed('handler_seconds')
+    async def handle_choose_build(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        index = int(query.data.split('_')[1])
+        # Забираем варианты до первого await: второе нажатие на другой вариант
+        # того же сообщения не должно сохранить ещё одну сборку
+        alternatives = context.user_data.pop('alternatives', None)
+        if alternatives is None:
+            await query.answer(CHOICE_EXPIRED_MESSAGE)
+            return
+
+        build = self.build_from_ids(alternatives[index]) if index < len(alternatives) else None
+        if build is None:
+            await query.answer()
+            await self.reply_stale(query)
+            return
+
+        try:
+            with metrics.timer('handler_stage_seconds', stage='save_build'):
+                await self.builds.save_build(query.from_user.id, build)
+        except PoolSaturated:
+            # Сообщение с вариантами остаётся, пользователь может нажать ещё раз
+            context.user_data['alternatives'] = alternatives
+            await query.answer(BUSY_MESSAGE, show_alert=True)
+            return
+
+        context.user_data['build'] = alternatives[index]
+        await query.answer()
+        response, reply_markup = self.format_build(build)
+        await query.edit_message_text(text=response, reply_markup=reply_markup)
+
+    @metrics.timed('handler_seconds')
+    async def handle_edit_component(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        slot = query.data.split('_', 1)[1]
+
+        build = self.current_build(context)
+        if build is None or build[slot] is None:
+            await query.answer()
+            await self.reply_stale(query)
+            return
+
+        try:
+            options = await self.workers.replacement_options(build, slot, EDIT_OPTIONS, context.user_data['goal'])
+        except PoolSaturated:
+            # Сообщение со сборкой остаётся, пользователь может нажать ещё раз
+            await query.answer(BUSY_MESSAGE, show_alert=True)
+            return
+
+        await query.answer()
+        keyboard = [
+            [InlineKeyboardButton(f"{c['name']} — {c['price']} руб.", callback_data=f"swap_{slot}_{c['id']}")]
+            for c in options
+        ]
+        keyboard.append([InlineKeyboardButton("Отмена", callback_data='current_build')])
+        await query.edit_message_text(
+            text=f"Сейчас: {build[slot]['name']} — {build[slot]['price']} руб.\n"
+                 f"Выберите {EDITABLE_SLOTS[slot]}, зависящие от него компоненты подберутся заново:",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+    @metrics.timed('handler_seconds')
+    async def handle_swap_component(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        _, slot, component_id = query.data.split('_')
+
+        build = self.current_build(context)
+        component = self.selector.catalog.snapshot.get(slot, int(component_id))
+        goal = context.user_data['goal']
+        if build is None or component is None or not self.selector.suits_goal(build, slot, component, goal):
+            await query.answer()
+            await self.reply_stale(query)
+            return
+
+        # Пересчитываются только зависящие от замены компоненты, без полного подбора
+        try:
+            with metrics.timer('handler_stage_seconds', stage='reselect'):
+                build = await self.workers.reselect(build, slot, component, context.user_data['budget'], goal)
+        except PoolSaturated:
+            await query.answer(BUSY_MESSAGE, show_alert=True)
+            return
+
+        await query.answer()
+        context.user_data['build'] = self.build_ids(build)
+        context.user_data['edited'] = True
+
+        response, reply_markup = self.format_build(build, edited=True)
+        await query.edit_message_text(text=response, reply_markup=reply_markup)
+
+    @metrics.timed('handler_seconds')
+    async def show_current_build(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+
+        build = self.current_build(context)
+        if build is None:
+            await self.reply_stale(query)
+            return
+        response, reply_markup = self.format_build(build, edited=context.user_data.get('edited', False))
+        await query.edit_message_text(text=response, reply_markup=reply_markup)
+
+    @metrics.timed('handler_seconds')
+    async def handle_save_edited(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+
+        build = self.current_build(context)
+        if build is None:
+            await query.answer()
+            await self.reply_stale(query)
+            return
+
+        with metrics.timer('handler_stage_seconds', stage='save_build'):
+            await self.builds.save_build(query.from_user.id, build)
+        context.user_data.pop('edited', None)
+
+        await query.answer("Сборка сохранена")
+        response, reply_markup = self.format_build(build)
+        await query.edit_message_text(text=response, reply_markup=reply_markup)
+
+    @metrics.timed('handler_seconds')
     async def show_my_builds(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
 
         user_id = query.from_user.id
 
-        builds = self.db.get_builds_by_user_id(user_id)
+        try:
+            builds = await self.builds.get_builds_by_user_id(user_id)
+        except PoolSaturated:
+            await query.edit_message_text(text=BUSY_MESSAGE)
+            return
 
         if not builds:
             keyboard = [[InlineKeyboardButton("В главное меню", callback_data='main_menu')]]
@@ -110,18 +320,27 @@ class BotHandlers:
 
         keyboard = []
         for build in builds:
-            keyboard.append([InlineKeyboardButton(f"Сборка от {build['created_at']} - {build['total_price']}руб.", callback_data=f"build_{build['id']}")])
+            # Цены и доступность пересчитывает фоновая переоценка при изменении каталога
+            label = f"Сборка от {build['created_at']} - {build['total_price']}руб."
+            if not build['available']:
+                label += " (нет в наличии)"
+            keyboard.append([InlineKeyboardButton(label, callback_data=f"build_{build['id']}")])
 
         keyboard.append([InlineKeyboardButton("В главное меню", callback_data='main_menu')])
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(text="Ваши сборки:", reply_markup=reply_markup)
 
+    @metrics.timed('handler_seconds')
     async def show_build_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
 
         build_id = int(query.data.split('_')[1])
-        build = self.db.get_build_by_id(build_id)
+        try:
+            build = await self.builds.get_build_by_id(build_id)
+        except PoolSaturated:
+            await query.edit_message_text(text=BUSY_MESSAGE)
+            return
 
         if not build:
             keyboard = [[InlineKeyboardButton("В главное меню", callback_data='main_menu')]]
@@ -135,6 +354,7 @@ class BotHandlers:
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(text=response, reply_markup=reply_markup)
     
+    @metrics.timed('handler_seconds')
     async def find_stores(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
@@ -143,6 +363,7 @@ class BotHandlers:
 
         return WAITING_FOR_CITY
 
+    @metrics.timed('handler_seconds')
     async def handle_city_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         city = update.message.text.strip()
 
@@ -150,24 +371,13 @@ class BotHandlers:
             await update.message.reply_text("Пожалуйста, введите название города.")
             return WAITING_FOR_CITY
 
-        geocode_url = "https://geocode-maps.yandex.ru/1.x/"
-        params = {
-            "apikey": YANDEX_MAPS_API_KEY,
-            "geocode": city,
-            "format": "json",
-            "results": 1
-        }
-
         try:
-            response = requests.get(geocode_url, params=params)
-            data = response.json()
-
-            if data["response"]["GeoObjectCollection"]["metaDataProperty"]["GeocoderResponseMetaData"]["found"] == 0:
-                await update.message.reply_text("Город не найден. Попробуйте ещё раз.")
-                return WAITING_FOR_CITY
+            with metrics.timer('handler_stage_seconds', stage='geocode'):
+                lon, lat = await self.geocoder.locate(city)
 
-            pos_str = data["response"]["GeoObjectCollection"]["featureMember"][0]["GeoObject"]["Point"]["pos"]
-            lon, lat = map(float, pos_str.split(" "))
+        except CityNotFound:
+            await update.message.reply_text("Город не найден. Попробуйте ещё раз.")
+            return WAITING_FOR_CITY
 
         except Exception as e:
             await update.message.reply_text(f"Ошибка при получении координат: {e}")
@@ -180,11 +390,94 @@ class BotHandlers:
         await self.start(update, context)
         return ConversationHandler.END
     
+    @metrics.timed('handler_seconds')
+    async def search(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        text = " ".join(context.args or ())
+        if not text:
+            await update.message.reply_text(SEARCH_USAGE)
+            return
+
+        with metrics.timer('handler_stage_seconds', stage='search'):
+            found = self.selector.catalog.snapshot.search_index.search(text, SEARCH_RESULTS)
+        if not found:
+            await update.message.reply_text(f"По запросу «{text}» ничего не нашлось.")
+            return
+        if len(found) == 1:
+            category, component = found[0]
+            await update.message.reply_text(self.format_part(category, component))
+            return
+
+        keyboard = [
+            [InlineKeyboardButton(self.part_label(category, c), callback_data=f"part_{category}_{c['id']}")]
+            for category, c in found
+        ]
+        await update.message.reply_text("Что нашлось:", reply_markup=InlineKeyboardMarkup(keyboard))
+
+    @metrics.timed('handler_seconds')
+    async def show_part(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+        # В названии категории может быть "_" (pc_case), id — всегда последний
+        category, component_id = query.data[len('part_'):].rsplit('_', 1)
+
+        snapshot = self.selector.catalog.snapshot
+        # callback_data приходит от клиента: категорию проверяем, а не ищем по ней вслепую
+        component = snapshot.get(category, int(component_id)) if category in snapshot.components else None
+        if component is None:
+            await query.edit_message_text("Этого компонента уже нет в каталоге, повторите поиск.")
+            return
+        keyboard = [[InlineKeyboardButton("В главное меню", callback_data='main_menu')]]
+        await query.edit_message_text(
+            text=self.format_part(category, component), reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+    @metrics.timed('handler_seconds')
+    async def inline_search(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        inline_query = update.inline_query
+        text = inline_query.query.strip()
+        found = []
+        if text:
+            with metrics.timer('handler_stage_seconds', stage='search'):
+                found = self.selector.catalog.snapshot.search_index.search(text, SEARCH_RESULTS)
+
+        results = [
+            InlineQueryResultArticle(
+                id=f"{category}_{c['id']}",
+                title=c['name'],
+                description=self.part_label(category, c, with_name=False),
+                input_message_content=InputTextMessageContent(self.format_part(category, c)),
+            )
+            for category, c in found
+        ]
+        await inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
+
+    @metrics.timed('handler_seconds')
     async def handle_main_menu_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
         await self.start(update, context)
 
+    @staticmethod
+    def build_ids(build):
+        return {slot: build[slot]['id'] if build[slot] else None for slot in SLOTS}
+
+    def build_from_ids(self, ids):
+        """Сборка по id компонентов из user_data или None, если какого-то компонента уже нет в каталоге."""
+        snapshot = self.selector.catalog.snapshot
+        build = {slot: snapshot.get(slot, component_id) for slot, component_id in ids.items()}
+        if any(build[slot] is None for slot, component_id in ids.items() if component_id is not None):
+            return None
+        build['total_price'] = sum(c['price'] for c in build.values() if c and c['price'] is not None)
+        return build
+
+    def current_build(self, context):
+        ids = context.user_data.get('build')
+        return self.build_from_ids(ids) if ids else None
+
+    async def reply_stale(self, query):
+        keyboard = [[InlineKeyboardButton("В главное меню", callback_data='main_menu')]]
+        await query.edit_message_text(text=STALE_BUILD_MESSAGE, reply_markup=InlineKeyboardMarkup(keyboard))
+
     def get_build_by_budget_and_goal(self, budget, goal):
         build = self.selector.select(budget, goal)
         return {
@@ -199,7 +492,7 @@ class BotHandlers:
             "total_price": build['total_price']
         }
 
-    def format_build(self, build):
+    def format_build(self, build, edited=False):
         # build — это словарь с компонентами (например, build['cpu'] — это словарь)
         cpu_name = build['cpu']['name'] if build['cpu'] else "None"
         gpu_name = build['gpu']['name'] if build['gpu'] else "None"
@@ -223,7 +516,14 @@ class BotHandlers:
         Обoщая цена: {total_price} руб.
         """.strip()
 
-        keyboard = [
+        # Заменить можно только то, что есть в сборке (у офисной нет видеокарты)
+        keyboard = [[
+            InlineKeyboardButton(f"Заменить {name}", callback_data=f'edit_{slot}')
+            for slot, name in EDITABLE_SLOTS.items() if build[slot]
+        ]]
+        if edited:
+            keyboard.append([InlineKeyboardButton("Сохранить изменённую сборку", callback_data='save_edited')])
+        keyboard += [
             [InlineKeyboardButton("Найти магазины", callback_data='find_stores')],
             [InlineKeyboardButton("В главное меню", callback_data='main_menu')]
         ]
@@ -231,7 +531,58 @@ class BotHandlers:
 
         return response, reply_markup
     
+    def format_alternatives(self, builds):
+        """Несколько вариантов сборки и кнопки выбора: сохранится только выбранный."""
+        parts = []
+        keyboard = []
+        for i, build in enumerate(builds):
+            text, _ = self.format_build(build)
+            parts.append(f"Вариант {i + 1}:\n{text}")
+            main = build['gpu'] or build['cpu']
+            label = f"Вариант {i + 1}: {main['name']}, {build['total_price']} руб." if main else f"Вариант {i + 1}"
+            keyboard.append([InlineKeyboardButton(label, callback_data=f'choose_{i}')])
+        keyboard.append([InlineKeyboardButton("В главное меню", callback_data='main_menu')])
+
+        response = "\n\n".join(parts) + "\n\nВыберите вариант, который сохранить:"
+        return response, InlineKeyboardMarkup(keyboard)
+
+    @staticmethod
+    def part_label(category, component, with_name=True):
+        price = f"{component['price']} руб." if component['price'] is not None else "нет в наличии"
+        label = f"{CATEGORY_TITLES[category]}, {price}"
+        return f"{component['name']} — {label}" if with_name else label
+
+    def format_part(self, category, component):
+        """Карточка компонента: характеристики и сколько с ним совместимо в каждой связанной категории."""
+        lines = [f"{CATEGORY_TITLES[category]}: {component['name']}"]
+        lines.append(f"Цена: {component['price']} руб." if component['price'] is not None else "Нет в наличии")
+        for field, value in component.items():
+            if field in ('id', 'name', 'price') or value is None:
+                continue
+            if isinstance(value, dict):
+                value = ", ".join(f"{k}: {v}" for k, v in value.items())
+            elif isinstance(value, (list, tuple)):
+                value = ", ".join(map(str, value))
+            lines.append(f"{field}: {value}")
+
+        compatibility = self.selector.catalog.snapshot.compatibility
+        targets = compatibility.targets(category)
+        if targets:
+            lines.append("")
+            lines.append("Совместимо:")
+        for target in targets:
+            # Индекс отсортирован по цене и содержит только компоненты в наличии
+            compatible = compatibility.compatible(category, component, target).items
+            line = f"{COMPATIBLE_TITLES[target]}: {len(compatible)}"
+            if compatible:
+                line += ", дешевле всего: " + ", ".join(
+                    f"{c['name']} ({c['price']} руб.)" for c in compatible[:COMPATIBLE_SHOWN]
+                )
+            lines.append(line)
+        return "\n".join(lines)
+
     def format_build_from_db(self, build):
+        note = "" if build['available'] else "\nЧасть компонентов сейчас не продаётся, цена указана по последним данным."
         return f"""
         CPU: {build['cpu']}\n
         GPU: {build['gpu']}\n
@@ -242,8 +593,9 @@ class BotHandlers:
         Case: {build['pc_case']}\n
         Cooler: {build['cooler']}\n
         Общая цена: {build['total_price']} руб.
-        """.strip()
+        """.strip() + note
 
+    @metrics.timed('handler_seconds')
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Диалог отменён.")
         return ConversationHandler.END
\ No newline at end of file
@@ -0,0 +1,82 @@
+from bisect import bisect_right
+
+from bot.keys import AtLeast, SortKey
+
+
+class PriceIndex:
+    """Компоненты одной категории, отсортированные по цене.
+
+    Для каждого ключа сортировки лениво строится префиксный массив
+    "лучший компонент среди первых i по цене", поэтому выбор лучшего
+    компонента в рамках бюджета сводится к одному bisect.
+    Ничьи по ключу разрешаются так же, как max() по исходному списку:
+    побеждает компонент, стоящий в файле каталога раньше.
+    """
+
+    def __init__(self, items):
+        entries = sorted(
+            ((item['price'], position, item) for position, item in enumerate(items) if item['price'] is not None),
+            key=lambda e: (e[0], e[1])
+        )
+        self.prices = [e[0] for e in entries]
+        self.positions = [e[1] for e in entries]
+        self.items = tuple(e[2] for e in entries)
+        self._best = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def cutoff(self, budget):
+        """Количество компонентов с ценой <= budget."""
+        return bisect_right(self.prices, budget)
+
+    def best_prefix(self, sort_key):
+        prefix = self._best.get(sort_key)
+        if prefix is None:
+            prefix = []
+            best = best_value = best_position = None
+            for item, position in zip(self.items, self.positions):
+                value = sort_key(item)
+                if best is None or value > best_value or (value == best_value and position < best_position):
+                    best, best_value, best_position = item, value, position
+                prefix.append(best)
+            self._best[sort_key] = prefix
+        return prefix
+
+    def best(self, budget, sort_key=None, filter_func=None):
+        n = self.cutoff(budget)
+        if n == 0:
+            return None
+        if filter_func is not None:
+            if self._filter_on_first_key_field(filter_func, sort_key):
+                # Лучший по ключу имеет наибольшее значение поля фильтра:
+                # если он не проходит порог, не проходит никто
+                best = self.best_prefix(sort_key)[n - 1]
+                return best if filter_func(best) else None
+            return self._scan(n, filter_func, sort_key)
+        if sort_key is None:
+            return self.items[0]
+        return self.best_prefix(sort_key)[n - 1]
+
+    @staticmethod
+    def _filter_on_first_key_field(filter_func, sort_key):
+        return (
+            isinstance(filter_func, AtLeast)
+            and isinstance(sort_key, SortKey)
+            and sort_key.fields[0] == filter_func.field
+        )
+
+    def _scan(self, n, filter_func, sort_key):
+        best = best_value = best_position = None
+        for item, position in zip(self.items[:n], self.positions[:n]):
+            if not filter_func(item):
+                continue
+            if sort_key is None:
+                return item
+            value = sort_key(item)
+            if best is None or value > best_value or (value == best_value and position < best_position):
+                best, best_value, best_position = item, value, position
+        return best
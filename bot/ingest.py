@@ -0,0 +1,357 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+
+from bot.catalog import CATEGORY_FILES, DATA_DIR
+from bot.packed import PACKED_FILE, column_kind, compile_catalog, item_errors
+
+# Разделитель элементов списка в ячейке CSV: "H610|B660|Z690"
+LIST_SEPARATOR = '|'
+TRUE_VALUES = ('1', 'true', 'yes', 'да')
+FALSE_VALUES = ('0', 'false', 'no', 'нет')
+# Сколько отклонённых строк показывать в итоговом отчёте
+SHOWN_ERRORS = 20
+
+
+def name_key(name):
+    """Ключ для поиска дублей: регистр и лишние пробелы не важны."""
+    return ' '.join(str(name).split()).casefold()
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """Элементы JSON-массива по одному, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    state = 'start'
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("JSON-массив оборвался")
+            buffer, pos = f.read(chunk_size), 0
+            eof = not buffer
+            continue
+
+        char = buffer[pos]
+        if state == 'start':
+            if char != '[':
+                raise ValueError("ожидался JSON-массив")
+            pos += 1
+            state = 'first'
+        elif state == 'first' and char == ']':
+            return
+        elif state in ('first', 'value'):
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = len(buffer)
+            # Элемент мог не поместиться в буфер (или число оборваться на границе): дочитываем
+            if end == len(buffer) and not eof:
+                chunk = f.read(chunk_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            yield value
+            pos = end
+            state = 'separator'
+        elif char == ']':
+            return
+        elif char == ',':
+            pos += 1
+            state = 'value'
+        else:
+            raise ValueError(f"ожидалась запятая, а не {char!r}")
+
+
+def read_feed(path, feed_format=None, delimiter=','):
+    """Строки прайс-листа: пары (номер строки или элемента, словарь полей)."""
+    feed_format = feed_format or os.path.splitext(path)[1].lstrip('.').lower()
+    if feed_format == 'csv':
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f, delimiter=delimiter)
+            for row in reader:
+                # Пустые ячейки — поле в прайсе не указано
+                yield reader.line_num, {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()}
+    elif feed_format in ('jsonl', 'ndjson'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                if line.strip():
+                    yield line_num, json.loads(line)
+    elif feed_format == 'json':
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from enumerate(iter_json_array(f), 1)
+    else:
+        raise ValueError(f"{path}: неизвестный формат прайс-листа {feed_format!r}")
+
+
+def parse_number(value):
+    # В прайсах встречаются "8 499,90" и неразрывные пробелы между разрядами
+    return float(value.replace(',', '.').replace(' ', '').replace('\xa0', ''))
+
+
+def coerce(value, kind):
+    """Приводит значение из прайса к типу колонки каталога."""
+    if kind == 'int' and isinstance(value, float):
+        return round(value)
+    if not isinstance(value, str) or kind == 'str':
+        return value
+    if kind == 'int':
+        return round(parse_number(value))
+    if kind == 'float':
+        return parse_number(value)
+    if kind == 'bool':
+        if value.lower() in TRUE_VALUES:
+            return True
+        if value.lower() in FALSE_VALUES:
+            return False
+        raise ValueError(f"не логическое значение: {value!r}")
+    if value.startswith(('[', '{')):
+        return json.loads(value)
+    if kind == 'list_str':
+        return [part.strip() for part in value.split(LIST_SEPARATOR) if part.strip()]
+    if kind == 'list_int':
+        return [int(part) for part in value.split(LIST_SEPARATOR) if part.strip()]
+    if kind == 'json':
+        return json.loads(value)
+    # Поле, которого ещё нет в каталоге: число, если похоже на число
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def write_catalog_file(path, items):
+    """Записывает компоненты в формате файлов bot/data: поле на строку."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for position, item in enumerate(items):
+            fields = ',\n'.join(
+                f'    {json.dumps(k, ensure_ascii=False)}: {json.dumps(v, ensure_ascii=False)}' for k, v in item.items()
+            )
+            f.write(f'{"," if position else ""}\n  {{\n{fields}\n  }}')
+        f.write('\n]\n')
+    return tmp_path
+
+
+class _Spill:
+    """Новые компоненты во временном файле: в памяти только смещения записей."""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile('w+b')
+        self.offsets = {}
+
+    def put(self, key, item):
+        self._file.seek(0, os.SEEK_END)
+        self.offsets[key] = self._file.tell()
+        self._file.write(json.dumps(item, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def get(self, key):
+        self._file.seek(self.offsets[key])
+        return json.loads(self._file.readline())
+
+    def items(self):
+        for key in self.offsets:
+            yield self.get(key)
+
+    def close(self):
+        self._file.close()
+
+
+class CategoryIngest:
+    """Изменения одной категории каталога по строкам прайс-листов.
+
+    Компоненты сопоставляются по названию: поля из прайса заменяют поля
+    каталога (id и остальные поля сохраняются), незнакомые названия
+    становятся новыми компонентами со следующим свободным id. Если название
+    встречается в прайсах несколько раз, поля всех строк объединяются,
+    а поле из нескольких строк берётся из последней.
+    Память зависит от размера каталога и числа новых названий, а не от
+    длины прайса: новые компоненты лежат во временном файле.
+    """
+
+    def __init__(self, category, path):
+        self.category = category
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as f:
+            self.items = json.load(f)
+        self.by_key = {}
+        for item in self.items:
+            self.by_key.setdefault(name_key(item['name']), item)
+        self.kinds = {}
+        for field in dict.fromkeys(field for item in self.items for field in item):
+            values = [item[field] for item in self.items if item.get(field) is not None]
+            if values:
+                self.kinds[field] = column_kind(values)
+        self.next_id = max((item['id'] for item in self.items), default=0) + 1
+        self.updates = {}
+        self.added = _Spill()
+        self.rows = 0
+        self.duplicates = 0
+        self.rejected = 0
+
+    def coerce_row(self, row):
+        fields = {}
+        for field, value in row.items():
+            if field in ('id', 'category') or value is None:
+                continue
+            fields[field] = coerce(value, self.kinds.get(field))
+        return fields
+
+    def add(self, row):
+        """Учитывает строку прайса; возвращает список ошибок (пустой, если строка принята)."""
+        self.rows += 1
+        try:
+            fields = self.coerce_row(row)
+        except (ValueError, TypeError) as e:
+            self.rejected += 1
+            return [f"неверное значение: {e}"]
+        key = name_key(fields.get('name', ''))
+
+        if key in self.by_key:
+            existing = self.by_key[key]
+            previous = self.updates.get(key)
+            merged = {**existing, **(previous or {}), **fields, 'name': existing['name']}
+        elif key in self.added.offsets:
+            previous = self.added.get(key)
+            merged = {**previous, **fields, 'name': previous['name']}
+        else:
+            previous = None
+            merged = {'id': self.next_id, **fields}
+
+        errors = item_errors(self.category, merged)
+        if errors:
+            self.rejected += 1
+            return errors
+        if previous is not None:
+            self.duplicates += 1
+        if key in self.by_key:
+            # Поля из разных строк складываются, как и у новых компонентов
+            self.updates[key] = {**(previous or {}), **{field: merged[field] for field in fields}}
+        else:
+            if previous is None:
+                self.next_id += 1
+            self.added.put(key, merged)
+        return []
+
+    def _update_for(self, item):
+        # Повторяющиеся названия в самом каталоге: меняется первый компонент, как и при выборе
+        key = name_key(item['name'])
+        return self.updates.get(key) if self.by_key[key] is item else None
+
+    def changes(self):
+        """Тройки (действие, компонент, изменённые поля {поле: [было, стало]})."""
+        for item in self.items:
+            fields = self._update_for(item)
+            if fields is None:
+                continue
+            diff = {field: [item.get(field), value] for field, value in fields.items() if item.get(field) != value}
+            if diff:
+                yield 'updated', {**item, **fields}, diff
+        for item in self.added.items():
+            yield 'added', item, {}
+
+    def merged_items(self):
+        for item in self.items:
+            fields = self._update_for(item)
+            yield {**item, **fields} if fields else item
+        yield from self.added.items()
+
+    def close(self):
+        self.added.close()
+
+
+def ingest(feeds, data_dir=DATA_DIR, category=None, feed_format=None, delimiter=',', report=None):
+    """Разбирает прайс-листы и возвращает CategoryIngest по затронутым категориям.
+
+    report — открытый файл, куда по строке JSON пишутся отклонённые строки
+    прайсов и, после разбора, добавленные и изменённые компоненты.
+    """
+    categories = {}
+    errors_shown = []
+    for path in feeds:
+        for position, row in read_feed(path, feed_format, delimiter):
+            where = f"{path}:{position}"
+            row_category = (row.get('category') if isinstance(row, dict) else None) or category
+            if not isinstance(row, dict) or row_category not in CATEGORY_FILES:
+                errors = [f"неизвестная категория {row_category!r}" if isinstance(row, dict) else "не объект"]
+            else:
+                if row_category not in categories:
+                    categories[row_category] = CategoryIngest(
+                        row_category, os.path.join(data_dir, CATEGORY_FILES[row_category])
+                    )
+                errors = categories[row_category].add(row)
+            if errors:
+                if len(errors_shown) < SHOWN_ERRORS:
+                    errors_shown.append(f"{where}: {'; '.join(errors)}")
+                if report is not None:
+                    report.write(json.dumps(
+                        {'action': 'rejected', 'where': where, 'category': row_category, 'errors': errors},
+                        ensure_ascii=False
+                    ) + '\n')
+    return categories, errors_shown
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Загрузка прайс-листов (CSV, JSON, JSON Lines) в каталог bot/data/*.json"
+    )
+    parser.add_argument('feeds', nargs='+', help="файлы прайс-листов")
+    parser.add_argument('--category', choices=sorted(CATEGORY_FILES),
+                        help="категория строк без колонки category")
+    parser.add_argument('--format', dest='feed_format', choices=('csv', 'json', 'jsonl'),
+                        help="формат прайсов (по умолчанию по расширению)")
+    parser.add_argument('--delimiter', default=',', help="разделитель колонок CSV")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--report', help="файл для подробного отчёта (JSON Lines)")
+    parser.add_argument('--dry-run', action='store_true', help="только отчёт, каталог не менять")
+    parser.add_argument('--pack', action='store_true', help=f"после записи пересобрать {PACKED_FILE}")
+    args = parser.parse_args(argv)
+
+    report = open(args.report, 'w', encoding='utf-8') if args.report else None
+    try:
+        categories, errors_shown = ingest(
+            args.feeds, args.data_dir, args.category, args.feed_format, args.delimiter, report
+        )
+        tmp_paths = {}
+        for name, result in categories.items():
+            added = updated = 0
+            for action, item, diff in result.changes():
+                added += action == 'added'
+                updated += action == 'updated'
+                if report is not None:
+                    report.write(json.dumps(
+                        {'action': action, 'category': name, 'id': item['id'], 'name': item['name'],
+                         'changes': diff},
+                        ensure_ascii=False
+                    ) + '\n')
+            print(f"{name}: строк {result.rows}, добавлено {added}, изменено {updated}, "
+                  f"повторов {result.duplicates}, отклонено {result.rejected}")
+            if (added or updated) and not args.dry_run:
+                tmp_paths[result.path] = write_catalog_file(result.path, result.merged_items())
+            result.close()
+    finally:
+        if report is not None:
+            report.close()
+
+    for error in errors_shown:
+        print(error, file=sys.stderr)
+    # Файлы подменяются только после того, как все категории записаны
+    for path, tmp_path in tmp_paths.items():
+        os.replace(tmp_path, path)
+    if tmp_paths and args.pack:
+        paths = {category: os.path.join(args.data_dir, filename) for category, filename in CATEGORY_FILES.items()}
+        compile_catalog(paths, os.path.join(args.data_dir, PACKED_FILE))
+    elif tmp_paths:
+        print(f"Каталог обновлён; бинарный {PACKED_FILE} устарел, пересоберите: python -m bot.packed")
+
+
+if __name__ == '__main__':
+    main()
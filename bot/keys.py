@@ -0,0 +1,35 @@
+class HasField:
+    def __init__(self, name):
+        self.name = name
+
+
+class SortKey:
+    """Именованный ключ сортировки по полям компонента.
+
+    В отличие от lambda создаётся один раз, поэтому индексы могут
+    кешировать по нему префиксные массивы.
+    """
+
+    def __init__(self, *fields):
+        self.fields = fields
+
+    def value(self, item, field):
+        if isinstance(field, HasField):
+            return item.get(field.name) is not None
+        return item.get(field, 0)
+
+    def __call__(self, item):
+        if len(self.fields) == 1:
+            return self.value(item, self.fields[0])
+        return tuple(self.value(item, field) for field in self.fields)
+
+
+class AtLeast:
+    """Фильтр item[field] >= threshold, который бэкенды могут векторизовать."""
+
+    def __init__(self, field, threshold):
+        self.field = field
+        self.threshold = threshold
+
+    def __call__(self, item):
+        return item[self.field] >= self.threshold
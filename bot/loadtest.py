@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from telegram import Update
+
+from bot.benchmark import summarize
+from bot.bot import build_application
+from bot.handlers import BUSY_MESSAGE, BotHandlers
+from bot.telegram_stub import FakeBotApi, UpdateFactory
+
+GOALS = ('games', 'office', 'editing')
+MIN_BUDGETS = {'games': 56000, 'office': 30000, 'editing': 56000}
+
+
+async def send(app, data):
+    """Апдейт проходит тот же путь, что и при polling: обработчик очереди апдейтов, затем диспетчер."""
+    update = Update.de_json(data, app.bot)
+    await app.update_processor.process_update(update, app.process_update(update))
+
+
+async def conversation(app, handlers, api, factory, user_id, goal, budget, stats):
+    """Один пользователь проходит весь сценарий: новая сборка -> выбор варианта -> замена процессора -> мои сборки -> детали -> поиск.
+
+    Ответ бота на шаг — последнее сообщение, которое он отправил или
+    изменил в чате пользователя (апдейты одного чата обрабатываются по
+    очереди, так что после шага это ответ именно на него).
+    """
+    async def step(name, data):
+        start = time.perf_counter()
+        await send(app, data)
+        stats.setdefault(name, []).append(time.perf_counter() - start)
+        return api.last_sent.get(user_id)
+
+    started = time.perf_counter()
+    await step('start', factory.message(user_id, '/start'))
+    reply = await step('handle_new_build', factory.callback(user_id, 'new_build'))
+    if not api.buttons(reply):
+        return 'error'
+    reply = await step('ask_goal', factory.callback(user_id, goal))
+    if 'бюджет' not in reply['text']:
+        return 'error'
+
+    reply = await step('handle_budget', factory.message(user_id, str(budget)))
+    if reply['text'] == BUSY_MESSAGE:
+        return 'busy'
+    choices = [data for data in api.buttons(reply) if data.startswith('choose_')]
+    if choices:
+        # Из нескольких вариантов сборки пользователь выбирает первый
+        shown = reply
+        update = factory.callback(user_id, choices[0])
+        reply = await step('handle_choose_build', update)
+        if reply is shown:
+            return 'busy' if api.answers.get(update['callback_query']['id']) == BUSY_MESSAGE else 'error'
+    if 'CPU:' not in reply['text']:
+        return 'error'
+
+    # Замена процессора на первый предложенный и сохранение изменённой сборки
+    reply = await step('handle_edit_component', factory.callback(user_id, 'edit_cpu'))
+    swaps = [data for data in api.buttons(reply) if data.startswith('swap_')]
+    if not swaps:
+        return 'error'
+    await step('handle_swap_component', factory.callback(user_id, swaps[0]))
+    await step('handle_save_edited', factory.callback(user_id, 'save_edited'))
+
+    reply = await step('show_my_builds', factory.callback(user_id, 'my_builds'))
+    if reply['text'] == BUSY_MESSAGE:
+        return 'busy'
+    builds = [data for data in api.buttons(reply) if data.startswith('build_')]
+    if not builds:
+        return 'error'
+    # Первая кнопка — самая свежая сборка пользователя
+    reply = await step('show_build_details', factory.callback(user_id, builds[0]))
+    if reply['text'] == BUSY_MESSAGE:
+        return 'busy'
+
+    # Поиск процессора своей сборки и его карточка
+    cpu_id = app.user_data[user_id]['build']['cpu']
+    cpu = handlers.selector.catalog.snapshot.get('cpu', cpu_id)
+    reply = await step('search', factory.message(user_id, '/search ' + cpu['name']))
+    parts = [data for data in api.buttons(reply) if data.startswith('part_')]
+    if parts:
+        await step('show_part', factory.callback(user_id, parts[0]))
+
+    stats.setdefault('conversation', []).append(time.perf_counter() - started)
+    return 'ok'
+
+
+async def monitor_loop_lag(samples, interval=0.01):
+    """Насколько позже запланированного просыпается цикл событий."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def run(app, handlers, api, conversations, concurrency, users, seed=0):
+    rnd = random.Random(seed)
+    factory = UpdateFactory()
+    stats = {}
+    outcomes = {}
+    lag = []
+    semaphore = asyncio.Semaphore(concurrency)
+    # У одного пользователя одновременно идёт только один диалог: состояние диалога у него одно
+    idle_users = asyncio.Queue()
+    for user_id in rnd.sample(range(1, 10 * users + 1), users):
+        idle_users.put_nowait(user_id)
+
+    async def one():
+        goal = rnd.choice(GOALS)
+        budget = rnd.randint(MIN_BUDGETS[goal], 600000)
+        async with semaphore:
+            user_id = await idle_users.get()
+            try:
+                outcome = await conversation(app, handlers, api, factory, user_id, goal, budget, stats)
+            finally:
+                idle_users.put_nowait(user_id)
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    calls = len(api.calls)
+    monitor = asyncio.create_task(monitor_loop_lag(lag))
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(conversations)))
+    elapsed = time.perf_counter() - start
+    monitor.cancel()
+
+    report = {
+        'conversations': conversations,
+        'concurrency': concurrency,
+        'api_latency_s': api.latency,
+        'elapsed_s': round(elapsed, 3),
+        'conversations_per_s': round(conversations / elapsed, 1),
+        'telegram_calls': len(api.calls) - calls,
+        'outcomes': outcomes,
+        'steps': {name: summarize(latencies) for name, latencies in stats.items()},
+    }
+    if lag:
+        report['loop_lag'] = summarize(lag)
+    return report
+
+
+def print_report(report):
+    print(f"concurrency={report['concurrency']} диалогов={report['conversations']} "
+          f"за {report['elapsed_s']}с ({report['conversations_per_s']}/с), исходы: {report['outcomes']}")
+    rows = list(report['steps'].items())
+    if 'loop_lag' in report:
+        rows.append(('event_loop_lag', report['loop_lag']))
+    for name, stats in rows:
+        print(f"  {name:22} p50={stats['p50_us'] / 1000:>9.2f}мс p99={stats['p99_us'] / 1000:>9.2f}мс "
+              f"max={stats['max_us'] / 1000:>9.2f}мс")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный тест бота без сети: апдейты идут через Application, Bot API — локальная заглушка"
+    )
+    parser.add_argument('--concurrency', default='10,50,200',
+                        help="число одновременных диалогов, через запятую")
+    parser.add_argument('--conversations', type=int, default=500, help="диалогов на каждый уровень")
+    parser.add_argument('--users', type=int, default=1000, help="сколько разных пользователей")
+    parser.add_argument('--api-latency', type=float, default=0.05,
+                        help="задержка ответа заглушки Telegram API в секундах")
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help="RATE_LIMIT бота; по умолчанию выключен: сценарий нажимает кнопки без пауз")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="куда записать результаты в JSON")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='pcbot-load-')
+    handlers = BotHandlers(db_path=os.path.join(workdir, 'load.db'))
+    reports = []
+
+    async def run_all():
+        api = FakeBotApi(args.api_latency)
+        server = await asyncio.start_server(api.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        app = build_application(
+            handlers, updater=False, prune_builds=False, reprice_builds=False, metrics_port=0,
+            token='123:loadtest', api_url=f'http://127.0.0.1:{port}/bot', rate_limit=args.rate_limit
+        )
+        try:
+            async with server, app:
+                await app.start()
+                for concurrency in (int(c) for c in args.concurrency.split(',')):
+                    report = await run(app, handlers, api, args.conversations, concurrency, args.users, args.seed)
+                    print_report(report)
+                    reports.append(report)
+                await app.stop()
+        finally:
+            await handlers.geocoder.close()
+
+    try:
+        asyncio.run(run_all())
+    finally:
+        handlers.workers.shutdown()
+        handlers.db.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
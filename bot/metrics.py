@@ -0,0 +1,213 @@
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+from bot.config import METRICS_ENABLED, METRICS_SAMPLE_EVERY
+
+PREFIX = 'pcbot_'
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    def __init__(self, metrics, buckets=BUCKETS):
+        self.metrics = metrics
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        if not self.metrics.enabled:
+            return
+        # Без блокировки: она удваивает цену наблюдения, а при гонке двух
+        # потоков в худшем случае теряется одно наблюдение
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        if not self.metrics.enabled:
+            return _NOOP
+        return _Timer(self)
+
+
+class _NullHistogram:
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return _NOOP
+
+
+NULL_HISTOGRAM = _NullHistogram()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class Metrics:
+    """Счётчики и гистограммы времени в памяти процесса.
+
+    Гистограммы для горячих путей заводятся заранее через histogram(), тогда
+    наблюдение стоит пары вызовов perf_counter и bisect. При enabled=False
+    таймеры и счётчики ничего не делают. render() отдаёт текстовый формат
+    Prometheus.
+    """
+
+    def __init__(self, enabled=True, sample_every=1):
+        self.enabled = enabled
+        self.sample_every = max(1, sample_every)
+        self._tick = 0
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+
+    def histogram(self, name, **labels):
+        """Гистограмма для набора меток; на горячих путях её стоит получить заранее."""
+        key = _label_key(labels)
+        series = self._histograms.get(name)
+        histogram = series.get(key) if series is not None else None
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, {}).setdefault(key, Histogram(self))
+        return histogram
+
+    def sampled(self):
+        """True для каждого sample_every-го вызова: по нему меряют самые частые этапы."""
+        if not self.enabled:
+            return False
+        self._tick += 1
+        return self._tick % self.sample_every == 0
+
+    def observe(self, name, value, **labels):
+        if self.enabled:
+            self.histogram(name, **labels).observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def timer(self, name, **labels):
+        if not self.enabled:
+            return _NOOP
+        return _Timer(self.histogram(name, **labels))
+
+    def timed(self, name, **labels):
+        """Декоратор: время выполнения функции с меткой function=<имя>."""
+        def decorator(func):
+            histogram = self.histogram(name, function=func.__name__, **labels)
+
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with histogram.time():
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with histogram.time():
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def register_collector(self, collector):
+        """collector() -> [(name, labels, value)], значения выводятся как gauge."""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f'# TYPE {PREFIX}{name} counter')
+                for key, value in series.items():
+                    lines.append(f'{PREFIX}{name}{_format_labels(key)} {value}')
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f'# TYPE {PREFIX}{name} histogram')
+                for key, histogram in series.items():
+                    if not histogram.count:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{PREFIX}{name}_bucket{_format_labels(key, [("le", bound)])} {cumulative}')
+                    lines.append(f'{PREFIX}{name}_bucket{_format_labels(key, [("le", "+Inf")])} {histogram.count}')
+                    lines.append(f'{PREFIX}{name}_sum{_format_labels(key)} {histogram.sum}')
+                    lines.append(f'{PREFIX}{name}_count{_format_labels(key)} {histogram.count}')
+        gauges = {}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                gauges.setdefault(name, []).append((_label_key(labels), value))
+        for name, series in sorted(gauges.items()):
+            lines.append(f'# TYPE {PREFIX}{name} gauge')
+            for key, value in series:
+                lines.append(f'{PREFIX}{name}{_format_labels(key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            for series in self._histograms.values():
+                for histogram in series.values():
+                    histogram.counts = [0] * len(histogram.counts)
+                    histogram.sum = 0.0
+                    histogram.count = 0
+            self._counters.clear()
+
+
+async def serve_metrics(metrics, host, port):
+    """Минимальный HTTP-сервер, отдающий /metrics; возвращает asyncio.Server."""
+
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', metrics.render().encode()
+            else:
+                status, body = '404 Not Found', b'not found\n'
+            writer.write(
+                f'HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+metrics = Metrics(enabled=METRICS_ENABLED, sample_every=METRICS_SAMPLE_EVERY)
@@ -0,0 +1,185 @@
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+
+from telegram.ext import BaseUpdateProcessor
+
+from bot.metrics import metrics
+
+RATE_LIMITED_MESSAGE = "Слишком много запросов подряд, подождите пару секунд."
+MAX_WARNED = 10000
+
+
+class SingleFlight:
+    """Одинаковые одновременные вычисления выполняются один раз.
+
+    Первый вызов с ключом запускает работу, остальные до её окончания
+    получают тот же результат (или то же исключение). Состояние меняется
+    только в цикле событий, блокировка не нужна.
+    """
+
+    def __init__(self):
+        self._flights = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    async def run(self, key, func, *args):
+        future = self._flights.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(*args))
+            self._flights[key] = future
+            future.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            metrics.inc('singleflight_shared_total', operation=key[0])
+        # Отмена одного ждущего (пользователь ушёл) не должна отменять общую работу
+        return await asyncio.shield(future)
+
+
+class TokenBucket:
+    """Ограничение частоты по ключу: до burst запросов подряд, дальше rate в секунду."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        # ключ -> (токены, время обновления); сверху — давно не обращавшиеся
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def allow(self, key):
+        now = self.clock()
+        tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+
+        # Ведро, которое успело наполниться, не отличается от отсутствующего
+        refill = self.burst / self.rate
+        while self._buckets:
+            oldest_key, (_, oldest_at) = next(iter(self._buckets.items()))
+            if now - oldest_at < refill:
+                break
+            del self._buckets[oldest_key]
+        return allowed
+
+
+class HandlerGuard:
+    """Обёртка над обработчиками BotHandlers.
+
+    Повторное нажатие той же кнопки в чате, пока первое обрабатывается
+    или в течение duplicate_window секунд после него, отбрасывается:
+    на него только гасится «часики» кнопки. Запросы пользователя сверх
+    token bucket (rate в секунду, до burst подряд) не обрабатываются;
+    о превышении пишем один раз, пока лимит не восстановится.
+    """
+
+    def __init__(self, rate, burst, duplicate_window, clock=time.monotonic):
+        self.limiter = TokenBucket(rate, burst, clock) if rate > 0 else None
+        self.duplicate_window = duplicate_window
+        self.clock = clock
+        self._running = set()
+        # (чат, данные кнопки) -> время окончания обработки, по возрастанию
+        self._finished = OrderedDict()
+        self._warned = set()
+
+    def __call__(self, callback):
+        @functools.wraps(callback)
+        async def guarded(update, context):
+            query = update.callback_query
+            key = None
+            if query is not None and update.effective_chat is not None:
+                key = (update.effective_chat.id, query.data)
+                if self.is_duplicate(key):
+                    metrics.inc('handler_dropped_total', reason='duplicate')
+                    await query.answer()
+                    return None
+
+            user = update.effective_user
+            if self.limiter is not None and user is not None:
+                if not self.limiter.allow(user.id):
+                    metrics.inc('handler_dropped_total', reason='rate_limited')
+                    await self.reply_limited(update, user.id)
+                    return None
+                self._warned.discard(user.id)
+
+            if key is None:
+                return await callback(update, context)
+            self._running.add(key)
+            try:
+                return await callback(update, context)
+            finally:
+                self._running.discard(key)
+                self._finished.pop(key, None)
+                self._finished[key] = self.clock()
+
+        return guarded
+
+    def is_duplicate(self, key):
+        now = self.clock()
+        while self._finished:
+            oldest_key, finished_at = next(iter(self._finished.items()))
+            if now - finished_at < self.duplicate_window:
+                break
+            del self._finished[oldest_key]
+        return key in self._running or key in self._finished
+
+    async def reply_limited(self, update, user_id):
+        if update.callback_query is not None:
+            await update.callback_query.answer(RATE_LIMITED_MESSAGE)
+        elif update.message is not None and user_id not in self._warned:
+            # Ушедшие после предупреждения пользователи иначе копились бы вечно;
+            # при сбросе кто-то получит предупреждение ещё раз
+            if len(self._warned) >= MAX_WARNED:
+                self._warned.clear()
+            self._warned.add(user_id)
+            await update.message.reply_text(RATE_LIMITED_MESSAGE)
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """Обработка апдейтов в режиме polling: разные чаты — параллельно, один чат — по порядку.
+
+    Параллельно обрабатывается до max_concurrent_updates апдейтов, поэтому
+    медленный подбор или геокодирование одного пользователя не задерживает
+    остальных. Апдейты одного чата (а без чата — одного пользователя) ждут
+    предыдущий, как ChatSerializer в webhook-режиме: состояние диалога и
+    user_data меняются по очереди.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        # чат -> future, которая завершится после его последнего апдейта
+        self._tails = {}
+
+    async def do_process_update(self, update, coroutine):
+        key = None
+        if getattr(update, 'effective_chat', None) is not None:
+            key = update.effective_chat.id
+        elif getattr(update, 'effective_user', None) is not None:
+            key = update.effective_user.id
+        if key is None:
+            await coroutine
+            return
+
+        previous = self._tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        try:
+            if previous is not None:
+                await previous
+            await coroutine
+        finally:
+            done.set_result(None)
+            if self._tails.get(key) is done:
+                del self._tails[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
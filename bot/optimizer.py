@@ -0,0 +1,291 @@
+from bisect import bisect_left, bisect_right
+
+from bot.compatibility import cpu_platform
+
+# Вклад категорий в итоговую оценку сборки: (поле, вес).
+# Значение поля нормируется на максимум по каталогу, поэтому оценка
+# сборки лежит в [0, 1]. Материнская плата, корпус, БП и кулер оценки
+# не добавляют: берётся самый дешёвый вариант, удовлетворяющий ограничениям.
+GOAL_SCORES = {
+    'games': {
+        'gpu': ('3dmark', 0.55),
+        'cpu': ('cinebench_r23_single', 0.25),
+        'ram': ('frequency', 0.1),
+        'ssd': ('capacity', 0.1),
+    },
+    'editing': {
+        'gpu': ('3dmark', 0.3),
+        'cpu': ('cinebench_r23_multi', 0.4),
+        'ram': ('total_capacity', 0.18),
+        'ssd': ('capacity', 0.12),
+    },
+    'office': {
+        'cpu': ('cinebench_r23_multi', 0.6),
+        'ram': ('frequency', 0.15),
+        'ssd': ('capacity', 0.25),
+    },
+}
+
+PSU_HEADROOM = 1.5
+# Самый дешёвый из нескольких вариантов сборки — не дороже этой доли бюджета
+CHEAPEST_ALTERNATIVE = 0.6
+
+
+class Frontier:
+    """Парето-фронт (цена, оценка): с ростом цены оценка строго растёт."""
+
+    def __init__(self, options):
+        self.costs = []
+        self.scores = []
+        self.options = []
+        for cost, score, option in sorted(options, key=lambda o: (o[0], -o[1])):
+            if self.scores and score <= self.scores[-1]:
+                continue
+            self.costs.append(cost)
+            self.scores.append(score)
+            self.options.append(option)
+
+    def best(self, budget):
+        i = bisect_right(self.costs, budget) - 1
+        if i < 0:
+            return None
+        return self.scores[i], self.costs[i], self.options[i]
+
+    @property
+    def min_cost(self):
+        return self.costs[0] if self.costs else None
+
+    @property
+    def max_score(self):
+        return self.scores[-1] if self.scores else 0
+
+
+def pareto(candidates):
+    """Отбрасывает кандидатов, которые не дешевле, не лучше и не экономичнее другого.
+
+    candidates — список (cost, score, tdp, group, item); сравниваются
+    только кандидаты одной группы.
+    """
+    kept = []
+    for candidate in sorted(candidates, key=lambda c: (c[0], -c[1], c[2])):
+        cost, score, tdp, group, _ = candidate
+        if any(k[3] == group and k[1] >= score and k[2] <= tdp for k in kept):
+            continue
+        kept.append(candidate)
+    return kept
+
+
+class PreparedGoal:
+    """Всё, что не зависит от бюджета: строится один раз на срез каталога и цель."""
+
+    def __init__(self, snapshot, goal):
+        weights = GOAL_SCORES[goal]
+        components = snapshot.components
+        compatibility = snapshot.compatibility
+
+        def scorer(category):
+            if category not in weights:
+                return lambda item: 0
+            field, weight = weights[category]
+            top = max((item.get(field) or 0 for item in components[category]), default=0) or 1
+            return lambda item: weight * (item.get(field) or 0) / top
+
+        gpu_score, cpu_score = scorer('gpu'), scorer('cpu')
+        ram_score, ssd_score = scorer('ram'), scorer('ssd')
+
+        if 'gpu' in weights:
+            gpus = [(g['price'], gpu_score(g), g['tdp'], None, g) for g in components['gpu'] if g['price'] is not None]
+            self.gpus = sorted(pareto(gpus), key=lambda g: -g[1])
+        else:
+            self.gpus = [(0, 0, 0, None, None)]
+
+        # БП: самый дешёвый блок не слабее требуемой мощности
+        psus = sorted((p for p in components['psu'] if p['price'] is not None), key=lambda p: (p['power'], p['price']))
+        self.psu_powers = [p['power'] for p in psus]
+        self.cheapest_psu_from = [None] * len(psus)
+        best = None
+        for i in range(len(psus) - 1, -1, -1):
+            if best is None or psus[i]['price'] < best['price']:
+                best = psus[i]
+            self.cheapest_psu_from[i] = best
+
+        # Платформа: для каждого типа памяти — самая дешёвая пара плата + корпус
+        self.platforms = {}
+        coolers = {}
+        cpus = []
+        for cpu in components['cpu']:
+            if cpu['price'] is None or (goal == 'office' and cpu.get('igpu') is None):
+                continue
+            key = cpu_platform(cpu)
+            if key not in self.platforms:
+                self.platforms[key] = self._platforms(compatibility, cpu)
+            if not self.platforms[key]:
+                continue
+            cooler_key = (cpu['socket'], cpu['tdp'])
+            if cooler_key not in coolers:
+                coolers[cooler_key] = self._cooler(compatibility, components['cooler'], cpu)
+            cooler = coolers[cooler_key]
+            if cooler is None:
+                continue
+            cost = cpu['price'] + cooler['price']
+            cpus.append((cost, cpu_score(cpu), cpu['tdp'], key, (cpu, cooler)))
+        self.cpus = sorted(pareto(cpus), key=lambda c: -c[1])
+
+        ram_by_ddr = {}
+        for ram in components['ram']:
+            if ram['price'] is not None:
+                ram_by_ddr.setdefault(ram['ddr_version'], []).append((ram['price'], ram_score(ram), ram))
+        ssds = Frontier((s['price'], ssd_score(s), s) for s in components['ssd'] if s['price'] is not None)
+        self.rest = {}
+        for ddr, rams in ram_by_ddr.items():
+            rams = Frontier(rams)
+            self.rest[ddr] = Frontier(
+                (ram_cost + ssd_cost, ram_s + ssd_s, (ram, ssd))
+                for ram_cost, ram_s, ram in zip(rams.costs, rams.scores, rams.options)
+                for ssd_cost, ssd_s, ssd in zip(ssds.costs, ssds.scores, ssds.options)
+            )
+
+        self.max_cpu_score = max((c[1] for c in self.cpus), default=0)
+        self.max_rest_score = max((f.max_score for f in self.rest.values()), default=0)
+        self.min_rest_cost = min((f.min_cost for f in self.rest.values() if f.costs), default=0)
+
+    @staticmethod
+    def _platforms(compatibility, cpu):
+        platforms = {}
+        for mb in compatibility.motherboards_for_cpu(cpu):
+            cases = compatibility.cases_for_motherboard(mb)
+            if not len(cases):
+                continue
+            case = cases.items[0]
+            cost = mb['price'] + case['price']
+            if mb['ddr'] not in platforms or cost < platforms[mb['ddr']][0]:
+                platforms[mb['ddr']] = (cost, mb, case)
+        return sorted(platforms.values(), key=lambda p: p[0])
+
+    @staticmethod
+    def _cooler(compatibility, all_coolers, cpu):
+        coolers = compatibility.coolers_for_cpu(cpu).items or tuple(c for c in all_coolers if c['price'] is not None)
+        enough = [c for c in coolers if c['tdp'] >= cpu['tdp']]
+        if enough:
+            return min(enough, key=lambda c: c['price'])
+        return max(coolers, key=lambda c: (c['tdp'], -c['price']), default=None)
+
+    def cheapest_psu(self, min_power):
+        i = bisect_left(self.psu_powers, min_power)
+        if i == len(self.psu_powers):
+            return None
+        return self.cheapest_psu_from[i]
+
+
+class BuildOptimizer:
+    """Подбирает сборку с максимальной оценкой под общий бюджет.
+
+    Перебор ветвей и границ: видеокарты и процессоры (после отсечения
+    доминируемых вариантов) перебираются по убыванию оценки; ветвь
+    обрывается, как только даже лучшая возможная память и SSD не дают
+    превзойти найденную сборку. Память и SSD выбираются по Парето-фронту
+    (цена, оценка) одним bisect по остатку бюджета.
+    """
+
+    def __init__(self):
+        self._prepared = {}
+        self._version = None
+
+    def prepare(self, snapshot, goal):
+        if self._version != snapshot.version:
+            self._prepared = {}
+            self._version = snapshot.version
+        prepared = self._prepared.get(goal)
+        if prepared is None:
+            prepared = PreparedGoal(snapshot, goal)
+            self._prepared[goal] = prepared
+        return prepared
+
+    def select(self, snapshot, budget, goal):
+        builds = self.select_top(snapshot, budget, goal, 1)
+        return builds[0] if builds else None
+
+    def select_top(self, snapshot, budget, goal, count):
+        """До count сборок разного ценового уровня, самая сильная первой.
+
+        Вариант i — лучшая сборка не дороже своей доли бюджета: доли идут
+        равномерно от всего бюджета до CHEAPEST_ALTERNATIVE (для трёх —
+        100%, 80% и 60%), поэтому варианты отличаются ценой и
+        производительностью, а не только видеокартой у потолка бюджета.
+        Все уровни считаются за один перебор: у каждой тройки видеокарта,
+        процессор, плата память и SSD подбираются под остаток каждого
+        уровня, а ветвь отсекается, когда не улучшит ни один уровень.
+        Совпавшие сборки соседних уровней возвращаются один раз.
+        """
+        if goal not in GOAL_SCORES:
+            return []
+        p = self.prepare(snapshot, goal)
+        if count > 1:
+            step = (1 - CHEAPEST_ALTERNATIVE) / (count - 1)
+            caps = [int(budget * (1 - step * i)) for i in range(count)]
+        else:
+            caps = [budget]
+        # Лучшая найденная сборка каждого уровня: (ключ, компоненты)
+        best = [None] * len(caps)
+        # Оценка самого слабого уровня, когда найдены все: ветвь ниже неё не улучшит ни один,
+        # а ветвь с той же оценкой ещё может оказаться дешевле
+        worst = None
+
+        for gpu_cost, gpu_s, gpu_tdp, _, gpu in p.gpus:
+            if worst is not None and gpu_s + p.max_cpu_score + p.max_rest_score < worst:
+                break
+            if gpu_cost + p.min_rest_cost > budget:
+                continue
+            for cpu_cost, cpu_s, cpu_tdp, platform_key, (cpu, cooler) in p.cpus:
+                if worst is not None and gpu_s + cpu_s + p.max_rest_score < worst:
+                    break
+                base_cost = gpu_cost + cpu_cost
+                if base_cost + p.min_rest_cost > budget:
+                    continue
+                psu = p.cheapest_psu((gpu_tdp + cpu_tdp) * PSU_HEADROOM)
+                if psu is None:
+                    continue
+                base_cost += psu['price']
+                for platform_cost, mb, case in p.platforms[platform_key]:
+                    rest = p.rest.get(mb['ddr'])
+                    if rest is None:
+                        continue
+                    for i, cap in enumerate(caps):
+                        found = rest.best(cap - base_cost - platform_cost)
+                        # Уровни идут по убыванию: в следующие тоже не поместится
+                        if found is None:
+                            break
+                        rest_s, rest_cost, (ram, ssd) = found
+                        key = (gpu_s + cpu_s + rest_s, -(base_cost + platform_cost + rest_cost))
+                        if best[i] is None or key > best[i][0]:
+                            best[i] = (key, (gpu, cpu, mb, ram, ssd, psu, case, cooler))
+                            if all(found is not None for found in best):
+                                worst = min(found[0][0] for found in best)
+
+        builds = []
+        seen = set()
+        for found in best:
+            if found is None:
+                continue
+            key, components = found
+            ids = tuple(c['id'] if c is not None else None for c in components)
+            if ids not in seen:
+                seen.add(ids)
+                builds.append(self._build(components, key))
+        return builds
+
+    @staticmethod
+    def _build(components, key):
+        gpu, cpu, mb, ram, ssd, psu, case, cooler = components
+        build = {
+            'gpu': gpu,
+            'cpu': cpu,
+            'motherboard': mb,
+            'ram': ram,
+            'ssd': ssd,
+            'psu': psu,
+            'pc_case': case,
+            'cooler': cooler,
+        }
+        build['total_price'] = -key[1]
+        return build
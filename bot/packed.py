@@ -0,0 +1,411 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from collections.abc import Mapping
+
+# Файл собирается из bot/data/*.json командой python -m bot.packed и лежит рядом с ними
+PACKED_FILE = 'catalog.bin'
+MAGIC = b'PCCATBIN'
+FORMAT_VERSION = 1
+
+NUMBER = (int, float)
+# Поля, без которых компонент нельзя подобрать или проверить на совместимость, и их типы:
+# по строкам и спискам строятся соединения CompatibilityIndex, по числам считается мощность
+REQUIRED_FIELDS = {
+    'cpu': {'socket': str, 'tdp': NUMBER, 'compatibility_mb': list, 'ddr': str},
+    'gpu': {'tdp': NUMBER},
+    'motherboard': {'socket': str, 'chipset': str, 'ddr': str, 'form_factor': str},
+    'ram': {'ddr_version': str},
+    'ssd': {},
+    'psu': {'power': NUMBER},
+    'pc_case': {'form_factor': list},
+    'cooler': {'tdp': NUMBER, 'socket_compatibility': list},
+}
+TYPE_NAMES = {str: "строкой", list: "списком", NUMBER: "числом"}
+
+# Состояние ячейки, если в колонке есть пропуски
+ABSENT, NULL, PRESENT = 0, 1, 2
+
+TYPECODES = {'int': 'q', 'float': 'd', 'bool': 'b', 'str': 'I', 'json': 'I'}
+
+
+class CatalogFormatError(ValueError):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def item_errors(category, item):
+    """Ошибки схемы одного компонента (без проверки уникальности id)."""
+    errors = []
+    if not isinstance(item.get('id'), int) or isinstance(item.get('id'), bool):
+        errors.append("id должен быть целым числом")
+    if not isinstance(item.get('name'), str) or not item['name'].strip():
+        errors.append("нет названия")
+    if 'price' not in item or not (item['price'] is None or isinstance(item['price'], int)):
+        errors.append("цена должна быть целым числом или null")
+    # В ssd.json встречаются кулеры: для них требования кулеров
+    required = REQUIRED_FIELDS['cooler'] if category == 'ssd' and item.get('type') else REQUIRED_FIELDS[category]
+    for field, field_type in required.items():
+        value = item.get(field)
+        if value is None:
+            errors.append(f"нет поля {field}")
+        elif isinstance(value, bool) or not isinstance(value, field_type):
+            errors.append(f"поле {field} должно быть {TYPE_NAMES[field_type]}")
+    return errors
+
+
+def validate(category, items):
+    """Список ошибок схемы для компонентов одной категории."""
+    errors = []
+    seen_ids = set()
+    for position, item in enumerate(items):
+        where = f"{category}[{position}]"
+        errors += [f"{where}: {error}" for error in item_errors(category, item)]
+        if item.get('id') in seen_ids:
+            errors.append(f"{where}: повторяющийся id {item['id']}")
+        elif isinstance(item.get('id'), int):
+            seen_ids.add(item['id'])
+    return errors
+
+
+def column_kind(values):
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add('bool')
+        elif isinstance(value, int):
+            kinds.add('int')
+        elif isinstance(value, float):
+            kinds.add('float')
+        elif isinstance(value, str):
+            kinds.add('str')
+        elif isinstance(value, list) and all(isinstance(v, str) for v in value):
+            kinds.add('list_str')
+        elif isinstance(value, list) and all(isinstance(v, int) and not isinstance(v, bool) for v in value):
+            kinds.add('list_int')
+        else:
+            kinds.add('json')
+    if kinds == {'int', 'float'}:
+        return 'float'
+    if len(kinds) == 1:
+        return kinds.pop()
+    if kinds <= {'list_str', 'list_int'}:
+        # Пустые списки попадают в оба вида
+        return 'list_str' if 'list_str' in kinds else 'list_int'
+    return 'json'
+
+
+class _Writer:
+    def __init__(self):
+        self.data = bytearray()
+        self.strings = {}
+        self.string_offsets = array('I', [0])
+        self.string_blob = bytearray()
+
+    def append(self, values):
+        # Каждый массив выровнен на 8 байт, чтобы его можно было читать через memoryview.cast
+        self.data.extend(b'\0' * (-len(self.data) % 8))
+        offset = len(self.data)
+        self.data.extend(values.tobytes())
+        return {'offset': offset, 'length': len(values)}
+
+    def string_id(self, value):
+        string_id = self.strings.get(value)
+        if string_id is None:
+            string_id = self.strings[value] = len(self.strings)
+            self.string_blob.extend(value.encode('utf-8'))
+            self.string_offsets.append(len(self.string_blob))
+        return string_id
+
+    def column(self, items, name):
+        states = array('B', (
+            ABSENT if name not in item else NULL if item[name] is None else PRESENT for item in items
+        ))
+        present = [item[name] for item in items if item.get(name) is not None]
+        kind = column_kind(present)
+        spec = {'type': kind}
+        if any(state != PRESENT for state in states):
+            spec['state'] = self.append(states)
+        raw = [item.get(name) for item in items]
+
+        if kind in ('list_str', 'list_int'):
+            offsets = array('I', [0])
+            flat = array('I' if kind == 'list_str' else 'q')
+            for value in raw:
+                for element in value or ():
+                    flat.append(self.string_id(element) if kind == 'list_str' else element)
+                offsets.append(len(flat))
+            spec['offsets'] = self.append(offsets)
+            spec['values'] = self.append(flat)
+            return spec
+
+        if kind == 'str':
+            converted = (self.string_id(v) if v is not None else 0 for v in raw)
+        elif kind == 'json':
+            converted = (self.string_id(json.dumps(v, ensure_ascii=False)) if v is not None else 0 for v in raw)
+        elif kind == 'float':
+            converted = (float(v) if v is not None else 0.0 for v in raw)
+        else:
+            converted = (int(v) if v is not None else 0 for v in raw)
+        spec['values'] = self.append(array(TYPECODES[kind], converted))
+        return spec
+
+
+def compile_catalog(paths, out_path):
+    """Собирает JSON-файлы каталога {категория: путь} в один бинарный файл."""
+    writer = _Writer()
+    header = {'format': FORMAT_VERSION, 'byteorder': sys.byteorder, 'sources': {}, 'tables': {}}
+    errors = []
+    for category, path in paths.items():
+        with open(path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        errors += validate(category, items)
+        # Порядок колонок — порядок первого появления ключа, как в исходных словарях
+        names = list(dict.fromkeys(name for item in items for name in item))
+        header['sources'][category] = {'file': os.path.basename(path), 'sha256': file_sha256(path)}
+        header['tables'][category] = {
+            'rows': len(items),
+            'columns': {name: writer.column(items, name) for name in names},
+        }
+    if errors:
+        raise CatalogFormatError("каталог не прошёл проверку:\n" + "\n".join(errors))
+
+    header['strings'] = {
+        'count': len(writer.strings),
+        'offsets': writer.append(writer.string_offsets),
+        'blob': writer.append(array('B', writer.string_blob)),
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    prefix = MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes
+    prefix += b'\0' * (-len(prefix) % 8)
+
+    # Пишем во временный файл и подменяем: уже отображённый в память старый файл остаётся целым
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(prefix)
+        f.write(writer.data)
+    os.replace(tmp_path, out_path)
+    return header
+
+
+class _StringTable:
+    def __init__(self, data, spec):
+        offsets = spec['offsets']
+        blob = spec['blob']
+        self._offsets = data[offsets['offset']:offsets['offset'] + offsets['length'] * 4].cast('I')
+        self._blob = data[blob['offset']:blob['offset'] + blob['length']]
+        # Строка декодируется при первом обращении и дальше берётся один и тот же объект
+        self.cache = [None] * spec['count']
+
+    def decode(self, string_id):
+        value = self.cache[string_id] = str(
+            self._blob[self._offsets[string_id]:self._offsets[string_id + 1]], 'utf-8'
+        )
+        return value
+
+
+def _view(data, spec, typecode):
+    size = array(typecode).itemsize
+    return data[spec['offset']:spec['offset'] + spec['length'] * size].cast(typecode)
+
+
+def _getter(kind, values, extra, strings):
+    """Функция i -> значение ячейки для колонки без пропусков."""
+    if kind in ('int', 'float'):
+        return values.__getitem__
+    if kind == 'bool':
+        return lambda i: bool(values[i])
+
+    cache = strings.cache
+    decode = strings.decode
+
+    def string(string_id):
+        value = cache[string_id]
+        return value if value is not None else decode(string_id)
+
+    if kind == 'str':
+        return lambda i: string(values[i])
+    if kind == 'list_str':
+        return lambda i: [string(s) for s in values[extra[i]:extra[i + 1]]]
+    if kind == 'list_int':
+        return lambda i: values[extra[i]:extra[i + 1]].tolist()
+    return lambda i: json.loads(string(values[i]))
+
+
+def _with_state(getter, state, name):
+    def get(i):
+        if state[i] == PRESENT:
+            return getter(i)
+        if state[i] == NULL:
+            return None
+        raise KeyError(name)
+    return get
+
+
+class PackedTable:
+    """Колонки одной категории поверх отображённого в память файла.
+
+    Для каждой колонки заранее собирается функция чтения ячейки, поэтому
+    обращение к полю строки — один поиск в словаре и один вызов.
+    """
+
+    def __init__(self, data, spec, strings):
+        self.rows = spec['rows']
+        self.getters = {}
+        self.states = {}
+        for name, column in spec['columns'].items():
+            kind = column['type']
+            if kind in ('list_str', 'list_int'):
+                values = _view(data, column['values'], 'I' if kind == 'list_str' else 'q')
+                extra = _view(data, column['offsets'], 'I')
+            else:
+                values = _view(data, column['values'], TYPECODES[kind])
+                extra = None
+            getter = _getter(kind, values, extra, strings)
+            if 'state' in column:
+                state = self.states[name] = _view(data, column['state'], 'B')
+                getter = _with_state(getter, state, name)
+            self.getters[name] = getter
+        self.names = tuple(self.getters)
+
+    def has(self, name, i):
+        if name not in self.getters:
+            return False
+        state = self.states.get(name)
+        return state is None or state[i] != ABSENT
+
+    def row_items(self):
+        return tuple(PackedRow(self, i) for i in range(self.rows))
+
+
+class PackedRow(Mapping):
+    """Компонент каталога: read-only отображение, значения читаются из колонок по запросу."""
+
+    __slots__ = ('_table', '_i')
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def __getitem__(self, name):
+        return self._table.getters[name](self._i)
+
+    def get(self, name, default=None):
+        getter = self._table.getters.get(name)
+        if getter is None:
+            return default
+        try:
+            return getter(self._i)
+        except KeyError:
+            return default
+
+    def __contains__(self, name):
+        return self._table.has(name, self._i)
+
+    def __iter__(self):
+        return (name for name in self._table.names if self._table.has(name, self._i))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"PackedRow({dict(self)!r})"
+
+    def __reduce__(self):
+        # Файл не передать в другой процесс: при сериализации строка становится обычным словарём
+        return dict, (dict(self),)
+
+
+class PackedCatalog:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise CatalogFormatError(f"{path}: не бинарный каталог")
+        (header_length,) = struct.unpack('<I', view[len(MAGIC):len(MAGIC) + 4])
+        header_end = len(MAGIC) + 4 + header_length
+        self.header = json.loads(bytes(view[len(MAGIC) + 4:header_end]))
+        if self.header.get('format') != FORMAT_VERSION or self.header.get('byteorder') != sys.byteorder:
+            raise CatalogFormatError(f"{path}: неподдерживаемая версия формата")
+        data = view[header_end + (-header_end % 8):]
+        strings = _StringTable(data, self.header['strings'])
+        self.tables = {
+            category: PackedTable(data, spec, strings) for category, spec in self.header['tables'].items()
+        }
+
+    def components(self):
+        return {category: table.row_items() for category, table in self.tables.items()}
+
+    def matches(self, paths):
+        """Совпадает ли файл с текущими JSON (по содержимому, а не по времени изменения)."""
+        sources = self.header['sources']
+        return set(sources) == set(paths) and all(
+            sources[category]['sha256'] == file_sha256(path) for category, path in paths.items()
+        )
+
+
+def load_packed(path, paths):
+    """Компоненты из бинарного каталога или None, если его нет или он устарел."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        packed = PackedCatalog(path)
+    except (CatalogFormatError, ValueError, OSError):
+        return None
+    if not packed.matches(paths):
+        return None
+    return packed.components()
+
+
+def main(argv=None):
+    from bot.catalog import CATEGORY_FILES, DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Сборка бинарного каталога из bot/data/*.json")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--out', help=f"куда записать (по умолчанию <data-dir>/{PACKED_FILE})")
+    parser.add_argument('--check', action='store_true', help="после сборки сверить каждую запись с JSON")
+    args = parser.parse_args(argv)
+
+    paths = {category: os.path.join(args.data_dir, filename) for category, filename in CATEGORY_FILES.items()}
+    out_path = args.out or os.path.join(args.data_dir, PACKED_FILE)
+    start = time.perf_counter()
+    try:
+        header = compile_catalog(paths, out_path)
+    except CatalogFormatError as e:
+        print(e, file=sys.stderr)
+        raise SystemExit(1)
+    rows = sum(table['rows'] for table in header['tables'].values())
+    print(f"{out_path}: {rows} компонентов, {header['strings']['count']} строк, "
+          f"{os.path.getsize(out_path)} байт, {time.perf_counter() - start:.2f}с")
+
+    if args.check:
+        components = PackedCatalog(out_path).components()
+        mismatches = 0
+        for category, path in paths.items():
+            with open(path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+            mismatches += sum(dict(row) != item for row, item in zip(components[category], items))
+            mismatches += abs(len(items) - len(components[category]))
+        print(f"расхождений с JSON: {mismatches}")
+        if mismatches:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
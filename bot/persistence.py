@@ -0,0 +1,157 @@
+import asyncio
+import json
+import pickle
+import sqlite3
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+
+class SQLitePersistence(BasePersistence):
+    """Состояния ConversationHandler и user_data в SQLite с отложенной записью.
+
+    Application раз в flush_interval секунд передаёт изменившиеся данные в
+    update_*; они копятся в буфере (повторные записи одного ключа
+    схлопываются) и уходят в базу одной транзакцией в потоке, не блокируя
+    цикл событий. bot_data не сохраняется: там лежат фоновые задачи бота.
+
+    shared=True — базу используют несколько процессов (воркеры webhook):
+    перед каждым апдейтом user_data перечитывается из базы, потому что
+    тот же пользователь мог писать из другого чата в другой воркер.
+    """
+
+    def __init__(self, db_path='bot_data.db', flush_interval=5.0, shared=False):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=flush_interval
+        )
+        self.db_path = db_path
+        self.shared = shared
+        # Пользователи, чьи апдейты этот процесс обработал, но ещё не передал в update_user_data
+        self._touched = set()
+        self._buffer = {}
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self.init_db()
+
+    def init_db(self):
+        with self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS bot_state (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (kind, key)
+                ) WITHOUT ROWID
+            ''')
+
+    def _read(self, kind):
+        rows = self._conn.execute('SELECT key, data FROM bot_state WHERE kind = ?', (kind,)).fetchall()
+        return {key: pickle.loads(data) for key, data in rows}
+
+    def _write(self, batch):
+        upserts = [(kind, key, data) for (kind, key), data in batch.items() if data is not None]
+        deletes = [(kind, key) for (kind, key), data in batch.items() if data is None]
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO bot_state (kind, key, data, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)',
+                upserts
+            )
+            self._conn.executemany('DELETE FROM bot_state WHERE kind = ? AND key = ?', deletes)
+
+    def _read_one(self, kind, key):
+        row = self._conn.execute('SELECT data FROM bot_state WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    async def _load(self, kind):
+        # Все запросы к соединению идут под той же блокировкой, что и запись
+        async with self._flush_lock:
+            return await asyncio.to_thread(self._read, kind)
+
+    def _put(self, kind, key, value):
+        self._buffer[(kind, key)] = None if value is None else pickle.dumps(value)
+        # Application вызывает update_* пачкой через gather: задача записи
+        # запустится после них и заберёт всю пачку разом
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, {}
+            if not batch:
+                return
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception:
+                # Возвращаем несохранённое в буфер, не затирая более свежие значения
+                for key, data in batch.items():
+                    self._buffer.setdefault(key, data)
+                raise
+
+    async def get_user_data(self):
+        return {int(user_id): data for user_id, data in (await self._load('user')).items()}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        rows = await self._load(f'conversation:{name}')
+        return {tuple(json.loads(key)): state for key, state in rows.items()}
+
+    async def update_conversation(self, name, key, new_state):
+        self._put(f'conversation:{name}', json.dumps(key), new_state)
+
+    async def update_user_data(self, user_id, data):
+        self._put('user', str(user_id), data)
+        self._touched.discard(user_id)
+
+    async def drop_user_data(self, user_id):
+        self._put('user', str(user_id), None)
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        # Состояние диалога привязано к чату, а его апдейты всегда в одном процессе
+        # (см. bot.webhook); user_data общая для всех чатов пользователя
+        if not self.shared:
+            return
+        if user_id in self._touched or ('user', str(user_id)) in self._buffer:
+            # Незаписанные изменения этого процесса новее, чем строка в базе
+            return
+        self._touched.add(user_id)
+        async with self._flush_lock:
+            data = await asyncio.to_thread(self._read_one, 'user', str(user_id))
+        if data is not None:
+            user_data.clear()
+            user_data.update(data)
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self._flush()
+        self._conn.close()
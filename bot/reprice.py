@@ -0,0 +1,27 @@
+import argparse
+
+from bot.catalog import Catalog
+from bot.database import BuildSaver
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Пересчёт цен и доступности сохранённых сборок по текущему каталогу; "
+                    "заодно переводит сборки старой версии бота с названий на id компонентов"
+    )
+    parser.add_argument('--db', default='bot_data.db', help="путь к базе бота")
+    parser.add_argument('--batch-size', type=int, default=1000, help="строк в одной транзакции")
+    args = parser.parse_args(argv)
+
+    # Схема обновляется при создании BuildSaver, затем пересчитываются строки
+    saver = BuildSaver(args.db, catalog=Catalog())
+    scanned, updated = saver.reprice_builds(
+        batch_size=args.batch_size,
+        progress=lambda scanned, updated: print(f"Просмотрено сборок: {scanned}, изменено: {updated}", flush=True)
+    )
+    saver.close()
+    print(f"Готово, просмотрено сборок: {scanned}, изменено: {updated}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import re
+from bisect import bisect_left
+from heapq import nsmallest
+
+TOKEN_RE = re.compile(r'[^\W_]+')
+# Сколько общих триграмм (коэффициент Дайса) нужно, чтобы считать слово опечаткой
+MIN_SIMILARITY = 0.5
+# Короче этого слово ищется только как начало других слов: иначе под него подходит почти всё
+MIN_SUBSTRING = 3
+# Сколько разобранных слов запроса помнить (словарь среза не меняется)
+EXPAND_CACHE_SIZE = 4096
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.casefold())
+
+
+def trigrams(token):
+    padded = f' {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def within_one_edit(a, b):
+    """Отличаются ли слова не больше чем на одну вставку, удаление, замену или перестановку соседних букв."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+
+class SearchIndex:
+    """Нечёткий поиск компонентов по названию во всех категориях каталога.
+
+    Названия разбиваются на слова; словарь слов каталога небольшой даже
+    на сотне тысяч позиций (модели повторяются), поэтому каждое слово
+    запроса сопоставляется со словарём: точно, как начало слова (bisect
+    по отсортированному словарю), как подстрока и с опечаткой (через
+    триграммный индекс словаря). Для каждого слова словаря хранится
+    множество компонентов с ним; ответ — пересечение этих множеств.
+    Сначала идут компоненты, где все слова запроса нашлись без опечаток,
+    внутри — более короткие названия.
+    """
+
+    def __init__(self, components):
+        docs = [(category, item) for category, items in components.items() for item in items]
+        # Номер компонента — его место в выдаче при равном качестве совпадения:
+        # короче название, затем порядок каталога
+        docs.sort(key=lambda doc: len(doc[1]['name']))
+        self.docs = docs
+        postings = {}
+        for doc_id, (_, item) in enumerate(docs):
+            for token in set(tokenize(item['name'])):
+                postings.setdefault(token, []).append(doc_id)
+
+        self.vocabulary = sorted(postings)
+        self.postings = [frozenset(postings[token]) for token in self.vocabulary]
+        self.token_ids = {token: i for i, token in enumerate(self.vocabulary)}
+        self.vocabulary_trigrams = {}
+        for i, token in enumerate(self.vocabulary):
+            for trigram in trigrams(token):
+                self.vocabulary_trigrams.setdefault(trigram, []).append(i)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def expand(self, token, partial=True):
+        """Номера слов словаря, подходящих под слово запроса без опечатки.
+
+        Целиком, а при partial — ещё началом слова или подстрокой.
+        """
+        found = set()
+        exact = self.token_ids.get(token)
+        if exact is not None:
+            found.add(exact)
+        if not partial:
+            return found
+
+        # Начало слова: непрерывный диапазон отсортированного словаря
+        i = bisect_left(self.vocabulary, token)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(token):
+            found.add(i)
+            i += 1
+        if len(token) < MIN_SUBSTRING:
+            return found
+
+        # Подстрока: слова словаря, содержащие все внутренние триграммы запроса
+        candidates = None
+        for j in range(len(token) - 2):
+            ids = self.vocabulary_trigrams.get(token[j:j + 3], ())
+            candidates = set(ids) if candidates is None else candidates.intersection(ids)
+            if not candidates:
+                return found
+        found.update(i for i in candidates if token in self.vocabulary[i])
+        return found
+
+    def expand_typos(self, token):
+        """Номера слов словаря, похожих на слово запроса: достаточно общих триграмм или одна правка."""
+        if len(token) < MIN_SUBSTRING:
+            return set()
+        query_trigrams = trigrams(token)
+        shared = {}
+        for trigram in query_trigrams:
+            for i in self.vocabulary_trigrams.get(trigram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        found = set()
+        for i, count in shared.items():
+            candidate = self.vocabulary[i]
+            similarity = 2 * count / (len(query_trigrams) + len(candidate) + 2)
+            if similarity >= MIN_SIMILARITY or (len(token) > 3 and within_one_edit(token, candidate)):
+                found.add(i)
+        return found
+
+    def _postings(self, token, partial, typos):
+        key = (token, partial, typos)
+        postings = self._cache.get(key)
+        if postings is None:
+            ids = self.expand(token, partial)
+            if typos:
+                ids |= self.expand_typos(token)
+            # Сначала короткие списки: пересечение с ними быстрее всего сужает кандидатов
+            postings = sorted((self.postings[i] for i in ids), key=len)
+            if len(self._cache) >= EXPAND_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = postings
+        return postings
+
+    def _match(self, groups, limit, exclude=()):
+        """Первые limit номеров компонентов, где у каждого слова запроса есть подходящее слово.
+
+        groups — по одному списку множеств на слово запроса. Номер
+        компонента — его место в выдаче, поэтому сначала ищем только среди
+        первых номеров (окно), начиная с самой редкой группы и сужая
+        остальными, и расширяем окно, пока в него не попадёт limit
+        совпадений. Все проверки — операции над множествами, то есть в C.
+        """
+        groups = sorted(groups, key=lambda group: sum(map(len, group)))
+        rarest = groups[0]
+        size = sum(map(len, rarest))
+        window = 2 * limit * len(self.docs) // size
+        while True:
+            whole = window * len(rarest) >= size
+            if whole:
+                candidates = rarest[0] if len(rarest) == 1 else frozenset().union(*rarest)
+            else:
+                ids = range(window)
+                candidates = frozenset().union(*(p.intersection(ids) for p in rarest))
+            for group in groups[1:]:
+                if not candidates:
+                    break
+                if len(group) == 1:
+                    candidates = candidates.intersection(group[0])
+                else:
+                    candidates = frozenset().union(*(candidates.intersection(p) for p in group))
+            if exclude:
+                candidates = candidates.difference(exclude)
+            if whole or len(candidates) >= limit:
+                return nsmallest(limit, candidates)
+            window *= 4
+
+    def search(self, query, limit=8):
+        """До limit пар (категория, компонент), лучшие первыми.
+
+        Последнее слово запроса может быть недописанным. Опечатки допускаются только в словах запроса, которые не нашлись
+        как есть; такие совпадения идут после точных.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        # Короткие слова ищутся как начало других слов только в конце запроса,
+        # где их ещё дописывают: «ryzen 5 7600» не должно находить «5600x»
+        partial = [len(token) >= MIN_SUBSTRING for token in tokens]
+        partial[-1] = True
+        groups = [self._postings(token, p, False) for token, p in zip(tokens, partial)]
+        found = self._match(groups, limit) if all(groups) else []
+        if len(found) < limit and not all(groups):
+            groups = [
+                group or self._postings(token, p, True)
+                for token, p, group in zip(tokens, partial, groups)
+            ]
+            if all(groups):
+                found += self._match(groups, limit - len(found), exclude=set(found))
+        return [self.docs[doc_id] for doc_id in found]
@@ -1,39 +1,97 @@
-import json
+from itertools import islice
+
+from bot.breakpoints import BreakpointTable
+from bot.cache import BuildCache
+from bot.catalog import SLOTS, Catalog
+from bot.config import (
+    BUILD_CACHE_SIZE, BUILD_CACHE_TTL, CATALOG_FORMAT, CATALOG_RELOAD_INTERVAL, SELECTOR_BACKEND,
+    SELECTOR_BREAKPOINTS, SELECTOR_MODE
+)
+from bot.keys import AtLeast, HasField, SortKey
+from bot.metrics import NULL_HISTOGRAM, metrics
+from bot.optimizer import GOAL_SCORES, PSU_HEADROOM, BuildOptimizer
+
+# Режимы подбора: глобальная оптимизация под общий бюджет или
+# фиксированные доли бюджета на каждую категорию
+MODE_OPTIMIZER = 'optimizer'
+MODE_PERCENT = 'percent'
+
+# Ключ в get_budgets_and_params -> категория каталога
+PARAM_CATEGORIES = {
+    'gpu': 'gpu',
+    'cpu': 'cpu',
+    'ram': 'ram',
+    'ssd': 'ssd',
+    'psu': 'psu',
+    'mb': 'motherboard',
+    'pc_case': 'pc_case',
+    'cooler': 'cooler',
+}
+SLOT_PARAMS = {category: key for key, category in PARAM_CATEGORIES.items()}
+
+# Замена компонента -> что от него зависит и подбирается заново (в этом порядке)
+RESELECT_AFTER = {
+    'cpu': ('motherboard', 'ram', 'pc_case', 'psu'),
+    'gpu': ('psu',),
+    'motherboard': ('ram', 'pc_case'),
+    'ram': (),
+    'ssd': (),
+    'psu': (),
+    'pc_case': (),
+    'cooler': (),
+}
+# А это подбирается заново, только если перестало подходить: кулер — к сокету нового процессора
+RESELECT_IF_INCOMPATIBLE = {'cpu': ('cooler',)}
+
+
+BY_3DMARK = SortKey('3dmark')
+BY_SINGLE_CORE = SortKey('cinebench_r23_single', 'l3_cache')
+BY_MULTI_CORE = SortKey('cinebench_r23_multi')
+BY_IGPU_AND_MULTI_CORE = SortKey(HasField('igpu'), 'cinebench_r23_multi')
+BY_FREQUENCY = SortKey('frequency')
+BY_TOTAL_CAPACITY = SortKey('total_capacity')
+BY_CAPACITY_AND_WRITE = SortKey('capacity', 'write_speed')
+BY_POWER_AND_PRICE = SortKey('power', 'price')
+BY_PRICE = SortKey('price')
+BY_TDP = SortKey('tdp')
+
+# Гистограммы времени этапов подбора, заведённые заранее, чтобы не тратить время на метки
+STAGE_TIMERS = {
+    stage: metrics.histogram('selector_stage_seconds', stage=stage)
+    for stage in (
+        'gpu', 'cpu', 'compat_motherboard', 'motherboard', 'compat_ram', 'ram', 'ssd', 'psu', 'compat_case',
+        'pc_case', 'cooler', 'optimizer', 'percent', 'breakpoints', 'reselect'
+    )
+}
+UNTIMED_STAGES = dict.fromkeys(STAGE_TIMERS, NULL_HISTOGRAM)
+
 
 class ComponentSelector:
-    def __init__(self):
-        self.components = self.load_components()
-    
+    def __init__(self, catalog=None, mode=SELECTOR_MODE, cache_size=BUILD_CACHE_SIZE, cache_ttl=BUILD_CACHE_TTL,
+                 use_breakpoints=SELECTOR_BREAKPOINTS):
+        self.catalog = catalog or Catalog(
+            check_interval=CATALOG_RELOAD_INTERVAL, backend=SELECTOR_BACKEND, packed=CATALOG_FORMAT == 'auto'
+        )
+        self.mode = mode
+        self.optimizer = BuildOptimizer()
+        self.cache = BuildCache(cache_size, cache_ttl) if cache_size else None
+        if self.cache is not None:
+            self.catalog.add_reload_listener(lambda snapshot: self.cache.clear())
+        # Таблицы точек смены сборки по целям (только для режима долей)
+        self.breakpoints = {} if use_breakpoints else None
+
+    @property
+    def components(self):
+        return self.catalog.snapshot.components
+
     def load_components(self):
-        with open("bot/data/cpu.json", "r", encoding="utf-8") as f:
-            cpu = json.load(f)
-        with open("bot/data/gpu.json", "r", encoding="utf-8") as f:
-            gpu = json.load(f)
-        with open("bot/data/ram.json", "r", encoding="utf-8") as f:
-            ram = json.load(f)
-        with open("bot/data/ssd.json", "r", encoding="utf-8") as f:
-            ssd = json.load(f)
-        with open("bot/data/psu.json", "r", encoding="utf-8") as f:
-            psu = json.load(f)
-        with open("bot/data/case.json", "r", encoding="utf-8") as f:
-            case = json.load(f)
-        with open("bot/data/coolers.json", "r", encoding="utf-8") as f:
-            coolers = json.load(f)
-        with open("bot/data/motherboard.json", "r", encoding="utf-8") as f:
-            motherboard = json.load(f)
-
-        return {
-            'cpu': cpu,
-            'gpu': gpu,
-            'ram': ram,
-            'ssd': ssd,
-            'psu': psu,
-            'pc_case': case,
-            'cooler': coolers,
-            'motherboard': motherboard
-        }
-    
+        self.catalog.reload_if_changed()
+        return self.catalog.snapshot.components
+
     def select_component(self, comp_list, budget, filter_func=None, sort_key=None):
+        # PriceIndex или ColumnarIndex из среза каталога
+        if hasattr(comp_list, 'best'):
+            return comp_list.best(budget, filter_func=filter_func, sort_key=sort_key)
 
         options = [c for c in comp_list if c['price'] is not None and c['price'] <= budget]
         if filter_func:
@@ -49,41 +107,224 @@ class ComponentSelector:
 
         if goal == "games":
             return {
-                'gpu': {'budget': budget * 0.5, 'sort_key': lambda x: x.get('3dmark', 0)},
-                'cpu': {'budget': budget * 0.16, 'sort_key': lambda x: (x.get('cinebench_r23_single', 0), x.get('l3_cache', 0))},
-                'ram': {'budget': budget * 0.07, 'sort_key': lambda x: x.get('frequency', 0)},
-                'ssd': {'budget': budget * 0.04, 'sort_key': lambda x: (x.get('capacity', 0), x.get('write_speed', 0))},
-                'psu': {'budget': budget * 0.07, 'sort_key': lambda x: (x.get('power', 0), x.get('price', 0))},
-                'mb': {'budget': budget * 0.1, 'sort_key': lambda x: x.get('price', 0)},
-                'pc_case': {'budget': budget * 0.03, 'sort_key': lambda x: x.get('price', 0)},
-                'cooler': {'budget': budget * 0.03, 'sort_key': lambda x: x.get('tdp', 0)},
+                'gpu': {'budget': budget * 0.5, 'sort_key': BY_3DMARK},
+                'cpu': {'budget': budget * 0.16, 'sort_key': BY_SINGLE_CORE},
+                'ram': {'budget': budget * 0.07, 'sort_key': BY_FREQUENCY},
+                'ssd': {'budget': budget * 0.04, 'sort_key': BY_CAPACITY_AND_WRITE},
+                'psu': {'budget': budget * 0.07, 'sort_key': BY_POWER_AND_PRICE},
+                'mb': {'budget': budget * 0.1, 'sort_key': BY_PRICE},
+                'pc_case': {'budget': budget * 0.03, 'sort_key': BY_PRICE},
+                'cooler': {'budget': budget * 0.03, 'sort_key': BY_TDP},
             }
         elif goal == "editing":
             return {
-                'gpu': {'budget': budget * 0.4, 'sort_key': lambda x: x.get('3dmark', 0)},
-                'cpu': {'budget': budget * 0.26, 'sort_key': lambda x: x.get('cinebench_r23_multi', 0)},
-                'ram': {'budget': budget * 0.07, 'sort_key': lambda x: x.get('total_capacity', 0)},
-                'ssd': {'budget': budget * 0.04, 'sort_key': lambda x: (x.get('capacity', 0), x.get('write_speed', 0))},
-                'psu': {'budget': budget * 0.07, 'sort_key': lambda x: (x.get('power', 0), x.get('price', 0))},
-                'mb': {'budget': budget * 0.1, 'sort_key': lambda x: x.get('price', 0)},
-                'pc_case': {'budget': budget * 0.03, 'sort_key': lambda x: x.get('price', 0)},
-                'cooler': {'budget': budget * 0.03, 'sort_key': lambda x: x.get('tdp', 0)},
+                'gpu': {'budget': budget * 0.4, 'sort_key': BY_3DMARK},
+                'cpu': {'budget': budget * 0.26, 'sort_key': BY_MULTI_CORE},
+                'ram': {'budget': budget * 0.07, 'sort_key': BY_TOTAL_CAPACITY},
+                'ssd': {'budget': budget * 0.04, 'sort_key': BY_CAPACITY_AND_WRITE},
+                'psu': {'budget': budget * 0.07, 'sort_key': BY_POWER_AND_PRICE},
+                'mb': {'budget': budget * 0.1, 'sort_key': BY_PRICE},
+                'pc_case': {'budget': budget * 0.03, 'sort_key': BY_PRICE},
+                'cooler': {'budget': budget * 0.03, 'sort_key': BY_TDP},
             }
         elif goal == "office":
             return {
                 'gpu': {'budget': 0, 'sort_key': None},
-                'cpu': {'budget': budget * 0.43, 'sort_key': lambda x: ( x.get('igpu') is not None, x.get('cinebench_r23_multi', 0))},
-                'ram': {'budget': budget * 0.13, 'sort_key': lambda x: x.get('frequency', 0)},
-                'ssd': {'budget': budget * 0.07, 'sort_key': lambda x: (x.get('capacity', 0), x.get('write_speed', 0))},
-                'psu': {'budget': budget * 0.07, 'sort_key': lambda x: (x.get('power', 0), x.get('price', 0))},
-                'mb': {'budget': budget * 0.17, 'sort_key': lambda x: x.get('price', 0)},
-                'pc_case': {'budget': budget * 0.05, 'sort_key': lambda x: x.get('price', 0)},
-                'cooler': {'budget': budget * 0.05, 'sort_key': lambda x: x.get('tdp', 0)},
+                'cpu': {'budget': budget * 0.43, 'sort_key': BY_IGPU_AND_MULTI_CORE},
+                'ram': {'budget': budget * 0.13, 'sort_key': BY_FREQUENCY},
+                'ssd': {'budget': budget * 0.07, 'sort_key': BY_CAPACITY_AND_WRITE},
+                'psu': {'budget': budget * 0.07, 'sort_key': BY_POWER_AND_PRICE},
+                'mb': {'budget': budget * 0.17, 'sort_key': BY_PRICE},
+                'pc_case': {'budget': budget * 0.05, 'sort_key': BY_PRICE},
+                'cooler': {'budget': budget * 0.05, 'sort_key': BY_TDP},
             }
 
-    def select(self, budget, goal):
-        components = self.load_components()
+    def budget_bucket(self, budget, goal, mode, snapshot):
+        """Ключ, одинаковый для всех бюджетов, дающих одну и ту же сборку.
+
+        В режиме долей сборка зависит от бюджета только через то, сколько
+        компонентов каждой категории укладывается в её долю, поэтому ключ —
+        набор этих количеств. Для оптимизатора точного дешёвого ключа нет,
+        и в ключ идёт сам бюджет.
+        """
+        if mode != MODE_PERCENT:
+            return budget
+        params = self.get_budgets_and_params(budget, goal)
+        return tuple(
+            snapshot.indexes[PARAM_CATEGORIES[key]].cutoff(param['budget'])
+            for key, param in params.items()
+        )
+
+    def breakpoint_table(self, goal, snapshot=None):
+        snapshot = snapshot or self.catalog.snapshot
+        table = self.breakpoints.get(goal)
+        if table is None or table.version != snapshot.version:
+            table = BreakpointTable.compute(self, goal, snapshot)
+            self.breakpoints[goal] = table
+        return table
+
+    def precompute_breakpoints(self, goals=('games', 'office', 'editing')):
+        for goal in goals:
+            self.breakpoint_table(goal)
+
+    def select(self, budget, goal, mode=None):
+        mode = mode or self.mode
+        self.catalog.reload_if_changed()
+        snapshot = self.catalog.snapshot
+
+        if mode == MODE_PERCENT and self.breakpoints is not None and budget >= 0:
+            with STAGE_TIMERS['breakpoints'].time():
+                return dict(self.breakpoint_table(goal, snapshot).lookup(budget))
+
+        key = (snapshot.version, mode, goal, self.budget_bucket(budget, goal, mode, snapshot))
+        # Копия, чтобы вызывающий код не мог испортить закешированную сборку
+        return dict(self._cached(key, lambda: self._select(snapshot, budget, goal, mode)))
+
+    def select_alternatives(self, budget, goal, count, mode=None):
+        """До count сборок разного ценового уровня (от всего бюджета до 60% от него), самая сильная первой.
+
+        Все варианты находит один проход оптимизатора; в режиме долей и
+        если оптимизатор ничего не нашёл, вариант один — как у select.
+        """
+        mode = mode or self.mode
+        if mode != MODE_OPTIMIZER or count <= 1:
+            return [self.select(budget, goal, mode)]
+        self.catalog.reload_if_changed()
+        snapshot = self.catalog.snapshot
+
+        def select_top():
+            with STAGE_TIMERS['optimizer'].time():
+                builds = self.optimizer.select_top(snapshot, budget, goal, count)
+            return builds or [self._select(snapshot, budget, goal, mode)]
+
+        key = (snapshot.version, mode, goal, budget, count)
+        return [dict(build) for build in self._cached(key, select_top)]
+
+    def _cached(self, key, compute):
+        if self.cache is None:
+            return compute()
+        value = self.cache.get(key)
+        if value is None:
+            metrics.inc('build_cache_lookups_total', result='miss')
+            value = compute()
+            self.cache.put(key, value)
+        else:
+            metrics.inc('build_cache_lookups_total', result='hit')
+        return value
+
+    def _select(self, snapshot, budget, goal, mode):
+        if mode == MODE_OPTIMIZER:
+            with STAGE_TIMERS['optimizer'].time():
+                build = self.optimizer.select(snapshot, budget, goal)
+            if build is not None:
+                return build
+        # Если оптимизатор не нашёл сборку целиком, подбираем по долям бюджета
+        with STAGE_TIMERS['percent'].time():
+            return self.select_percent(budget, goal, snapshot)
+
+    def required_power(self, build):
+        total_tdp = sum(build[slot]['tdp'] for slot in ('cpu', 'gpu') if build[slot])
+        return total_tdp * PSU_HEADROOM
+
+    def candidates(self, build, slot, snapshot):
+        """Индекс компонентов slot, совместимых с остальной сборкой, и фильтр к нему."""
+        compatibility = snapshot.compatibility
+        if slot == 'motherboard':
+            return (compatibility.motherboards_for_cpu(build['cpu']) if build['cpu'] else None), None
+        if slot == 'ram':
+            return (compatibility.ram_for_motherboard(build['motherboard']) if build['motherboard'] else None), None
+        if slot == 'pc_case':
+            return (compatibility.cases_for_motherboard(build['motherboard']) if build['motherboard'] else None), None
+        if slot == 'psu':
+            return snapshot.indexes['psu'], AtLeast('power', self.required_power(build))
+        if slot == 'cooler' and build['cpu']:
+            # Для кулеров без списка сокетов совместимость неизвестна — берём из всех
+            coolers = compatibility.coolers_for_cpu(build['cpu'])
+            return (coolers if len(coolers) else snapshot.indexes['cooler']), None
+        return snapshot.indexes[slot], None
+
+    def fits(self, build, slot, snapshot):
+        pool, filter_func = self.candidates(build, slot, snapshot)
+        component = build[slot]
+        if pool is None:
+            return False
+        if filter_func is not None and not filter_func(component):
+            return False
+        return any(c['id'] == component['id'] for c in pool)
+
+    def reselect(self, build, slot, component, budget, goal):
+        """Сборка с заменённым компонентом: заново подбирается только то, что от него зависит.
+
+        Остальные компоненты берутся из build как есть. Зависимым достаётся
+        остаток бюджета в тех же пропорциях, что и в режиме долей; если в
+        свою долю ничего не помещается, берётся самый дешёвый совместимый
+        вариант. Оптимизатор не запускается: каждый компонент — один поиск
+        по индексу совместимости.
+        """
+        self.catalog.reload_if_changed()
+        snapshot = self.catalog.snapshot
+        with STAGE_TIMERS['reselect'].time():
+            result = {s: build[s] for s in SLOTS}
+            result[slot] = component
+            redo = list(RESELECT_AFTER[slot])
+            for checked in RESELECT_IF_INCOMPATIBLE.get(slot, ()):
+                if result[checked] is not None and not self.fits(result, checked, snapshot):
+                    redo.append(checked)
+            for s in redo:
+                result[s] = None
+
+            params = self.get_budgets_and_params(budget, goal)
+            shares = {s: params[SLOT_PARAMS[s]]['budget'] for s in redo}
+            total_share = sum(shares.values())
+            free = budget - sum(c['price'] for c in result.values() if c and c['price'] is not None)
+            for s in redo:
+                pool, filter_func = self.candidates(result, s, snapshot)
+                if pool is None:
+                    continue
+                share = free * shares[s] / total_share if total_share else 0
+                result[s] = (
+                    self.select_component(pool, share, filter_func, params[SLOT_PARAMS[s]]['sort_key'])
+                    or self.select_component(pool, float('inf'), filter_func)
+                )
+            result['total_price'] = sum(c['price'] for c in result.values() if c and c['price'] is not None)
+        return result
+
+    def suits_goal(self, build, slot, component, goal):
+        """Годится ли component на место slot для цели: те же ограничения, что и при подборе."""
+        if slot == 'gpu':
+            return 'gpu' in GOAL_SCORES[goal]
+        if slot == 'cpu' and build['gpu'] is None:
+            # Без видеокарты изображение выводит только встроенная графика
+            return component.get('igpu') is not None
+        return True
+
+    def replacement_options(self, build, slot, count, goal):
+        """До count подходящих цели компонентов на замену build[slot], ближайших к нему по цене (по возрастанию цены)."""
+        index = self.catalog.snapshot.indexes[slot]
+        items = index.items
+        current = build[slot]
+        position = index.cutoff(current['price']) if current else 0
+
+        def nearest(positions):
+            suitable = (
+                items[i] for i in positions
+                if (current is None or items[i]['id'] != current['id'])
+                and self.suits_goal(build, slot, items[i], goal)
+            )
+            return list(islice(suitable, count))
+
+        options = nearest(range(position - 1, -1, -1)) + nearest(range(position, len(items)))
+        if current:
+            options.sort(key=lambda c: abs(c['price'] - current['price']))
+        return sorted(options[:count], key=lambda c: c['price'])
+
+    def select_percent(self, budget, goal, snapshot=None):
+        snapshot = snapshot or self.catalog.snapshot
+        indexes = snapshot.indexes
+        compatibility = snapshot.compatibility
         params = self.get_budgets_and_params(budget, goal)
+        # Этапы внутри одного подбора слишком короткие, чтобы мерить каждый вызов
+        stage = STAGE_TIMERS if metrics.sampled() else UNTIMED_STAGES
         build = {}
 
         # GPU
@@ -91,96 +332,100 @@ class ComponentSelector:
         if gpu_budget == 0:
             build['gpu'] = None
         else:
-            gpu = self.select_component(
-                components['gpu'],
-                gpu_budget,
-                sort_key=params['gpu']['sort_key']
-            )
+            with stage['gpu'].time():
+                gpu = self.select_component(
+                    indexes['gpu'],
+                    gpu_budget,
+                    sort_key=params['gpu']['sort_key']
+                )
             build['gpu'] = gpu
 
         # CPU
-        cpu = self.select_component(
-            components['cpu'],
-            params['cpu']['budget'],
-            sort_key=params['cpu']['sort_key']
-        )
+        with stage['cpu'].time():
+            cpu = self.select_component(
+                indexes['cpu'],
+                params['cpu']['budget'],
+                sort_key=params['cpu']['sort_key']
+            )
         build['cpu'] = cpu
 
         # MB
         if build['cpu']:
-            mb_options = [m for m in components['motherboard'] if m['socket'] == build['cpu']['socket']]
-            
-            cpu_chipsets = build['cpu']['compatibility_mb']
-            if cpu_chipsets:
-                mb_options = [m for m in mb_options if m['chipset'] in cpu_chipsets]
-
-            mb = self.select_component(
-                mb_options,
-                params['mb']['budget'],
-                sort_key=params['mb']['sort_key']
-            )
+            with stage['compat_motherboard'].time():
+                motherboards = compatibility.motherboards_for_cpu(build['cpu'])
+            with stage['motherboard'].time():
+                mb = self.select_component(
+                    motherboards,
+                    params['mb']['budget'],
+                    sort_key=params['mb']['sort_key']
+                )
             build['motherboard'] = mb
         else:
             build['motherboard'] = None
 
         # RAM
         if build['motherboard']:
-            mb_ddr = build['motherboard']['ddr']
-            ram_options = [r for r in components['ram'] if r['ddr_version'] == mb_ddr]
-            ram = self.select_component(
-                ram_options,
-                params['ram']['budget'],
-                sort_key=params['ram']['sort_key']
-            )
+            with stage['compat_ram'].time():
+                modules = compatibility.ram_for_motherboard(build['motherboard'])
+            with stage['ram'].time():
+                ram = self.select_component(
+                    modules,
+                    params['ram']['budget'],
+                    sort_key=params['ram']['sort_key']
+                )
             build['ram'] = ram
         else:
             build['ram'] = None
 
 
         # SSD
-        ssd = self.select_component(
-            components['ssd'],
-            params['ssd']['budget'],
-            sort_key=params['ssd']['sort_key']
-        )
+        with stage['ssd'].time():
+            ssd = self.select_component(
+                indexes['ssd'],
+                params['ssd']['budget'],
+                sort_key=params['ssd']['sort_key']
+            )
         build['ssd'] = ssd
 
         # PSU
-        total_tdp = 0
-        if build['cpu']:
-            total_tdp += build['cpu']['tdp']
-        if build['gpu']:
-            total_tdp += build['gpu']['tdp']
+        with stage['psu'].time():
+            total_tdp = 0
+            if build['cpu']:
+                total_tdp += build['cpu']['tdp']
+            if build['gpu']:
+                total_tdp += build['gpu']['tdp']
 
-        min_power = total_tdp * 1.5
+            min_power = total_tdp * 1.5
 
-        psu = self.select_component(
-            components['psu'],
-            params['psu']['budget'],
-            filter_func=lambda p: p['power'] >= min_power,
-            sort_key=params['psu']['sort_key']
-        )
+            psu = self.select_component(
+                indexes['psu'],
+                params['psu']['budget'],
+                filter_func=AtLeast('power', min_power),
+                sort_key=params['psu']['sort_key']
+            )
         build['psu'] = psu
 
         # Case
         if build['motherboard']:
-            mb_form = build['motherboard']['form_factor']
-            case_options = [c for c in components['pc_case'] if mb_form in c['form_factor']]
-            case = self.select_component(
-                case_options,
-                params['pc_case']['budget'],
-                sort_key=params['pc_case']['sort_key']
-            )
+            with stage['compat_case'].time():
+                cases = compatibility.cases_for_motherboard(build['motherboard'])
+            with stage['pc_case'].time():
+                case = self.select_component(
+                    cases,
+                    params['pc_case']['budget'],
+                    sort_key=params['pc_case']['sort_key']
+                )
             build['pc_case'] = case
         else:
             build['pc_case'] = None
 
         # Cooler
-        cooler = self.select_component(
-            components['cooler'],
-            params['cooler']['budget'],
-            sort_key=params['cooler']['sort_key']
-        )
+        with stage['cooler'].time():
+            cooler = self.select_component(
+                indexes['cooler'],
+                params['cooler']['budget'],
+                sort_key=params['cooler']['sort_key']
+            )
         build['cooler'] = cooler
 
         # Подсчёт общей цены
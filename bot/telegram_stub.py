@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from urllib.parse import parse_qs
+
+import httpx
+
+from bot.webhook import read_request
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'PC Builder', 'username': 'pc_builder_bot'}
+GOALS = ('games', 'office', 'editing')
+
+
+class FakeBotApi:
+    """Локальная замена api.telegram.org: отвечает «ok» на любой метод и запоминает вызовы.
+
+    Бот подключается к ней через TELEGRAM_API_URL=http://<host>:<port>/bot.
+    Каждый ответ задерживается на latency секунд, как у настоящего API.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        # Последнее отправленное или изменённое сообщение в чате и ответы на нажатия кнопок
+        self.last_sent = {}
+        self.answers = {}
+        self._message_ids = itertools.count(1000)
+
+    def respond(self, method, params):
+        self.calls.append((method, params))
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'answerCallbackQuery':
+            self.answers[params.get('callback_query_id')] = params.get('text')
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id', 0))
+            self.last_sent[chat_id] = params
+            return {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }
+        return True
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    method, path, headers, body = await read_request(reader)
+                except (asyncio.IncompleteReadError, ValueError):
+                    break
+                if not method:
+                    break
+                if 'json' in headers.get('content-type', ''):
+                    params = json.loads(body or b'{}')
+                else:
+                    params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                payload = json.dumps({'ok': True, 'result': self.respond(path.rsplit('/', 1)[-1], params)})
+                payload = payload.encode()
+                writer.write(
+                    f'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n'
+                    f'Connection: keep-alive\r\n\r\n'.encode() + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def buttons(params):
+        """callback_data кнопок сообщения, по одной первой кнопке из каждого ряда."""
+        markup = params.get('reply_markup') if params else None
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        if not markup:
+            return []
+        return [row[0]['callback_data'] for row in markup['inline_keyboard'] if 'callback_data' in row[0]]
+
+    def texts_for(self, chat_id):
+        return [
+            params.get('text', '') for method, params in self.calls
+            if method in ('sendMessage', 'editMessageText') and int(params.get('chat_id', 0)) == chat_id
+        ]
+
+
+class UpdateFactory:
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def _user(self, chat_id):
+        return {'id': chat_id, 'is_bot': False, 'first_name': f'user{chat_id}'}
+
+    def _message(self, chat_id, text, sender):
+        message = {
+            'message_id': next(self._ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': sender,
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return message
+
+    def message(self, chat_id, text):
+        return {'update_id': next(self._ids), 'message': self._message(chat_id, text, self._user(chat_id))}
+
+    def callback(self, chat_id, data):
+        return {
+            'update_id': next(self._ids),
+            'callback_query': {
+                'id': str(next(self._ids)),
+                'from': self._user(chat_id),
+                'chat_instance': str(chat_id),
+                'data': data,
+                'message': self._message(chat_id, 'Выберите действие:', BOT_USER),
+            },
+        }
+
+    def conversation(self, chat_id, goal, budget):
+        """/start -> новая сборка -> цель -> бюджет; порядок важен для ConversationHandler."""
+        return [
+            self.message(chat_id, '/start'),
+            self.callback(chat_id, 'new_build'),
+            self.callback(chat_id, goal),
+            self.message(chat_id, str(budget)),
+        ]
+
+
+async def wait_for_webhook(client, url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.post(url, content=b'{}')
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+async def run(args):
+    api = FakeBotApi()
+    server = await asyncio.start_server(api.handle, args.api_host, args.api_port)
+    print(f"заглушка Bot API: http://{args.api_host}:{args.api_port}/bot")
+
+    rnd = random.Random(args.seed)
+    factory = UpdateFactory()
+    headers = {'X-Telegram-Bot-Api-Secret-Token': args.secret} if args.secret else {}
+    chats = [10000 + i for i in range(args.chats)]
+
+    async with server, httpx.AsyncClient(headers=headers, timeout=10) as client:
+        await wait_for_webhook(client, args.webhook)
+        # Воркеры поднимаются дольше слушателя: ждём, пока заглушку спросят getMe
+        while sum(method == 'getMe' for method, _ in api.calls) < args.workers:
+            await asyncio.sleep(0.2)
+
+        async def send_chat(chat_id):
+            # Апдейты одного чата уходят подряд, не дожидаясь ответов бота
+            goal = rnd.choice(GOALS)
+            for update in factory.conversation(chat_id, goal, rnd.randint(60000, 600000)):
+                response = await client.post(args.webhook, json=update)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send_chat(chat_id) for chat_id in chats))
+
+        # Диалог дошёл до конца, если бот прислал сборку
+        deadline = time.monotonic() + args.timeout
+        while True:
+            done = [chat_id for chat_id in chats if any('CPU:' in t for t in api.texts_for(chat_id))]
+            if len(done) == len(chats) or time.monotonic() > deadline:
+                break
+            await asyncio.sleep(0.2)
+        elapsed = time.perf_counter() - start
+
+    print(f"чатов: {len(chats)}, диалогов со сборкой: {len(done)}, вызовов Bot API: {len(api.calls)}, "
+          f"время: {elapsed:.2f}с")
+    return len(done) == len(chats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Заглушка Telegram: Bot API для ответов бота и отправка апдейтов в webhook"
+    )
+    parser.add_argument('--webhook', default='http://127.0.0.1:8443/telegram', help="адрес webhook бота")
+    parser.add_argument('--secret', default='', help="WEBHOOK_SECRET бота")
+    parser.add_argument('--api-host', default='127.0.0.1')
+    parser.add_argument('--api-port', type=int, default=8081)
+    parser.add_argument('--workers', type=int, default=2, help="WEBHOOK_WORKERS бота")
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--timeout', type=float, default=60.0, help="сколько ждать ответов бота")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    raise SystemExit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == '__main__':
+    main()
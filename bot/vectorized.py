@@ -0,0 +1,100 @@
+import numpy as np
+
+from bot.catalog import SLOTS
+from bot.keys import AtLeast, HasField, SortKey
+
+
+class ColumnarIndex:
+    """Векторизованный аналог PriceIndex на колонках NumPy.
+
+    Компоненты отсортированы по цене так же, как в PriceIndex; числовые
+    поля превращаются в массивы при первом обращении. Отбор по бюджету и
+    фильтру — маски, лексикографический max по SortKey — последовательное
+    сужение маски по каждому полю ключа. Ничьи разрешаются по позиции в
+    файле каталога, как и в чистом Python.
+    """
+
+    def __init__(self, items):
+        entries = sorted(
+            ((item['price'], position, item) for position, item in enumerate(items) if item['price'] is not None),
+            key=lambda e: (e[0], e[1])
+        )
+        self.prices = np.array([e[0] for e in entries], dtype=np.float64)
+        self.positions = np.array([e[1] for e in entries], dtype=np.int64)
+        self.items = tuple(e[2] for e in entries)
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def cutoff(self, budget):
+        return int(np.searchsorted(self.prices, budget, side='right'))
+
+    def column(self, field):
+        key = ('has', field.name) if isinstance(field, HasField) else field
+        column = self._columns.get(key)
+        if column is None:
+            if isinstance(field, HasField):
+                column = np.array([item.get(field.name) is not None for item in self.items], dtype=bool)
+            else:
+                column = np.array([item.get(field, 0) for item in self.items], dtype=np.float64)
+            self._columns[key] = column
+        return column
+
+    def _mask(self, n, filter_func):
+        if filter_func is None:
+            return np.ones(n, dtype=bool)
+        if isinstance(filter_func, AtLeast):
+            return self.column(filter_func.field)[:n] >= filter_func.threshold
+        return np.fromiter((bool(filter_func(item)) for item in self.items[:n]), dtype=bool, count=n)
+
+    def best(self, budget, sort_key=None, filter_func=None):
+        n = self.cutoff(budget)
+        if n == 0:
+            return None
+        mask = self._mask(n, filter_func)
+        if not mask.any():
+            return None
+        if sort_key is None:
+            return self.items[int(np.argmax(mask))]
+        if isinstance(sort_key, SortKey):
+            for field in sort_key.fields:
+                column = self.column(field)[:n]
+                mask &= column == column[mask].max()
+        else:
+            values = [sort_key(item) for item in self.items[:n]]
+            top = max(v for v, m in zip(values, mask) if m)
+            mask &= np.fromiter((v == top for v in values), dtype=bool, count=n)
+        candidates = np.flatnonzero(mask)
+        return self.items[int(candidates[np.argmin(self.positions[candidates])])]
+
+
+def check_parity(reference, candidate, goals=('games', 'office', 'editing'), budgets=range(20000, 600001, 500)):
+    """Сравнивает сборки двух селекторов; возвращает список расхождений."""
+    mismatches = []
+    for goal in goals:
+        for budget in budgets:
+            expected = reference.select(budget, goal)
+            actual = candidate.select(budget, goal)
+            for slot in SLOTS:
+                if expected[slot] != actual[slot]:
+                    mismatches.append((goal, budget, slot))
+            if expected['total_price'] != actual['total_price']:
+                mismatches.append((goal, budget, 'total_price'))
+    return mismatches
+
+
+if __name__ == '__main__':
+    from bot.catalog import Catalog
+    from bot.selector import MODE_PERCENT, ComponentSelector
+
+    python_selector = ComponentSelector(Catalog(backend='python'), mode=MODE_PERCENT)
+    numpy_selector = ComponentSelector(Catalog(backend='numpy'), mode=MODE_PERCENT)
+    mismatches = check_parity(python_selector, numpy_selector)
+    for goal, budget, slot in mismatches[:20]:
+        print(f"{goal} {budget}: {slot} differs")
+    print(f"Расхождений: {len(mismatches)}")
+    raise SystemExit(1 if mismatches else 0)
@@ -0,0 +1,227 @@
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+
+from telegram import Bot, Update
+
+from bot.config import (
+    METRICS_PORT, TELEGRAM_API_URL, TOKEN, WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_SECRET, WEBHOOK_URL, WEBHOOK_WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+# Апдейт без чата (например, inline-запрос) маршрутизируется по отправителю
+UPDATE_KINDS = (
+    'message', 'edited_message', 'channel_post', 'edited_channel_post', 'callback_query', 'inline_query',
+    'chosen_inline_result', 'shipping_query', 'pre_checkout_query', 'my_chat_member', 'chat_member',
+    'chat_join_request',
+)
+
+
+def update_chat_id(data):
+    """Чат, к которому относится апдейт (сырые данные из webhook)."""
+    for kind in UPDATE_KINDS:
+        payload = data.get(kind)
+        if not payload:
+            continue
+        chat = payload.get('chat') or (payload.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+        sender = payload.get('from')
+        if sender:
+            return sender['id']
+    return 0
+
+
+def worker_for_chat(chat_id, workers):
+    return abs(chat_id) % workers
+
+
+async def read_request(reader):
+    """(метод, путь, заголовки, тело) одного HTTP-запроса."""
+    request_line = (await reader.readline()).decode('latin-1').split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    method, path = (request_line + ['', ''])[:2]
+    return method, path, headers, body
+
+
+async def write_response(writer, status, body=b''):
+    writer.write(
+        f'HTTP/1.1 {status}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\n'
+        f'Connection: keep-alive\r\n\r\n'.encode() + body
+    )
+    await writer.drain()
+
+
+class UpdateRouter:
+    """Принимает апдейты по HTTP и раскладывает их по очередям воркеров.
+
+    Все апдейты одного чата попадают в одну и ту же очередь в порядке
+    поступления, поэтому и обрабатываются по порядку: состояние диалога
+    и user_data этого чата живут в одном воркере.
+    """
+
+    def __init__(self, queues, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+        self.queues = queues
+        self.path = path
+        self.secret = secret
+
+    def route(self, data):
+        if not isinstance(data, dict) or 'update_id' not in data:
+            raise ValueError("не апдейт Telegram")
+        index = worker_for_chat(update_chat_id(data), len(self.queues))
+        self.queues[index].put_nowait(data)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    method, path, headers, body = await read_request(reader)
+                except (asyncio.IncompleteReadError, ValueError):
+                    break
+                if not method:
+                    break
+                if method != 'POST' or path.split('?')[0] != self.path:
+                    await write_response(writer, '404 Not Found')
+                    continue
+                token = headers.get('x-telegram-bot-api-secret-token', '')
+                if not hmac.compare_digest(token, self.secret):
+                    await write_response(writer, '403 Forbidden')
+                    continue
+                try:
+                    self.route(json.loads(body))
+                except ValueError:
+                    await write_response(writer, '400 Bad Request')
+                    continue
+                except queue.Full:
+                    # Telegram повторит доставку позже
+                    await write_response(writer, '503 Service Unavailable')
+                    continue
+                await write_response(writer, '200 OK')
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+class ChatSerializer:
+    """Запускает обработку апдейтов параллельно, но по одному на чат."""
+
+    def __init__(self):
+        self._tails = {}
+
+    def submit(self, chat_id, coro):
+        previous = self._tails.get(chat_id)
+        task = asyncio.create_task(self._run(chat_id, previous, coro))
+        self._tails[chat_id] = task
+        return task
+
+    async def _run(self, chat_id, previous, coro):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            await coro
+        finally:
+            if self._tails.get(chat_id) is asyncio.current_task():
+                del self._tails[chat_id]
+
+    async def join(self):
+        while self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+
+async def serve_worker(index, updates):
+    from bot.bot import build_application
+    from bot.handlers import BotHandlers
+
+    # Чистку и переоценку сборок делает только первый воркер, метрики — каждый на своём порту
+    app = build_application(
+        BotHandlers(), updater=False, prune_builds=index == 0, reprice_builds=index == 0,
+        metrics_port=METRICS_PORT + index if METRICS_PORT else 0
+    )
+    serializer = ChatSerializer()
+    loop = asyncio.get_running_loop()
+
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+            try:
+                update = Update.de_json(data, app.bot)
+            except Exception:
+                logger.exception("не удалось разобрать апдейт %s", data.get('update_id'))
+                continue
+            serializer.submit(update_chat_id(data), app.process_update(update))
+        await serializer.join()
+    finally:
+        await app.stop()
+        await app.shutdown()
+        await app.post_shutdown(app)
+
+
+def worker_process(index, updates):
+    # Останавливает воркеры слушатель (через None в очереди), чтобы они успели
+    # дообработать очередь и сохранить состояния диалогов
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(format=f'[worker {index}] %(levelname)s %(name)s: %(message)s')
+    asyncio.run(serve_worker(index, updates))
+
+
+async def serve_listener(queues, secret):
+    router = UpdateRouter(queues, secret=secret)
+    server = await asyncio.start_server(router.handle, WEBHOOK_HOST, WEBHOOK_PORT)
+    if WEBHOOK_URL:
+        bot = Bot(TOKEN, base_url=TELEGRAM_API_URL or 'https://api.telegram.org/bot')
+        async with bot:
+            await bot.set_webhook(WEBHOOK_URL, secret_token=secret)
+    logger.info("webhook слушает %s:%s%s, воркеров: %s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, len(queues))
+    async with server:
+        await server.serve_forever()
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_webhook(workers=WEBHOOK_WORKERS, secret=WEBHOOK_SECRET):
+    """Слушатель webhook в текущем процессе и workers процессов с обработчиками."""
+    # Без секрета любой, кто знает адрес, мог бы присылать боту поддельные апдейты
+    if not secret:
+        raise SystemExit("WEBHOOK_SECRET не задан: без него webhook не запускается")
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGTERM, _interrupt)
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue(WEBHOOK_QUEUE_SIZE) for _ in range(workers)]
+    processes = [context.Process(target=worker_process, args=(i, q), daemon=True) for i, q in enumerate(queues)]
+    for process in processes:
+        process.start()
+    try:
+        asyncio.run(serve_listener(queues, secret))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for q in queues:
+            q.put(None)
+        for process in processes:
+            process.join(timeout=10)
+
+
+if __name__ == '__main__':
+    run_webhook()
@@ -0,0 +1,125 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from bot.catalog import SLOTS
+from bot.middleware import SingleFlight
+from bot.selector import ComponentSelector
+
+# Селектор внутри процесса-воркера: у каждого процесса свой каталог и кеш
+_worker_selector = None
+
+
+def _init_selection_worker(mode):
+    global _worker_selector
+    _worker_selector = ComponentSelector(mode=mode)
+
+
+def _plain(build):
+    # Компоненты каталога — read-only отображения, их нельзя передать между процессами
+    result = {slot: dict(build[slot]) if build[slot] is not None else None for slot in SLOTS}
+    result['total_price'] = build['total_price']
+    return result
+
+
+def _select_in_worker(budget, goal):
+    return _plain(_worker_selector.select(budget, goal))
+
+
+def _select_alternatives_in_worker(budget, goal, count):
+    return [_plain(build) for build in _worker_selector.select_alternatives(budget, goal, count)]
+
+
+def _replacement_options_in_worker(build, slot, count, goal):
+    return [dict(c) for c in _worker_selector.replacement_options(build, slot, count, goal)]
+
+
+def _reselect_in_worker(build, slot, component, budget, goal):
+    return _plain(_worker_selector.reselect(build, slot, component, budget, goal))
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class WorkerPool:
+    """Выполняет подбор сборок и запросы к SQLite вне цикла событий.
+
+    Очередь ограничена: если задач уже max_pending, новая не ставится в
+    очередь, а сразу получает PoolSaturated, чтобы обработчик мог
+    попросить пользователя повторить позже. Одинаковые подборы и запросы
+    на чтение, пока первый не закончился, не ставятся в очередь повторно,
+    а ждут его результат.
+    """
+
+    def __init__(self, selector, selection_executor='thread', selection_workers=2, db_workers=2, max_pending=32):
+        self.selector = selector
+        self.max_pending = max_pending
+        self._pending = {'select': 0, 'db': 0}
+        self.flights = SingleFlight()
+
+        self.use_processes = selection_executor == 'process'
+        if self.use_processes:
+            self.selection_executor = ProcessPoolExecutor(
+                selection_workers,
+                initializer=_init_selection_worker,
+                initargs=(selector.mode,)
+            )
+        else:
+            self.selection_executor = ThreadPoolExecutor(selection_workers, thread_name_prefix='select')
+        self.db_executor = ThreadPoolExecutor(db_workers, thread_name_prefix='db')
+
+    def pending(self, lane):
+        return self._pending[lane]
+
+    async def _run(self, lane, executor, func, *args, bounded=True):
+        # Счётчики меняются только в цикле событий, блокировка не нужна
+        if bounded and self._pending[lane] >= self.max_pending:
+            raise PoolSaturated(lane)
+        self._pending[lane] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, func, *args)
+        finally:
+            self._pending[lane] -= 1
+
+    async def select(self, budget, goal):
+        func = _select_in_worker if self.use_processes else self.selector.select
+        return await self.flights.run(
+            ('select', budget, goal), self._run, 'select', self.selection_executor, func, budget, goal
+        )
+
+    async def select_alternatives(self, budget, goal, count):
+        func = _select_alternatives_in_worker if self.use_processes else self.selector.select_alternatives
+        return await self.flights.run(
+            ('select_alternatives', budget, goal, count),
+            self._run, 'select', self.selection_executor, func, budget, goal, count
+        )
+
+    async def replacement_options(self, build, slot, count, goal):
+        if self.use_processes:
+            return await self._run(
+                'select', self.selection_executor, _replacement_options_in_worker, _plain(build), slot, count, goal
+            )
+        return await self._run(
+            'select', self.selection_executor, self.selector.replacement_options, build, slot, count, goal
+        )
+
+    async def reselect(self, build, slot, component, budget, goal):
+        if self.use_processes:
+            return await self._run(
+                'select', self.selection_executor, _reselect_in_worker,
+                _plain(build), slot, dict(component), budget, goal
+            )
+        return await self._run(
+            'select', self.selection_executor, self.selector.reselect, build, slot, component, budget, goal
+        )
+
+    async def run_db(self, func, *args, bounded=True, shared=False):
+        """shared=True — только для чтения: одновременные одинаковые запросы выполняются один раз."""
+        if shared:
+            return await self.flights.run((func.__name__, func, *args), self._run, 'db', self.db_executor, func, *args)
+        return await self._run('db', self.db_executor, func, *args, bounded=bounded)
+
+    def shutdown(self):
+        self.selection_executor.shutdown(wait=False, cancel_futures=True)
+        self.db_executor.shutdown(wait=True)
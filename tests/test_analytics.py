@@ -0,0 +1,35 @@
+import csv
+import sqlite3
+
+import pytest
+
+from bot.analytics import main
+from bot.database import EXPORT_COLUMNS, BuildSaver
+
+
+def test_export_does_not_create_missing_database(tmp_path, capsys):
+    path = tmp_path / 'missing.db'
+    with pytest.raises(SystemExit):
+        main(['export', '--db', str(path), '--out', str(tmp_path / 'builds.csv')])
+    assert "нет файла базы" in capsys.readouterr().err
+    assert not path.exists()
+
+
+def test_export_does_not_write_to_database(tmp_path):
+    path = tmp_path / 'bot.db'
+    saver = BuildSaver(str(path))
+    with saver.get_db_connection() as conn:
+        conn.execute('INSERT INTO user_builds (user_id, total_price) VALUES (1, 50000)')
+        # init_db выставил бы версию схемы заново
+        conn.execute('PRAGMA user_version = 0')
+        conn.commit()
+    saver.close()
+
+    out = tmp_path / 'builds.csv'
+    main(['export', '--db', str(path), '--out', str(out)])
+    with open(out, encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == EXPORT_COLUMNS and len(rows) == 2
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA user_version').fetchone() == (0,)
+    conn.close()
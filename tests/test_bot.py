@@ -0,0 +1,70 @@
+import asyncio
+
+from telegram import Update
+
+from bot.bot import build_application
+from bot.handlers import BotHandlers
+from bot.telegram_stub import FakeBotApi, UpdateFactory
+
+
+async def dispatch(tmp_path, updates, start):
+    """Прогоняет апдейты через настоящее Application с заглушкой Bot API; start заменяет обработчик /start."""
+    api = FakeBotApi()
+    server = await asyncio.start_server(api.handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    handlers = BotHandlers(db_path=str(tmp_path / 'bot.db'))
+    handlers.start = start
+    app = build_application(
+        handlers, updater=False, prune_builds=False, reprice_builds=False, metrics_port=0,
+        token='123:test', api_url=f'http://127.0.0.1:{port}/bot'
+    )
+    try:
+        async with server, app:
+            await app.start()
+            for data in updates:
+                await app.update_queue.put(Update.de_json(data, app.bot))
+            await asyncio.sleep(0.5)
+            await app.stop()
+    finally:
+        handlers.workers.shutdown()
+        handlers.db.close()
+        await handlers.geocoder.close()
+
+
+def test_updates_from_different_chats_run_concurrently(tmp_path):
+    events = []
+    both = asyncio.Event()
+
+    async def start(update, context):
+        events.append(('begin', update.effective_chat.id))
+        if len(events) == 2:
+            both.set()
+        # При обработке по одному второй апдейт не начнётся, пока первый ждёт
+        try:
+            await asyncio.wait_for(both.wait(), 0.3)
+        except asyncio.TimeoutError:
+            pass
+        events.append(('end', update.effective_chat.id))
+
+    factory = UpdateFactory()
+    updates = [factory.message(1, '/start'), factory.message(2, '/start')]
+    asyncio.run(dispatch(tmp_path, updates, start))
+    assert sorted(events[:2]) == [('begin', 1), ('begin', 2)]
+    assert len(events) == 4
+
+
+def test_updates_from_one_chat_run_in_order(tmp_path):
+    events = []
+
+    async def start(update, context):
+        events.append(('begin', update.message.text))
+        await asyncio.sleep(0.05)
+        events.append(('end', update.message.text))
+
+    factory = UpdateFactory()
+    updates = [factory.message(1, '/start first'), factory.message(1, '/start second')]
+    asyncio.run(dispatch(tmp_path, updates, start))
+    assert events == [
+        ('begin', '/start first'), ('end', '/start first'), ('begin', '/start second'), ('end', '/start second')
+    ]
@@ -0,0 +1,36 @@
+import pytest
+
+from bot.catalog import SLOTS
+from bot.selector import MODE_PERCENT, ComponentSelector
+
+GOALS = ('games', 'office', 'editing')
+
+
+@pytest.fixture(scope='module')
+def selector():
+    return ComponentSelector(mode=MODE_PERCENT, cache_size=0, use_breakpoints=True)
+
+
+def assert_same(selector, budget, goal):
+    expected = selector.select_percent(budget, goal)
+    actual = selector.select(budget, goal)
+    assert [actual[slot] for slot in SLOTS] == [expected[slot] for slot in SLOTS], (goal, budget)
+    assert actual['total_price'] == expected['total_price'], (goal, budget)
+
+
+@pytest.mark.parametrize('goal', GOALS)
+def test_breakpoints_match_percent_mode_on_budget_sweep(selector, goal):
+    # Шаг не кратен ценам каталога, чтобы попадать и внутрь интервалов
+    for budget in range(0, 700001, 373):
+        assert_same(selector, budget, goal)
+
+
+@pytest.mark.parametrize('goal', GOALS)
+def test_breakpoints_match_percent_mode_at_interval_edges(selector, goal):
+    table = selector.breakpoint_table(goal)
+    assert len(table) > 1
+    for start, end, _ in table.intervals():
+        # У последнего интервала нет конца: проверяем вдвое больший бюджет
+        edges = (end, end + 1) if end is not None else (start * 2,)
+        for budget in (start, start + 1, *edges):
+            assert_same(selector, budget, goal)
@@ -0,0 +1,102 @@
+import sqlite3
+
+from bot.catalog import SLOTS, Catalog
+from bot.database import ID_COLUMNS, PRICE_COLUMNS, SCHEMA_VERSION, BuildSaver
+from bot.reprice import main as reprice_main
+
+# Схема первой версии бота: названия компонентов, без id, цен и доступности
+BASELINE_SCHEMA = '''
+    CREATE TABLE user_builds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        cpu TEXT,
+        gpu TEXT,
+        motherboard TEXT,
+        ram TEXT,
+        ssd TEXT,
+        psu TEXT,
+        pc_case TEXT,
+        cooler TEXT,
+        total_price INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def insert_builds(saver, rows):
+    with saver.get_db_connection() as conn:
+        conn.executemany('INSERT INTO user_builds (user_id, created_at) VALUES (?, ?)', rows)
+        conn.commit()
+
+
+def test_prune_keeps_newest_builds_of_every_user(tmp_path):
+    saver = BuildSaver(str(tmp_path / 'bot.db'), keep_builds=3)
+    # Пользователей больше, чем в одной пачке, у одного сборок ровно keep_builds
+    insert_builds(saver, [(user_id, f'2026-01-01 00:00:{i:02d}') for user_id in range(1, 6) for i in range(6)])
+    insert_builds(saver, [(6, f'2026-01-01 00:00:{i:02d}') for i in range(3)])
+
+    assert saver.prune_old_builds(batch_size=2) == 5 * 3
+    with saver.get_db_connection() as conn:
+        rows = conn.execute('SELECT user_id, created_at FROM user_builds ORDER BY user_id, created_at').fetchall()
+    saver.close()
+    expected = [(user_id, f'2026-01-01 00:00:{i:02d}') for user_id in range(1, 6) for i in range(3, 6)]
+    expected += [(6, f'2026-01-01 00:00:{i:02d}') for i in range(3)]
+    assert rows == expected
+
+
+def test_reprice_resolves_legacy_rows_by_name(tmp_path):
+    catalog = Catalog()
+    cpu, ssd = catalog.snapshot.components['cpu'][0], catalog.snapshot.components['ssd'][0]
+    saver = BuildSaver(str(tmp_path / 'bot.db'), catalog=catalog)
+    # Строки первой версии схемы: только названия, без id и цен
+    with saver.get_db_connection() as conn:
+        conn.execute('INSERT INTO user_builds (user_id, cpu, ssd, total_price) VALUES (1, ?, ?, 1)',
+                     (cpu['name'], ssd['name']))
+        conn.execute('INSERT INTO user_builds (user_id, cpu, total_price) VALUES (2, ?, 1)', ("Снятый с продажи",))
+        conn.commit()
+
+    assert saver.reprice_builds() == (2, 2)
+    [known] = saver.get_builds_by_user_id(1)
+    [unknown] = saver.get_builds_by_user_id(2)
+    assert saver.reprice_builds() == (2, 0)
+    saver.close()
+    assert known['available']
+    assert (known['cpu_id'], known['ssd_id'], known['cpu']) == (cpu['id'], ssd['id'], cpu['name'])
+    assert known['total_price'] == cpu['price'] + ssd['price']
+    assert not unknown['available'] and unknown['cpu'] == "Снятый с продажи"
+
+
+def test_baseline_database_is_upgraded(tmp_path, capsys):
+    path = str(tmp_path / 'bot.db')
+    snapshot = Catalog().snapshot
+    build = {slot: snapshot.components[slot][0] for slot in SLOTS}
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMA)
+    conn.execute(
+        f"INSERT INTO user_builds (user_id, {', '.join(SLOTS)}, total_price) "
+        f"VALUES (1, {', '.join('?' * len(SLOTS))}, 1)",
+        [build[slot]['name'] for slot in SLOTS]
+    )
+    conn.execute("INSERT INTO user_builds (user_id, cpu, total_price) VALUES (2, 'Снятый с продажи', 1)")
+    conn.commit()
+    assert conn.execute('PRAGMA user_version').fetchone() == (0,)
+    conn.close()
+
+    reprice_main(['--db', path])
+    assert "изменено: 2" in capsys.readouterr().out
+
+    conn = sqlite3.connect(path)
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(user_builds)')}
+    assert conn.execute('PRAGMA user_version').fetchone() == (SCHEMA_VERSION,)
+    conn.close()
+    assert set(ID_COLUMNS + PRICE_COLUMNS + ['available']) <= columns
+
+    saver = BuildSaver(path, catalog=Catalog())
+    [migrated] = saver.get_builds_by_user_id(1)
+    [unknown] = saver.get_builds_by_user_id(2)
+    saver.close()
+    assert migrated['available']
+    assert [migrated[f'{slot}_id'] for slot in SLOTS] == [build[slot]['id'] for slot in SLOTS]
+    assert [migrated[slot] for slot in SLOTS] == [build[slot]['name'] for slot in SLOTS]
+    assert migrated['total_price'] == sum(build[slot]['price'] for slot in SLOTS)
+    assert not unknown['available'] and unknown['cpu'] == "Снятый с продажи" and unknown['cpu_id'] is None
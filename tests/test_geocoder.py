@@ -0,0 +1,107 @@
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from bot.geocoder import CityNotFound, Geocoder, GeocoderError
+from bot.webhook import read_request, write_response
+
+CITIES = {'москва': (37.617698, 55.755864)}
+
+
+class FakeGeocoderApi:
+    """Локальный геокодер в формате ответа Яндекса; script — что делать с очередными запросами."""
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.requests = []
+
+    def answer(self, city):
+        coords = CITIES.get(' '.join(city.lower().split()))
+        members = [{'GeoObject': {'Point': {'pos': f'{coords[0]} {coords[1]}'}}}] if coords else []
+        return {'response': {'GeoObjectCollection': {
+            'metaDataProperty': {'GeocoderResponseMetaData': {'found': str(len(members))}},
+            'featureMember': members,
+        }}}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                method, path, headers, body = await read_request(reader)
+                if not method:
+                    break
+                self.requests.append(time.monotonic())
+                action = self.script.pop(0) if self.script else 'ok'
+                if action == 'slow':
+                    await asyncio.sleep(1)
+                if action == 'error':
+                    await write_response(writer, '503 Service Unavailable')
+                    continue
+                city = parse_qs(urlsplit(path).query)['geocode'][0]
+                await write_response(writer, '200 OK', json.dumps(self.answer(city)).encode())
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def lookup(tmp_path, api, cities, **kwargs):
+    """Ищет города новым Geocoder с кешем в tmp_path через заглушку api."""
+    server = await asyncio.start_server(api.handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    geocoder = Geocoder('key', f'http://127.0.0.1:{port}/1.x/', cache_path=str(tmp_path / 'bot.db'), **kwargs)
+    results = []
+    async with server:
+        try:
+            for city in cities:
+                try:
+                    results.append(await geocoder.locate(city))
+                except GeocoderError as e:
+                    results.append(e)
+        finally:
+            await geocoder.close()
+    return results
+
+
+def test_server_error_is_retried_with_backoff(tmp_path):
+    api = FakeGeocoderApi(['error'])
+    [coords] = asyncio.run(lookup(tmp_path, api, ["Москва"], retries=2, backoff=0.2))
+    assert coords == CITIES['москва']
+    assert len(api.requests) == 2
+    assert api.requests[1] - api.requests[0] >= 0.2
+
+
+def test_every_attempt_failing_raises(tmp_path):
+    api = FakeGeocoderApi(['error', 'error'])
+    [error] = asyncio.run(lookup(tmp_path, api, ["Москва"], retries=2, backoff=0))
+    assert type(error) is GeocoderError
+    assert len(api.requests) == 2
+
+
+def test_timeout_raises_geocoder_error(tmp_path):
+    api = FakeGeocoderApi(['slow'])
+    [error] = asyncio.run(lookup(tmp_path, api, ["Москва"], timeout=0.2, retries=0))
+    assert type(error) is GeocoderError
+    assert len(api.requests) == 1
+
+
+def test_unknown_city_raises_city_not_found(tmp_path):
+    api = FakeGeocoderApi()
+    [error] = asyncio.run(lookup(tmp_path, api, ["Нетакогоград"]))
+    assert isinstance(error, CityNotFound)
+
+
+def test_lookup_after_restart_is_served_from_sqlite(tmp_path):
+    api = FakeGeocoderApi()
+    assert asyncio.run(lookup(tmp_path, api, ["Москва"])) == [CITIES['москва']]
+    # Новый экземпляр — как после перезапуска бота: кеша в памяти нет, сеть не нужна
+    assert asyncio.run(lookup(tmp_path, api, ["  москва "])) == [CITIES['москва']]
+    assert len(api.requests) == 1
+
+
+@pytest.mark.parametrize('retries', [0, -1])
+def test_at_least_one_attempt_is_made(tmp_path, retries):
+    api = FakeGeocoderApi()
+    assert asyncio.run(lookup(tmp_path, api, ["Москва"], retries=retries)) == [CITIES['москва']]
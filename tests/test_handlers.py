@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot.handlers import BUSY_MESSAGE, CHOICE_EXPIRED_MESSAGE, BotHandlers
+from bot.workers import WorkerPool
+
+
+class FakeQuery:
+    def __init__(self, data, user_id=1):
+        self.data = data
+        self.from_user = SimpleNamespace(id=user_id)
+        self.answers = []
+        self.edits = []
+
+    async def answer(self, text=None, show_alert=False):
+        self.answers.append(text)
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+def callback(data):
+    query = FakeQuery(data)
+    return SimpleNamespace(callback_query=query, effective_chat=SimpleNamespace(id=1)), query
+
+
+@pytest.fixture
+def handlers(tmp_path):
+    handlers = BotHandlers(db_path=str(tmp_path / 'bot.db'))
+    yield handlers
+    handlers.workers.shutdown()
+    handlers.db.close()
+
+
+def test_second_choice_of_alternatives_is_not_saved(handlers):
+    context = SimpleNamespace(user_data={})
+
+    async def scenario():
+        builds = await handlers.workers.select_alternatives(100000, 'games', 3)
+        context.user_data['alternatives'] = [handlers.build_ids(build) for build in builds]
+        (first, first_query), (second, second_query) = callback('choose_0'), callback('choose_1')
+        await asyncio.gather(
+            handlers.handle_choose_build(first, context), handlers.handle_choose_build(second, context)
+        )
+        return builds, first_query, second_query
+
+    builds, first_query, second_query = asyncio.run(scenario())
+    assert len(builds) > 1
+    assert len(handlers.db.get_builds_by_user_id(1)) == 1
+    assert context.user_data['build'] == handlers.build_ids(builds[0])
+    assert first_query.edits and not second_query.edits
+    assert second_query.answers == [CHOICE_EXPIRED_MESSAGE]
+
+
+def test_office_build_is_offered_only_cpus_with_igpu(handlers):
+    build = handlers.selector.select(60000, 'office')
+    context = SimpleNamespace(user_data={'build': handlers.build_ids(build), 'budget': 60000, 'goal': 'office'})
+    snapshot = handlers.selector.catalog.snapshot
+    assert build['gpu'] is None
+    # Рядом по цене есть процессоры без встроенной графики, иначе проверка ничего не значит
+    nearby = sorted(snapshot.indexes['cpu'].items, key=lambda c: abs(c['price'] - build['cpu']['price']))[:6]
+    assert any(c.get('igpu') is None for c in nearby)
+
+    update, query = callback('edit_cpu')
+    asyncio.run(handlers.handle_edit_component(update, context))
+    [(_, markup)] = query.edits
+    swaps = [row[0].callback_data for row in markup.inline_keyboard if row[0].callback_data.startswith('swap_')]
+    assert swaps
+    assert all(snapshot.get('cpu', int(data.split('_')[2]))['igpu'] is not None for data in swaps)
+
+    without_igpu = next(c for c in nearby if c.get('igpu') is None)
+    update, query = callback(f"swap_cpu_{without_igpu['id']}")
+    asyncio.run(handlers.handle_swap_component(update, context))
+    assert context.user_data['build'] == handlers.build_ids(build)
+
+
+def test_edit_and_swap_answer_busy_when_pool_is_saturated(handlers):
+    build = handlers.selector.select(100000, 'games')
+    ids = handlers.build_ids(build)
+    context = SimpleNamespace(user_data={'build': ids, 'budget': 100000, 'goal': 'games'})
+    options = handlers.selector.replacement_options(build, 'cpu', 6, 'games')
+    handlers.workers.max_pending = 0
+
+    edit, edit_query = callback('edit_cpu')
+    swap, swap_query = callback(f"swap_cpu_{options[0]['id']}")
+    asyncio.run(handlers.handle_edit_component(edit, context))
+    asyncio.run(handlers.handle_swap_component(swap, context))
+    assert edit_query.answers == swap_query.answers == [BUSY_MESSAGE]
+    assert not edit_query.edits and not swap_query.edits
+    assert context.user_data['build'] == ids
+
+
+def test_edit_and_swap_in_worker_processes(handlers):
+    build = handlers.selector.select(100000, 'games')
+    workers = WorkerPool(handlers.selector, selection_executor='process', selection_workers=1)
+
+    async def scenario():
+        options = await workers.replacement_options(build, 'cpu', 6, 'games')
+        component = handlers.selector.catalog.snapshot.get('cpu', options[0]['id'])
+        return options, await workers.reselect(build, 'cpu', component, 100000, 'games')
+
+    try:
+        options, swapped = asyncio.run(scenario())
+    finally:
+        workers.shutdown()
+    expected = handlers.selector.replacement_options(build, 'cpu', 6, 'games')
+    assert [c['id'] for c in options] == [c['id'] for c in expected]
+    component = handlers.selector.catalog.snapshot.get('cpu', options[0]['id'])
+    assert handlers.build_ids(swapped) == handlers.build_ids(
+        handlers.selector.reselect(build, 'cpu', component, 100000, 'games')
+    )
+
+
+@pytest.mark.parametrize('data', ['part_bot_data_1', 'part_gpu_999999'])
+def test_show_part_with_unknown_category_or_id(handlers, data):
+    update, query = callback(data)
+    asyncio.run(handlers.show_part(update, SimpleNamespace(user_data={})))
+    [(text, _)] = query.edits
+    assert "нет в каталоге" in text
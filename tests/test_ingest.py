@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from bot.ingest import CategoryIngest
+
+MOTHERBOARD = {'name': "ASRock B660M", 'socket': "LGA1700", 'chipset': "B660", 'ddr': "DDR4", 'form_factor': "mATX"}
+CASE = {'name': "Zalman T4", 'form_factor': ["ATX", "mATX"]}
+
+
+def category_ingest(tmp_path, category, items):
+    path = tmp_path / f'{category}.json'
+    path.write_text(json.dumps(items, ensure_ascii=False), encoding='utf-8')
+    return CategoryIngest(category, str(path))
+
+
+@pytest.mark.parametrize('category, item, field', [
+    ('motherboard', MOTHERBOARD, 'chipset'),
+    ('motherboard', MOTHERBOARD, 'form_factor'),
+    ('pc_case', CASE, 'form_factor'),
+])
+def test_row_without_field_used_by_compatibility_is_rejected(tmp_path, category, item, field):
+    ingest = category_ingest(tmp_path, category, [])
+    row = {k: v for k, v in item.items() if k != field}
+
+    errors = ingest.add({**row, 'price': 1000})
+    assert errors == [f"нет поля {field}"]
+    assert ingest.rejected == 1
+    assert list(ingest.changes()) == []
+
+
+def test_case_form_factor_must_be_a_list(tmp_path):
+    # В новой категории тип колонки неизвестен, и строка из JSON не разбивается на список
+    ingest = category_ingest(tmp_path, 'pc_case', [])
+
+    errors = ingest.add({**CASE, 'form_factor': "ATX", 'price': 1000})
+    assert errors == ["поле form_factor должно быть списком"]
+
+
+@pytest.mark.parametrize('existing', [True, False])
+def test_repeated_rows_merge_fields(tmp_path, existing):
+    items = [{'id': 1, **MOTHERBOARD, 'price': 9000}] if existing else []
+    ingest = category_ingest(tmp_path, 'motherboard', items)
+
+    assert ingest.add({**MOTHERBOARD, 'price': 9500, 'wifi': "да"}) == []
+    assert ingest.add({'name': MOTHERBOARD['name'], 'price': 9900}) == []
+    assert ingest.duplicates == 1
+
+    [(action, item, _)] = ingest.changes()
+    assert action == ('updated' if existing else 'added')
+    assert item['price'] == 9900
+    assert item['wifi'] == "да"
@@ -0,0 +1,187 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot.middleware import RATE_LIMITED_MESSAGE, HandlerGuard, SingleFlight, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+        self.answers = []
+
+    async def answer(self, text=None):
+        self.answers.append(text)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text):
+        self.replies.append(text)
+
+
+def callback_update(data, chat_id=1):
+    query = FakeQuery(data)
+    update = SimpleNamespace(
+        callback_query=query, message=None,
+        effective_chat=SimpleNamespace(id=chat_id), effective_user=SimpleNamespace(id=chat_id)
+    )
+    return update, query
+
+
+def message_update(user_id=1):
+    message = FakeMessage()
+    update = SimpleNamespace(
+        callback_query=None, message=message,
+        effective_chat=SimpleNamespace(id=user_id), effective_user=SimpleNamespace(id=user_id)
+    )
+    return update, message
+
+
+def test_token_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+    assert [bucket.allow('user') for _ in range(4)] == [True, True, True, False]
+    clock.now += 0.4
+    assert not bucket.allow('user')
+    clock.now += 0.1
+    # За полсекунды при rate=2 набежал один токен
+    assert bucket.allow('user')
+    assert not bucket.allow('user')
+    assert bucket.allow('other')
+
+
+def test_token_bucket_evicts_refilled_buckets():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=2, clock=clock)
+    for user_id in range(100):
+        bucket.allow(user_id)
+    assert len(bucket) == 100
+
+    clock.now += 2
+    bucket.allow('late')
+    assert len(bucket) == 1
+    # Удалённое ведро начинается заново полным
+    assert bucket.allow(0) and bucket.allow(0)
+
+
+def test_guard_drops_duplicate_callback_while_running_and_within_window():
+    clock = FakeClock()
+    guard = HandlerGuard(rate=0, burst=0, duplicate_window=1.0, clock=clock)
+    calls = []
+    release = asyncio.Event()
+
+    @guard
+    async def handler(update, context):
+        calls.append(update.callback_query.data)
+        await release.wait()
+
+    async def scenario():
+        (first, _), (second, second_query) = callback_update('new_build'), callback_update('new_build')
+        other, _ = callback_update('new_build', chat_id=2)
+        running = asyncio.gather(handler(first, None), handler(other, None))
+        await asyncio.sleep(0)
+        await handler(second, None)
+        assert second_query.answers == [None]
+        release.set()
+        await running
+
+        clock.now += 0.5
+        await handler(callback_update('new_build')[0], None)
+        clock.now += 0.6
+        await handler(callback_update('new_build')[0], None)
+
+    asyncio.run(scenario())
+    assert calls == ['new_build', 'new_build', 'new_build']
+
+
+def test_guard_rate_limits_and_warns_once():
+    clock = FakeClock()
+    guard = HandlerGuard(rate=1, burst=2, duplicate_window=0, clock=clock)
+    handled = []
+
+    @guard
+    async def handler(update, context):
+        handled.append(update)
+
+    async def scenario():
+        updates = [message_update() for _ in range(4)]
+        for update, _ in updates:
+            await handler(update, None)
+        limited, query = callback_update('my_builds')
+        await handler(limited, None)
+        clock.now += 1
+        await handler(message_update()[0], None)
+        return [message for _, message in updates], query
+
+    messages, query = asyncio.run(scenario())
+    assert len(handled) == 3
+    # О превышении пишем в чат один раз, на нажатие кнопки — всплывающим ответом
+    assert [m.replies for m in messages] == [[], [], [RATE_LIMITED_MESSAGE], []]
+    assert query.answers == [RATE_LIMITED_MESSAGE]
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    runs = []
+
+    async def compute(value):
+        runs.append(value)
+        await asyncio.sleep(0.01)
+        return {'value': value}
+
+    async def scenario():
+        results = await asyncio.gather(
+            *(flights.run(('select', 1), compute, 1) for _ in range(5)), flights.run(('select', 2), compute, 2)
+        )
+        assert len(flights) == 0
+        # Закончившийся запрос не кешируется: следующий вызов считает заново
+        await flights.run(('select', 1), compute, 1)
+        return results
+
+    results = asyncio.run(scenario())
+    assert runs == [1, 2, 1]
+    assert all(result is results[0] for result in results[:5])
+    assert results[5] == {'value': 2}
+
+
+def test_single_flight_shares_errors_and_survives_cancelled_waiter():
+    flights = SingleFlight()
+    runs = []
+
+    async def fail():
+        runs.append('fail')
+        await asyncio.sleep(0.01)
+        raise ValueError("нет сборки")
+
+    async def compute():
+        runs.append('compute')
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def scenario():
+        errors = await asyncio.gather(*(flights.run(('fail',), fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(e, ValueError) for e in errors)
+
+        leaving = asyncio.ensure_future(flights.run(('compute',), compute))
+        staying = asyncio.ensure_future(flights.run(('compute',), compute))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(scenario()) == 42
+    assert runs == ['fail', 'compute']
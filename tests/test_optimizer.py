@@ -0,0 +1,152 @@
+from itertools import product
+
+import pytest
+
+from bot.catalog import SLOTS, CatalogSnapshot
+from bot.compatibility import cpu_fits_motherboard
+from bot.optimizer import CHEAPEST_ALTERNATIVE, GOAL_SCORES, PSU_HEADROOM, BuildOptimizer
+from bot.selector import MODE_OPTIMIZER, ComponentSelector
+
+
+def items(*rows):
+    return [{'id': i, 'name': f'item {i}', **row} for i, row in enumerate(rows, 1)]
+
+
+# Маленький каталог, который можно перебрать целиком. Процессоры 2 и 3 одинаково сильные,
+# но у более дешёвого из них дорогая платформа: сборка на процессоре 3 дешевле при той же оценке
+FIXTURE = {
+    'gpu': items(
+        {'tdp': 120, 'price': 20000, '3dmark': 6000},
+        {'tdp': 200, 'price': 45000, '3dmark': 13000},
+        {'tdp': 320, 'price': 90000, '3dmark': 20000},
+    ),
+    'cpu': items(
+        {'socket': 'AM4', 'tdp': 65, 'compatibility_mb': ['B450'], 'ddr': 'DDR4', 'price': 7000,
+         'cinebench_r23_single': 1200, 'cinebench_r23_multi': 9000},
+        {'socket': 'AM5', 'tdp': 105, 'compatibility_mb': ['X670'], 'ddr': 'DDR5', 'price': 20000,
+         'igpu': 'Radeon', 'cinebench_r23_single': 1900, 'cinebench_r23_multi': 19000},
+        {'socket': 'LGA1700', 'tdp': 125, 'compatibility_mb': ['B660'], 'ddr': 'DDR4', 'price': 21000,
+         'igpu': 'UHD 770', 'cinebench_r23_single': 1900, 'cinebench_r23_multi': 19000},
+        {'socket': 'LGA1700', 'tdp': 65, 'compatibility_mb': ['B660'], 'ddr': 'DDR4', 'price': 9000,
+         'igpu': 'UHD 730', 'cinebench_r23_single': 1700, 'cinebench_r23_multi': 8700},
+    ),
+    'motherboard': items(
+        {'socket': 'AM4', 'chipset': 'B450', 'ddr': 'DDR4', 'form_factor': 'mATX', 'price': 6000},
+        {'socket': 'AM5', 'chipset': 'X670', 'ddr': 'DDR5', 'form_factor': 'ATX', 'price': 25000},
+        {'socket': 'LGA1700', 'chipset': 'B660', 'ddr': 'DDR4', 'form_factor': 'mATX', 'price': 8000},
+        {'socket': 'LGA1700', 'chipset': 'B660', 'ddr': 'DDR4', 'form_factor': 'ATX', 'price': 9000},
+    ),
+    'ram': items(
+        {'ddr_version': 'DDR4', 'frequency': 3200, 'total_capacity': 16, 'price': 4000},
+        {'ddr_version': 'DDR4', 'frequency': 3600, 'total_capacity': 32, 'price': 8000},
+        {'ddr_version': 'DDR5', 'frequency': 6000, 'total_capacity': 32, 'price': 12000},
+    ),
+    'ssd': items(
+        {'capacity': 500, 'price': 3000},
+        {'capacity': 1000, 'price': 6000},
+        {'capacity': 2000, 'price': 12000},
+    ),
+    'psu': items({'power': 450, 'price': 3000}, {'power': 650, 'price': 6000}, {'power': 850, 'price': 10000}),
+    'pc_case': items({'form_factor': ['mATX'], 'price': 3000}, {'form_factor': ['ATX', 'mATX'], 'price': 5000}),
+    'cooler': items(
+        {'tdp': 95, 'socket_compatibility': ['AM4', 'AM5', 'LGA1700'], 'price': 1500},
+        {'tdp': 220, 'socket_compatibility': ['AM4', 'AM5', 'LGA1700'], 'price': 6000},
+    ),
+}
+
+
+def brute_force(components, budget, goal):
+    """(оценка, цена) лучшей сборки полным перебором всех сочетаний или None."""
+    weights = GOAL_SCORES[goal]
+
+    def score(category, item):
+        if category not in weights or item is None:
+            return 0
+        field, weight = weights[category]
+        return weight * item[field] / max(c[field] for c in components[category])
+
+    gpus = components['gpu'] if 'gpu' in weights else [None]
+    best = None
+    for gpu, cpu, mb, ram, ssd, psu, case, cooler in product(
+        gpus, components['cpu'], components['motherboard'], components['ram'], components['ssd'],
+        components['psu'], components['pc_case'], components['cooler']
+    ):
+        if goal == 'office' and cpu.get('igpu') is None:
+            continue
+        if not cpu_fits_motherboard(cpu, mb) or ram['ddr_version'] != mb['ddr']:
+            continue
+        if mb['form_factor'] not in case['form_factor'] or cpu['socket'] not in cooler['socket_compatibility']:
+            continue
+        if cooler['tdp'] < cpu['tdp'] or psu['power'] < ((gpu['tdp'] if gpu else 0) + cpu['tdp']) * PSU_HEADROOM:
+            continue
+        parts = (gpu, cpu, mb, ram, ssd, psu, case, cooler)
+        cost = sum(c['price'] for c in parts if c is not None)
+        if cost > budget:
+            continue
+        key = (score('gpu', gpu) + score('cpu', cpu) + score('ram', ram) + score('ssd', ssd), -cost)
+        if best is None or key > best:
+            best = key
+    return best
+
+
+@pytest.fixture(scope='module')
+def selector():
+    return ComponentSelector(cache_size=0)
+
+
+@pytest.mark.parametrize('goal, budget', [('games', 100000), ('office', 60000), ('editing', 150000)])
+def test_alternatives_cover_price_tiers(selector, goal, budget):
+    builds = selector.select_alternatives(budget, goal, 3)
+
+    assert len(builds) == 3
+    # Первый вариант — та же сборка, что и без вариантов
+    assert builds[0] == selector.select(budget, goal)
+    caps = [budget, budget * (1 + CHEAPEST_ALTERNATIVE) / 2, budget * CHEAPEST_ALTERNATIVE]
+    for build, cap in zip(builds, caps):
+        assert build['total_price'] <= cap
+    # Более дешёвый вариант дешевле следующего уровня, а не ещё одна сборка у потолка бюджета
+    assert builds[1]['total_price'] < builds[0]['total_price'] - budget * 0.1
+    assert builds[2]['total_price'] < builds[1]['total_price'] - budget * 0.1
+    assert len({tuple(b[slot]['id'] if b[slot] else None for slot in SLOTS) for b in builds}) == 3
+
+
+def test_alternatives_are_not_repeated(selector):
+    # На таком бюджете лучшая сборка каталога помещается во все уровни
+    builds = selector.select_alternatives(2000000, 'games', 3)
+    assert len(builds) == 1
+
+
+@pytest.mark.parametrize('goal', ['games', 'office', 'editing'])
+def test_optimizer_matches_exhaustive_search(goal):
+    snapshot = CatalogSnapshot(FIXTURE, {}, 'fixture')
+    optimizer = BuildOptimizer()
+    weights = GOAL_SCORES[goal]
+    for budget in range(30000, 200001, 1000):
+        expected = brute_force(FIXTURE, budget, goal)
+        build = optimizer.select(snapshot, budget, goal)
+        if expected is None:
+            assert build is None, budget
+            continue
+        score = sum(
+            weight * build[category][field] / max(c[field] for c in FIXTURE[category])
+            for category, (field, weight) in weights.items()
+        )
+        assert score == pytest.approx(expected[0]), budget
+        assert build['total_price'] == -expected[1], budget
+
+
+def test_equal_score_on_cheaper_platform_wins():
+    snapshot = CatalogSnapshot(FIXTURE, {}, 'fixture')
+    build = BuildOptimizer().select(snapshot, 500000, 'editing')
+    assert build['cpu']['id'] == 3
+    assert build['total_price'] == -brute_force(FIXTURE, 500000, 'editing')[1]
+
+
+def test_percent_mode_is_used_when_optimizer_finds_nothing():
+    selector = ComponentSelector(mode=MODE_OPTIMIZER, cache_size=0)
+    snapshot = selector.catalog.snapshot
+    # Бюджета не хватает на целую сборку: оптимизатор ничего не находит
+    assert selector.optimizer.select(snapshot, 40000, 'games') is None
+    build = selector.select(40000, 'games')
+    assert build == selector.select_percent(40000, 'games')
+    assert build['cpu'] is not None
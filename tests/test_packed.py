@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from bot.catalog import CATEGORY_FILES, DATA_DIR, Catalog
+from bot.packed import PACKED_FILE, CatalogFormatError, PackedCatalog, PackedRow, compile_catalog, load_packed
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for filename in CATEGORY_FILES.values():
+        shutil.copy(os.path.join(DATA_DIR, filename), tmp_path / filename)
+    return tmp_path
+
+
+def paths(data_dir):
+    return {category: str(data_dir / filename) for category, filename in CATEGORY_FILES.items()}
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_packed_catalog_round_trip(data_dir):
+    out = str(data_dir / PACKED_FILE)
+    compile_catalog(paths(data_dir), out)
+
+    components = PackedCatalog(out).components()
+    for category, path in paths(data_dir).items():
+        items = read_json(path)
+        rows = components[category]
+        assert [dict(row) for row in rows] == items
+        # Поля, которых нет у компонента, и null различаются, как в JSON
+        for row, item in zip(rows, items):
+            assert set(row) == set(item)
+            assert row.get('missing field', 'default') == 'default'
+
+
+def test_stale_packed_catalog_falls_back_to_json(data_dir):
+    compile_catalog(paths(data_dir), str(data_dir / PACKED_FILE))
+    assert isinstance(Catalog(str(data_dir)).snapshot.components['gpu'][0], PackedRow)
+
+    gpus = read_json(data_dir / CATEGORY_FILES['gpu'])
+    gpus[0]['price'] += 1000
+    with open(data_dir / CATEGORY_FILES['gpu'], 'w', encoding='utf-8') as f:
+        json.dump(gpus, f, ensure_ascii=False)
+
+    # Содержимое JSON изменилось: бинарный файл устарел и не используется
+    assert load_packed(str(data_dir / PACKED_FILE), paths(data_dir)) is None
+    snapshot = Catalog(str(data_dir)).snapshot
+    assert snapshot.get('gpu', gpus[0]['id'])['price'] == gpus[0]['price']
+    assert not isinstance(snapshot.components['gpu'][0], PackedRow)
+
+
+def test_invalid_catalog_is_not_compiled(data_dir):
+    cpus = read_json(data_dir / CATEGORY_FILES['cpu'])
+    del cpus[0]['socket']
+    with open(data_dir / CATEGORY_FILES['cpu'], 'w', encoding='utf-8') as f:
+        json.dump(cpus, f, ensure_ascii=False)
+
+    with pytest.raises(CatalogFormatError, match='нет поля socket'):
+        compile_catalog(paths(data_dir), str(data_dir / PACKED_FILE))
+    assert not (data_dir / PACKED_FILE).exists()
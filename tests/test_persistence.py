@@ -0,0 +1,74 @@
+import asyncio
+
+from bot.persistence import SQLitePersistence
+
+
+def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / 'bot.db')
+
+    async def scenario():
+        persistence = SQLitePersistence(path)
+        await persistence.update_conversation('new_build', (1, 1), 2)
+        await persistence.update_conversation('new_build', (2, 2), 1)
+        await persistence.update_conversation('new_build', (2, 2), None)
+        await persistence.update_user_data(1, {'budget': 100000, 'goal': 'games'})
+        await persistence.flush()
+
+        restarted = SQLitePersistence(path)
+        try:
+            return await restarted.get_conversations('new_build'), await restarted.get_user_data()
+        finally:
+            await restarted.flush()
+
+    conversations, user_data = asyncio.run(scenario())
+    assert conversations == {(1, 1): 2}
+    assert user_data == {1: {'budget': 100000, 'goal': 'games'}}
+
+
+def test_shared_user_data_is_reread_from_other_worker(tmp_path):
+    path = str(tmp_path / 'bot.db')
+
+    async def scenario():
+        first = SQLitePersistence(path, shared=True)
+        second = SQLitePersistence(path, shared=True)
+        local = {'goal': 'games'}
+        try:
+            # Пользователь выбрал цель в чате, который обслуживает первый воркер
+            await first.update_user_data(1, {'goal': 'office'})
+            await first._flush()
+            await second.refresh_user_data(1, local)
+            refreshed = dict(local)
+
+            # Пока второй воркер не записал свои изменения, они новее строки в базе
+            local['budget'] = 60000
+            await first.update_user_data(1, {'goal': 'editing'})
+            await first._flush()
+            await second.refresh_user_data(1, local)
+            kept = dict(local)
+
+            await second.update_user_data(1, local)
+            await second._flush()
+            reread = {}
+            await first.refresh_user_data(1, reread)
+            return refreshed, kept, reread
+        finally:
+            await first.flush()
+            await second.flush()
+
+    refreshed, kept, reread = asyncio.run(scenario())
+    assert refreshed == {'goal': 'office'}
+    assert kept == {'goal': 'office', 'budget': 60000}
+    assert reread == {'goal': 'office', 'budget': 60000}
+
+
+def test_unshared_user_data_is_not_reread(tmp_path):
+    async def scenario():
+        persistence = SQLitePersistence(str(tmp_path / 'bot.db'))
+        await persistence.update_user_data(1, {'goal': 'office'})
+        await persistence._flush()
+        local = {'goal': 'games'}
+        await persistence.refresh_user_data(1, local)
+        await persistence.flush()
+        return local
+
+    assert asyncio.run(scenario()) == {'goal': 'games'}
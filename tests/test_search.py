@@ -0,0 +1,67 @@
+import pytest
+
+from bot.search import SearchIndex, within_one_edit
+
+COMPONENTS = {
+    'gpu': [
+        {'id': 1, 'name': "NVIDIA GeForce RTX 4070"},
+        {'id': 2, 'name': "NVIDIA GeForce RTX 4070 Ti SUPER"},
+        {'id': 3, 'name': "AMD Radeon RX 7800 XT"},
+    ],
+    'cpu': [
+        {'id': 1, 'name': "AMD Ryzen 5 7600"},
+        {'id': 2, 'name': "AMD Ryzen 5 5600X"},
+        {'id': 3, 'name': "Intel Core i5-12400F"},
+    ],
+    'cooler': [
+        {'id': 1, 'name': "Кулер DeepCool AK400"},
+        {'id': 2, 'name': "Башенный кулер ID-Cooling SE-224-XTS"},
+    ],
+}
+
+
+@pytest.fixture(scope='module')
+def index():
+    return SearchIndex(COMPONENTS)
+
+
+def names(found):
+    return [item['name'] for _, item in found]
+
+
+def test_exact_words_find_shortest_name_first(index):
+    assert names(index.search("rtx 4070")) == ["NVIDIA GeForce RTX 4070", "NVIDIA GeForce RTX 4070 Ti SUPER"]
+
+
+def test_last_word_is_a_prefix(index):
+    assert names(index.search("ryz")) == ["AMD Ryzen 5 7600", "AMD Ryzen 5 5600X"]
+    assert names(index.search("ryzen 5 76")) == ["AMD Ryzen 5 7600"]
+    # Короткое слово не в конце запроса ищется только целиком
+    assert names(index.search("5 ryzen")) == ["AMD Ryzen 5 7600", "AMD Ryzen 5 5600X"]
+
+
+def test_substring_inside_word(index):
+    assert names(index.search("12400")) == ["Intel Core i5-12400F"]
+    assert [category for category, _ in index.search("cooling")] == ['cooler']
+
+
+def test_typos_are_tolerated_after_exact_matches(index):
+    assert names(index.search("geforse rtx 4070 super")) == ["NVIDIA GeForce RTX 4070 Ti SUPER"]
+    assert names(index.search("radeom")) == ["AMD Radeon RX 7800 XT"]
+    assert within_one_edit("raedon", "radeon")
+
+
+def test_cyrillic_and_latin_words_together(index):
+    assert names(index.search("КУЛЕР")) == ["Кулер DeepCool AK400", "Башенный кулер ID-Cooling SE-224-XTS"]
+    assert names(index.search("кулер deepcool")) == ["Кулер DeepCool AK400"]
+    assert names(index.search("башенный id-cooling")) == ["Башенный кулер ID-Cooling SE-224-XTS"]
+    assert names(index.search("кулр")) == ["Кулер DeepCool AK400", "Башенный кулер ID-Cooling SE-224-XTS"]
+
+
+@pytest.mark.parametrize('query', ["", "   ", "!!!", "xyzzy", "rtx 9999", "кулер ryzen"])
+def test_nothing_found(index, query):
+    assert index.search(query) == []
+
+
+def test_limit(index):
+    assert len(index.search("amd", limit=2)) == 2
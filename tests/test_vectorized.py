@@ -0,0 +1,12 @@
+import pytest
+
+from bot.catalog import Catalog
+from bot.selector import MODE_OPTIMIZER, MODE_PERCENT, ComponentSelector
+from bot.vectorized import check_parity
+
+
+@pytest.mark.parametrize('mode', [MODE_PERCENT, MODE_OPTIMIZER])
+def test_numpy_backend_selects_same_builds(mode):
+    python_selector = ComponentSelector(Catalog(backend='python'), mode=mode, cache_size=0)
+    numpy_selector = ComponentSelector(Catalog(backend='numpy'), mode=mode, cache_size=0)
+    assert check_parity(python_selector, numpy_selector, budgets=range(20000, 600001, 2500)) == []
@@ -0,0 +1,108 @@
+import asyncio
+import queue
+
+import httpx
+import pytest
+
+from bot.telegram_stub import UpdateFactory
+from bot.webhook import ChatSerializer, UpdateRouter, run_webhook, update_chat_id
+
+SECRET = 'test-secret'
+
+
+async def post(router, updates, secret=SECRET):
+    """Отправляет апдейты в слушатель webhook по HTTP, как Telegram; возвращает коды ответов."""
+    server = await asyncio.start_server(router.handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret}
+    async with server, httpx.AsyncClient(headers=headers) as client:
+        return [
+            (await client.post(f'http://127.0.0.1:{port}{router.path}', json=update)).status_code
+            for update in updates
+        ]
+
+
+async def post_chats(router, chats):
+    """Диалоги чатов отправляются одновременно, апдейты каждого чата — по очереди, как в bot.telegram_stub."""
+    server = await asyncio.start_server(router.handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+
+    async def send_chat(client, updates):
+        for update in updates:
+            response = await client.post(f'http://127.0.0.1:{port}{router.path}', json=update)
+            response.raise_for_status()
+            await asyncio.sleep(0)
+
+    async with server, httpx.AsyncClient(headers=headers) as client:
+        await asyncio.gather(*(send_chat(client, updates) for updates in chats.values()))
+
+
+def drain(q):
+    items = []
+    while True:
+        try:
+            items.append(q.get_nowait())
+        except queue.Empty:
+            return items
+
+
+@pytest.mark.parametrize('secret', ['wrong', ''])
+def test_update_with_wrong_secret_is_rejected(secret):
+    queues = [queue.Queue()]
+    router = UpdateRouter(queues, path='/telegram', secret=SECRET)
+    update = UpdateFactory().message(1, '/start')
+
+    assert asyncio.run(post(router, [update], secret)) == [403]
+    assert drain(queues[0]) == []
+    assert asyncio.run(post(router, [update])) == [200]
+    assert drain(queues[0]) == [update]
+
+
+def test_webhook_does_not_start_without_secret():
+    with pytest.raises(SystemExit):
+        run_webhook(workers=1, secret='')
+
+
+def test_updates_of_one_chat_go_to_one_worker_in_order():
+    factory = UpdateFactory()
+    chats = {
+        chat_id: factory.conversation(chat_id, 'games', 100000) + [factory.callback(chat_id, 'my_builds')]
+        for chat_id in (10, 11, 12, 13, -1001)
+    }
+    queues = [queue.Queue() for _ in range(3)]
+    asyncio.run(post_chats(UpdateRouter(queues, path='/telegram', secret=SECRET), chats))
+
+    received = [drain(q) for q in queues]
+    workers = {}
+    for index, updates in enumerate(received):
+        for update in updates:
+            workers.setdefault(update_chat_id(update), set()).add(index)
+    assert {chat_id: len(indexes) for chat_id, indexes in workers.items()} == dict.fromkeys(chats, 1)
+    assert len({index for indexes in workers.values() for index in indexes}) > 1
+    for chat_id, updates in chats.items():
+        [index] = workers[chat_id]
+        assert [u for u in received[index] if update_chat_id(u) == chat_id] == updates
+
+
+def test_serializer_runs_chats_concurrently_and_each_chat_in_order():
+    events = []
+
+    async def handle(chat_id, n):
+        events.append(('begin', chat_id, n))
+        await asyncio.sleep(0.01)
+        events.append(('end', chat_id, n))
+
+    async def scenario():
+        serializer = ChatSerializer()
+        for n in range(3):
+            for chat_id in (1, 2):
+                serializer.submit(chat_id, handle(chat_id, n))
+        await serializer.join()
+
+    asyncio.run(scenario())
+    for chat_id in (1, 2):
+        chat_events = [(kind, n) for kind, c, n in events if c == chat_id]
+        assert chat_events == [(kind, n) for n in range(3) for kind in ('begin', 'end')]
+    # Первые апдейты обоих чатов начались раньше, чем закончился любой из них
+    assert [kind for kind, _, _ in events[:2]] == ['begin', 'begin']